@@ -0,0 +1,92 @@
+"""
+Benchmark of the memory held by the results of a large availability query.
+
+Folds a synthetic response, split in responses of 100 channels like the batched requests, into the former
+representation (the response texts kept for the plain view, and one trace index object per channel) and into the
+columnar results model, and reports the memory each of them holds:
+
+    python benchmarks/bench_memory.py [rows] [channels]
+"""
+
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from bench_timeline import synthetic_response
+from a10y.results import ResultsModel
+from a10y.timeline import Frame, SegmentIndex, parse_geocsv, bin_traces
+
+EMPTY = SegmentIndex(np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+
+class LegacyResults:
+    """The former results: the text of every response, and the traces and cell states of each channel in its own objects"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.texts = []  # responses kept to show the plain rows of a channel
+        self.rows = {}
+        self.indexes = []
+        self.states = []
+
+    def add(self, text):
+        self.texts.append(text)
+        channels, channel, quality, starts, ends, _ = parse_geocsv(text)
+        for key in channels:
+            if key not in self.rows:
+                self.rows[key] = len(self.indexes)
+                self.indexes.append(EMPTY)
+                self.states.append(np.zeros(self.frame.num_spans, dtype=np.uint8))
+        trace_rows = np.array([self.rows[key] for key in channels], dtype=np.int64)[channel]
+        touched = np.unique(trace_rows)
+        old = [self.indexes[row] for row in touched.tolist()]
+        channel = np.concatenate([np.repeat(np.arange(len(touched)), [len(index.starts) for index in old]), np.searchsorted(touched, trace_rows)])
+        quality = np.concatenate([index.quality for index in old] + [quality])
+        starts = np.concatenate([index.starts for index in old] + [starts])
+        ends = np.concatenate([index.ends for index in old] + [ends])
+        order = np.lexsort((ends, quality, starts, channel))
+        channel, quality, starts, ends = channel[order], quality[order], starts[order], ends[order]
+        states = bin_traces(channel, quality, starts, ends, len(touched), self.frame.start, self.frame.end, self.frame.num_spans)
+        bounds = np.searchsorted(channel, np.arange(len(touched) + 1))
+        for i, row in enumerate(touched.tolist()):
+            lo, hi = bounds[i], bounds[i + 1]
+            self.indexes[row] = SegmentIndex(quality[lo:hi], starts[lo:hi], ends[lo:hi])
+            self.states[row] = states[i]
+
+
+def measure(model, responses):
+    """Memory held and peak (MB) and seconds to fold the responses into a model"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for response in responses:
+        model.add(response)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / 2**20, peak / 2**20, elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    lines = synthetic_response(rows, channels).split('\n')
+    header, data = '\n'.join(lines[:5]), lines[5:]
+    batch = 100 * (rows // channels)
+    responses = [header + '\n' + '\n'.join(data[i:i + batch]) for i in range(0, len(data), batch)]
+    del lines, data
+    frame = Frame(np.datetime64(datetime(2024, 1, 1), 'us').astype(np.int64), np.datetime64(datetime(2024, 7, 2), 'us').astype(np.int64), 160)
+
+    # each response is decoded while measuring, as if it had just been received, so that keeping it is charged
+    held, peak, elapsed = measure(LegacyResults(frame), (response.encode().decode() for response in responses))
+    print(f"former results (texts + per-channel objects): {held:.1f} MB held, {peak:.1f} MB peak, {elapsed:.2f} s")
+    results = ResultsModel(frame)
+    held, peak, elapsed = measure(results, (response.encode().decode() for response in responses))
+    print(f"results model: {held:.1f} MB held, {peak:.1f} MB peak, {elapsed:.2f} s for {len(results.keys)} channels and {rows} traces")
+    print(f"raw responses: {sum(map(len, responses)) / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark of the GeoCSV parsing and span binning behind the results timelines.
+
+Compares the former per-row datetime.strptime / per-span markup loop with the vectorized path of a10y.timeline
+on a synthetic 100k-row availability response:
+
+    python benchmarks/bench_timeline.py [rows]
+"""
+
+import math
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from a10y.timeline import parse_geocsv, sort_traces, bin_traces, row_markup
+
+HEADER = """#dataset: GeoCSV 2.0
+#delimiter: |
+#field_unit: unitless|unitless|unitless|unitless|unitless|hertz|ISO_8601|ISO_8601
+#field_type: string|string|string|string|string|float|datetime|datetime
+Network|Station|Location|Channel|Quality|SampleRate|Earliest|Latest"""
+COLORS = {'D': 'orange1', 'R': 'green1', 'Q': 'orchid', 'M': 'turquoise4'}
+
+
+def synthetic_response(rows, channels=100, start=datetime(2024, 1, 1), days=183):
+    """A GeoCSV response with rows traces spread over channels, separated by short gaps"""
+    lines = [HEADER]
+    per_channel = rows // channels
+    step = timedelta(days=days) / per_channel
+    for c in range(channels):
+        for i in range(per_channel):
+            trace_start = start + i * step
+            trace_end = trace_start + step * 0.9
+            lines.append(f"XX|S{c:04d}||HHZ|{'DRQM'[c % 4]}|100.0|{trace_start:%Y-%m-%dT%H:%M:%S.%fZ}|{trace_end:%Y-%m-%dT%H:%M:%S.%fZ}")
+    return '\n'.join(lines)
+
+
+def legacy(csv_results, start_frame, end_frame, num_spans):
+    """The former per-row loop of show_results (markup only)"""
+    span_frame = (end_frame - start_frame) / num_spans
+    lines = {}
+    span_limits = {}
+    for row in csv_results.splitlines()[5:]:
+        parts = row.split('|')
+        key = f"{parts[0]}_{parts[1]}_{parts[2]}_{parts[3]}"
+        if key not in lines:
+            lines[key] = [' ' for i in range(num_spans)]
+            span_limits[key] = [(start_frame + i * span_frame, end_frame if i == num_spans - 1 else start_frame + (i + 1) * span_frame) for i in range(num_spans)]
+        start_trace = datetime.strptime(parts[6], "%Y-%m-%dT%H:%M:%S.%fZ")
+        end_trace = datetime.strptime(parts[7], "%Y-%m-%dT%H:%M:%S.%fZ")
+        first_span = math.floor((start_trace - start_frame) / span_frame)
+        last_span = min(math.ceil((end_trace - start_frame) / span_frame), num_spans)
+        for i in range(first_span, last_span):
+            if lines[key][i] == ' ':
+                char = '━'
+                if i == first_span and span_limits[key][i][0] < start_trace:
+                    char = '┗'
+                elif i == last_span - 1 and end_trace < span_limits[key][i][1]:
+                    char = '┛'
+                lines[key][i] = f'[{COLORS[parts[4]]}]{char}[/{COLORS[parts[4]]}]'
+            elif any(c in lines[key][i] for c in ['━', '┗', '┛']):
+                lines[key][i] = '╌'
+            elif lines[key][i] == '╌' or lines[key][i] == '┄':
+                lines[key][i] = '┄'
+    return {k: ''.join(v) for k, v in lines.items()}
+
+
+def vectorized(csv_results, start_frame, end_frame, num_spans):
+    """The vectorized path of show_results (markup only)"""
+    channels, channel, quality, starts, ends, _ = parse_geocsv(csv_results)
+    order = sort_traces(channel, starts)
+    states = bin_traces(channel[order], quality[order], starts[order], ends[order], len(channels),
+                         np.datetime64(start_frame, 'us').astype(np.int64), np.datetime64(end_frame, 'us').astype(np.int64), num_spans)
+    return {k: row_markup(states[row]) for row, k in enumerate(channels)}
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    start_frame, end_frame, num_spans = datetime(2024, 1, 1), datetime(2024, 7, 2), 160
+    text = synthetic_response(rows)
+    timings = {}
+    for name, function in (("legacy", legacy), ("vectorized", vectorized)):
+        t = time.perf_counter()
+        function(text, start_frame, end_frame, num_spans)
+        timings[name] = time.perf_counter() - t
+        print(f"{name:>10}: {timings[name]:.3f} s for {rows} rows")
+    print(f"   speedup: {timings['legacy'] / timings['vectorized']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,60 @@
 from textual.app import App
-from textual.widgets import Header, Footer, Checkbox, Select, Input, Button, Collapsible, ContentSwitcher,Static,Label
-from textual.containers import ScrollableContainer , Container, Horizontal
-from a10y.widgets import Explanations, Requests, Results, Status, CursoredText # Import modular widgets
-import requests
+from textual.widgets import Header, Footer, Checkbox, Select, Input, Button, Collapsible, ContentSwitcher,Static,SelectionList
+from textual.containers import ScrollableContainer , Container
+from a10y.widgets import Explanations, PlainView, Requests, Results, Status, StatusLog, TimelineView # Import modular widgets
 from datetime import datetime, timedelta
 from textual.binding import Binding
 from textual_autocomplete import DropdownItem
 from textual.app import ComposeResult
 from textual import work
-from textual.worker import get_current_worker
-import math
+from rich.markup import escape
+from rich.text import Text
+import asyncio
+import numpy as np
 import os
 import sys
-import json
-import threading
-from pathlib import Path
-from appdirs import user_cache_dir
-from urllib.parse import urlparse
 from a10y import __version__
-CACHE_DIR = Path(user_cache_dir("a10y"))
-CACHE_FILE = CACHE_DIR / "nodes_cache.json"
-QUERY_URL = "https://www.orfeus-eu.org/eidaws/routing/1/globalconfig?format=fdsn"
+from a10y.engine import BatchScheduler, HttpEngine, Response, availability_options, parse_extents, parse_routing, chunks, post_geocsv, routing_data
+from a10y.cache import AvailabilityCache, CACHE_FILE, CACHE_SIZE, RESTRICTION_TTL, channel_line, line_pattern, lines_window, matches, matches_any, wildcard
+from a10y.query import ROUTE_SIZE, read_post_file
+from a10y.nodes import NODES_TTL, QUERY_URL, parse_globalconfig, read_cache, save_nodes, stale as nodes_stale
+from a10y.inventory import Inventory, INVENTORY_FILE, INVENTORY_TTL, inventory_url
+from a10y.timeline import GEOCSV_HEADER, Frame, to_epoch, to_string, to_strings
+from a10y.results import ResultsModel
+from a10y.main import AUTOCOMPLETE_DEBOUNCE, EXTENT_FIRST, PROGRESSIVE, STATUS_LINES
+INVENTORY_CHECK = 3600  # seconds between checks for a stale node list and node inventories
+HEALTH_INTERVAL = 1  # seconds between updates of the node stats shown in the node list
 
 class AvailabilityUI(App):
     def __init__(self, nodes_urls, routing, **kwargs):
         self.nodes_urls = nodes_urls  # Store nodes for later use
         self.routing = routing  # Store routing URL
         self.config = kwargs  # Store remaining settings
+        self.engine = HttpEngine()  # Pooled HTTP session shared by all requests
+        self.scheduler = BatchScheduler()  # batch size and requests in flight of each node
+        self.results_lock = asyncio.Lock()  # Responses are drawn one at a time
+        self.inventory = Inventory(self.config.get("default_inventory_file", INVENTORY_FILE), ttl=self.config.get("default_inventory_ttl", INVENTORY_TTL))  # Local NSLC index for autocomplete
+        self.cache = AvailabilityCache(self.config.get("default_cache_file", CACHE_FILE), size=self.config.get("default_cache_size", CACHE_SIZE),
+                                       restriction_ttl=self.config.get("default_restriction_ttl", RESTRICTION_TTL))  # Availability segments and restrictions fetched before
+        self.restricted = {}  # restriction policy (True if restricted) of the channels seen
+        self.channel_nodes = {}  # availability URL of the node of each channel drawn
+        self.ranking = None  # fetch priority of the request lines, for the channels in view (ranking_keys)
+        self.ranking_keys = None
         super().__init__()  
+
+    def on_mount(self) -> None:
+        """Refresh the node list and prefetch the inventory of the nodes in the background, and keep them fresh"""
+        self.update_networks_dropdown()
+        self.refresh_nodes()
+        self.refresh_inventory()
+        self.set_interval(INVENTORY_CHECK, self.refresh_stale)
+        self.set_interval(HEALTH_INTERVAL, self.show_health)
+
+    async def on_unmount(self) -> None:
+        """Close the pooled HTTP session when the app shuts down"""
+        await self.engine.close()
+        self.inventory.close()
+        self.cache.close()
     
     def action_quit(self) -> None:
         """Ensure terminal resets properly when quitting."""
@@ -53,7 +80,7 @@ class AvailabilityUI(App):
         
     ]
 
-    req_text = ""
+    autocomplete_lookup = 0  # increases with every NSLC keystroke, so that stale responses are discarded
 
     def compose(self) -> ComposeResult:
         self.title = "Availability UI"
@@ -61,48 +88,66 @@ class AvailabilityUI(App):
         yield ScrollableContainer(
             Explanations(classes="box hide"),
             Requests(self.nodes_urls, self.config, classes="box"),  # Pass config
-            Collapsible(Status(), title="Status", classes="box", id="status-collapse"),
+            Collapsible(Status(self.config.get("default_status_lines", STATUS_LINES), self.config.get("default_status_log")), title="Status", classes="box", id="status-collapse"),
             Results(classes="box", id="results-widget"),
             id="application-container"
         )
         yield Footer()
-    def fetch_nodes_from_api(self):
-        """Fetch fresh nodes from API and update cache."""
-        nodes_urls = []
+    @work(exclusive=True, group="nodes")
+    async def refresh_nodes(self, force=False) -> None:
+        """Check the node list against the routing service once its cache is older than the TTL, and show new nodes live"""
+        cache_data = read_cache()
+        if not force and not nodes_stale(cache_data, self.config.get("default_nodes_ttl", NODES_TTL)):
+            return
+        button = self.query_one("#reload-nodes")
+        button.label = "Reloading..."
+        button.disabled = True
         try:
-            response = requests.get(QUERY_URL, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-
-            for node in data.get("datacenters", []):
-                node_name = node["name"]
-                fdsnws_url = None
-
-                for repo in node.get("repositories", []):
-                    for service in repo.get("services", []):
-                        if service["name"] == "fdsnws-station-1":
-                            fdsnws_url = service["url"]
-                            break
-                    if fdsnws_url:
-                        break
-
-                if fdsnws_url:
-                    parsed_url = urlparse(fdsnws_url)
-                    base_url = f"{parsed_url.scheme}://{parsed_url.netloc}/fdsnws/"
-                    nodes_urls.append((node_name, base_url, True))
-
-            if nodes_urls:
-                self.save_nodes_to_cache(nodes_urls)
-        except requests.RequestException:
-            pass
+            headers = {}
+            if cache_data.get("etag"):
+                headers["If-None-Match"] = cache_data["etag"]
+            if cache_data.get("last_modified"):
+                headers["If-Modified-Since"] = cache_data["last_modified"]
+            r = await self.engine.get(QUERY_URL, headers=headers)
+            if r.status == 304:
+                # unchanged since the last fetch, only restart the TTL
+                save_nodes(cache_data["nodes"], cache_data.get("etag"), cache_data.get("last_modified"))
+            elif r.status == 200:
+                nodes_urls = parse_globalconfig(r.text)
+                if nodes_urls:
+                    save_nodes(nodes_urls, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+                    self.update_nodes(nodes_urls)
+            else:
+                self.status(f'[red]Couldn\'t retrieve the node list from {QUERY_URL}[/red]')
         finally:
-            self.exit()
-
-    def save_nodes_to_cache(self, nodes):
-        """Save nodes to cache file permanently (no expiration)."""
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump({"nodes": nodes}, f)
+            button.label = "Reload Nodes"
+            button.disabled = False
+
+    def update_nodes(self, nodes_urls) -> None:
+        """Replace the nodes of the selection list, keeping the selection of the nodes already listed"""
+        if [url for _, url, _ in nodes_urls] == [url for _, url, _ in self.nodes_urls]:
+            return
+        nodes_list = self.query_one("#nodes")
+        known = {url for _, url, _ in self.nodes_urls}
+        selected = set(nodes_list.selected)
+        self.nodes_urls = nodes_urls
+        nodes_list.clear_options()
+        nodes_list.add_options([(name, url, url in selected or url not in known) for name, url, _ in nodes_urls])
+        self.status(f'[green]Updated the node list ({len(nodes_urls)} nodes)[/green]')
+        self.refresh_inventory()
+
+    def show_health(self) -> None:
+        """Show the latency and errors of each node next to it in the node list"""
+        nodes_list = self.query_one("#nodes")
+        for index, (name, url, _) in enumerate(self.nodes_urls):
+            summary = self.engine.health(url).summary()
+            prompt = Text.from_markup(f"{escape(name)}  [dim]{summary}[/dim]" if summary else escape(name))
+            if index < nodes_list.option_count and nodes_list.get_option_at_index(index).prompt != prompt:
+                nodes_list.replace_option_prompt_at_index(index, prompt)
+
+    def status(self, message) -> None:
+        """Append a (markup) message to the status log"""
+        self.query_one(StatusLog).write(message)
 
     def on_checkbox_changed(self, event: Checkbox.Changed) -> None:
         """Toggle between 'Select all' and 'Deselect all' when the checkbox is clicked."""
@@ -158,26 +203,104 @@ class AvailabilityUI(App):
             end.value = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
 
 
-    @work(thread=True)
-    def parallel_requests_autocomplete(self, url, data) -> None:
-        worker = get_current_worker()
+    async def request_stations(self, url, lines, lookup) -> None:
+        """Retrieve the stations of a node for the autocomplete of the station input, in adaptive batches"""
+        self.status(f'Retrieving Stations from {url}')
+        await self.scheduler.run(url, lines, lambda data: self.engine.post(url, f'format=text\n{data}'), lambda data, r: self.show_stations(url, r, lookup))
+
+
+    async def show_stations(self, url, r, lookup) -> None:
         autocomplete = self.query_one("#stations")
-        self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\nRetrieving Stations from {url}')
-        r = requests.post(url, data=f'format=text\n{data}')
-        if r.status_code != 200:
-            self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[red]Couldn\'t retrieve Stations from {url}[/red]')
+        if r.status != 200:
+            self.status(f'[red]Couldn\'t retrieve Stations from {url}[/red]')
         else:
-            self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[green]Retrieved Stations from {url}[/green]')
+            self.status(f'[green]Retrieved Stations from {url}[/green]')
+            # a newer keystroke has superseded this lookup
+            if lookup != self.autocomplete_lookup:
+                return
             autocomplete.items += [DropdownItem(s.split('|')[1]) for s in r.text.splitlines()[1:]]
-        self.query_one("#status-container").scroll_end()
 
 
-    @work(exclusive=True, thread=True)
+    async def request_channels(self, url, data, lookup) -> None:
+        """Retrieve the channels of a node for the autocomplete of the channel input"""
+        autocomplete = self.query_one("#channels")
+        self.status(f'Retrieving Channels from {url}')
+        r = await self.engine.post(url, f'format=text\nlevel=channel\n{data}')
+        if r.status != 200:
+            self.status(f'[red]Couldn\'t retrieve Channels from {url}[/red]')
+        else:
+            self.status(f'[green]Retrieved Channels from {url}[/green]')
+            # a newer keystroke has superseded this lookup
+            if lookup != self.autocomplete_lookup:
+                return
+            autocomplete.items += [DropdownItem(unique) for unique in {c.split('|')[3] for c in r.text.splitlines()[1:]}]
+
+
+    def selected_blocks(self, text):
+        """Routing blocks of a routing response that belong to the selected nodes"""
+        selected = self.query_one("#nodes").selected
+        return [(url, lines) for url, lines in parse_routing(text) if any([url.startswith(node_url) for node_url in selected])]
+
+
+    def refresh_stale(self) -> None:
+        self.refresh_nodes()
+        self.refresh_inventory()
+
+
+    @work(exclusive=True, group="inventory")
+    async def refresh_inventory(self) -> None:
+        """Fetch the channel inventory of every node whose local index is missing or older than the TTL"""
+        async def refresh_node(node_url):
+            url = inventory_url(node_url)
+            r = await self.engine.get(url)
+            if r.status != 200:
+                self.status(f'[red]Couldn\'t retrieve inventory from {url}[/red]')
+            else:
+                count = await asyncio.to_thread(self.inventory.store, node_url, r.text)
+                self.status(f'[green]Indexed {count} channels from {url}[/green]')
+                self.update_networks_dropdown()
+        await asyncio.gather(*[refresh_node(node_url) for node_url in self.inventory.stale([url for _, url, _ in self.nodes_urls])])
+
+
+    def update_networks_dropdown(self) -> None:
+        """Fill the networks dropdown with the networks of the selected nodes"""
+        selected = self.query_one("#nodes").selected
+        self.query_one("#networks").items = [DropdownItem(net) for net in self.inventory.codes("net", selected)]
+
+
+    def on_selection_list_selected_changed(self, event: SelectionList.SelectedChanged) -> None:
+        self.update_networks_dropdown()
+
+
+    def autocomplete_locally(self, input_id) -> None:
+        """Answer the dropdowns below the changed input from the local inventory, expanding FDSN wildcards"""
+        selected = self.query_one("#nodes").selected
+        net = self.query_one("#network").value
+        sta = self.query_one("#station").value
+        loc = self.query_one("#location").value
+        if input_id == "network":
+            self.query_one("#stations").items = [DropdownItem(s) for s in self.inventory.codes("sta", selected, net)]
+        if input_id in ("network", "station"):
+            self.query_one("#locations").items = [DropdownItem(l or '--') for l in self.inventory.codes("loc", selected, net, sta)]
+        self.query_one("#channels").items = [DropdownItem(c) for c in self.inventory.codes("cha", selected, net, sta, loc)]
+
+
     def on_input_changed(self, event: Input.Changed) -> None:
-        """A function to change status when an NSLC input field is submitted (i.e. is typed and enter is hit)"""
-        # COULD BE ON Change 
-        # keep app responsive while making requests
-        worker = get_current_worker()
+        """A function to fill the autocomplete dropdowns when an NSLC input field changes"""
+        if event.input.id in ("network", "station", "location") and self.inventory.indexed(self.query_one("#nodes").selected):
+            # the local index answers instantly and cancels any pending live lookup
+            self.autocomplete_lookup += 1
+            self.workers.cancel_group(self, "autocomplete")
+            self.autocomplete_locally(event.input.id)
+        elif event.input.id in ("network", "station"):
+            self.autocomplete_lookup += 1
+            self.autocomplete(event, self.autocomplete_lookup)
+
+
+    @work(exclusive=True, group="autocomplete")
+    async def autocomplete(self, event: Input.Changed, lookup) -> None:
+        """Debounced autocomplete lookup; a newer keystroke cancels this worker and its in-flight requests"""
+        await asyncio.sleep(self.config.get("default_autocomplete_debounce", AUTOCOMPLETE_DEBOUNCE))
         # for typing network
         if event.input == self.query_one("#network"):
             # clear previous results
@@ -185,30 +308,18 @@ class AvailabilityUI(App):
             autocomplete.items = []
             # get available stations from routing system
             net = self.query_one('#network').value
-            self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\nRetrieving routing info from {self.routing}service=station&format=post{"&net="+net if net else ""}')
-            self.query_one("#status-container").scroll_end()
-            r = requests.get(f'{self.routing}service=station&format=post{"&net="+net if net else ""}')
-            if r.status_code != 200:
-                self.call_from_thread(lambda: self.change_button_disabled(False))
-                self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[red]Couldn\'t retrieve routing info from {self.routing}service=station&format=post{"&net="+net if net else ""}[/red]')
-                self.query_one("#status-container").scroll_end()
+            routing_url = f'{self.routing}service=station&format=post{"&net="+net if net else ""}'
+            self.status(f'Retrieving routing info from {routing_url}')
+            r = await self.engine.get(routing_url)
+            if r.status != 200:
+                self.status(f'[red]Couldn\'t retrieve routing info from {routing_url}[/red]')
             else:
-                self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[green]Retrieved routing info from {self.routing}service=station&format=post{"&net="+net if net else ""}[/green]')
-                self.query_one("#status-container").scroll_end()
-                for line in r.text.splitlines()+['']:
-                    if line.startswith('http'):
-                        data = ''
-                        url = line
-                    elif line == "" and any([url.startswith(node_url) for node_url in self.query_one("#nodes").selected]):
-                        if not worker.is_cancelled:
-                            # execute the requests in parallel and in batches of 150
-                            lines = data.splitlines()
-                            batch_size = 150
-                            for i in range(0, len(lines), batch_size):
-                                batch_data = '\n'.join(lines[i:i+batch_size])
-                                self.parallel_requests_autocomplete(url, batch_data)
-                    else:
-                        data += f"{' '.join(line.split()[:4])} 1800-01-01 2200-12-31\n"
+                self.status(f'[green]Retrieved routing info from {routing_url}[/green]')
+                # execute the requests concurrently, each node in batches sized from its responses
+                await asyncio.gather(*[
+                    self.request_stations(url, [f"{' '.join(line.split()[:4])} 1800-01-01 2200-12-31" for line in lines], lookup)
+                    for url, lines in self.selected_blocks(r.text)
+                ])
         # for typing station
         elif event.input == self.query_one("#station"):
             # clear previous results
@@ -217,63 +328,140 @@ class AvailabilityUI(App):
             # get available channels from FDSN
             net = self.query_one('#network').value
             sta = self.query_one('#station').value
-            self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\nRetrieving routing info from {self.routing}service=station&format=post{"&net="+net if net else ""}{"&sta="+sta if sta else ""}')
-            self.query_one("#status-container").scroll_end()
-            r = requests.get(f'{self.routing}service=station&format=post{"&net="+net if net else ""}{"&sta="+sta if sta else ""}')
-            if r.status_code != 200:
-                self.call_from_thread(lambda: self.change_button_disabled(False))
-                self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[red]Couldn\'t retrieve routing info from {self.routing}service=station&format=post{"&net="+net if net else ""}{"&sta="+sta if sta else ""}[/red]')
-                self.query_one("#status-container").scroll_end()
+            routing_url = f'{self.routing}service=station&format=post{"&net="+net if net else ""}{"&sta="+sta if sta else ""}'
+            self.status(f'Retrieving routing info from {routing_url}')
+            r = await self.engine.get(routing_url)
+            if r.status != 200:
+                self.status(f'[red]Couldn\'t retrieve routing info from {routing_url}[/red]')
             else:
-                self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[green]Retrieved routing info from {self.routing}service=station&format=json{"&net="+net if net else ""}{"&sta="+sta if sta else ""}[/green]')
-                self.query_one("#status-container").scroll_end()
-                for line in r.text.splitlines()+['']:
-                    if line.startswith('http'):
-                        data = ''
-                        url = line
-                    elif line == "" and any([url.startswith(node_url) for node_url in self.query_one("#nodes").selected]):
-                        self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\nRetrieving Channels from {url}')
-                        r = requests.post(url, data=f'format=text\nlevel=channel\n{data}')
-                        if r.status_code != 200:
-                            self.call_from_thread(lambda: self.change_button_disabled(False))
-                            self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[red]Couldn\'t retrieve Channels from {url}[/red]')
-                            self.query_one("#status-container").scroll_end()
-                        else:
-                            self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[green]Retrieved Channels from {url}[/green]')
-                            self.query_one("#status-container").scroll_end()
-                            autocomplete.items += [DropdownItem(unique) for unique in {c.split('|')[3] for c in r.text.splitlines()[1:]}]
-                    else:
-                        data += f'{line}\n'
-
-
-    @work(thread=True)
-    def parallel_requests_availability(self, url, data) -> None:
-        worker = get_current_worker()
+                self.status(f'[green]Retrieved routing info from {routing_url}[/green]')
+                await asyncio.gather(*[self.request_channels(url, '\n'.join(lines), lookup) for url, lines in self.selected_blocks(r.text)])
+
+
+    def auto_mergegaps(self) -> str:
+        """Mergegaps (whole seconds) of the auto mode: the length of a cell of the timelines, so that each trace and gap
+        of a cell is still drawn within it but the gaps shorter than a cell are not drawn at all; empty if the window
+        is not valid or a cell lasts less than a second"""
+        try:
+            start, end = to_epoch([self.query_one("#start").value, self.query_one("#end").value]).tolist()
+        except ValueError:
+            return ""
+        cell = int((end - start) / 10**6 / TimelineView.spans_for(self.query_one("#results-widget").size.width))
+        return str(cell) if cell >= 1 else ""
+
+
+    def merged_mode(self) -> bool:
+        """Whether the traces are requested merged at the resolution of the timelines (auto mergegaps); this is lossy
+        until refined, since a cell holding a gap shorter than a cell is drawn as a trace, so the user is told"""
+        tolerance = self.query_one("#auto-mergegaps").value and self.auto_mergegaps()
+        if tolerance:
+            self.status(f'[orange1]Auto mergegaps: gaps shorter than {tolerance} s are merged and not drawn until zooming in or opening a channel[/orange1]')
+        return bool(tolerance)
+
+
+    def availability_options(self, mergegaps=None) -> str:
+        """The option lines of the availability POST requests, as set in the form (or derived from the timelines in auto mode)
+        unless another mergegaps is given"""
         merge = ",".join([option for option, bool in zip(['samplerate', 'quality', 'overlap'], [self.query_one("#samplerate").value, self.query_one("#qual").value, self.query_one("#overlap").value]) if bool])
-        mergegaps = str(self.query_one("#mergegaps").value)
+        if mergegaps is None:
+            mergegaps = self.auto_mergegaps() if self.query_one("#auto-mergegaps").value else str(self.query_one("#mergegaps").value)
         quality = ",".join([q for q, bool in zip(['D', 'R', 'Q', 'M'], [self.query_one("#qd").value, self.query_one("#qr").value, self.query_one("#qq").value, self.query_one("#qm").value]) if bool])
-        restricted = self.query_one("#restricted").value
-        self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\nIssuing request to {url}')
-        self.query_one("#status-container").scroll_end()
-        r = requests.post(url, data=f'{"quality="+quality if quality else ""}\n{"mergegaps="+mergegaps if mergegaps else ""}\nformat=geocsv\n{"merge="+merge if merge else ""}\n{"includerestricted=TRUE" if restricted else ""}\n{data}')
-        if r.status_code == 204:
-            self.call_from_thread(lambda: self.change_button_disabled(False))
-            self.query_one('#status-line').update(f'{self.query_one("#status-line").renderable}\n[red]No data available from {url}[/red]')
-            if "hide" not in self.query_one("#loading").classes:
-                self.query_one("#loading").add_class("hide")
-        elif r.status_code != 200:
-            self.call_from_thread(lambda: self.change_button_disabled(False))
-            self.query_one('#status-line').update(f'{self.query_one("#status-line").renderable}\n[red]Request to {url} failed. See below for more details[/red]')
+        return availability_options(quality, merge, mergegaps, self.query_one("#restricted").value)
+
+
+    def coarse_options(self):
+        """Option lines of the coarse requests of a long time window, merging the gaps shorter than a cell of the timelines;
+        None if the window is short enough to be fetched in full detail right away"""
+        days = self.config.get("default_progressive", PROGRESSIVE)
+        if self.query_one("#auto-mergegaps").value:
+            return None
+        try:
+            start, end = to_epoch([self.query_one("#start").value, self.query_one("#end").value]).tolist()
+            mergegaps = float(self.query_one("#mergegaps").value or 0)
+        except ValueError:
+            return None
+        cell = (end - start) / 10**6 / TimelineView.spans_for(self.query_one("#results-widget").size.width)
+        if not days or end - start <= days * 86400 * 10**6 or cell <= mergegaps:
+            return None
+        return self.availability_options(str(int(cell)))
+
+
+    def view_ranking(self):
+        """Fetch priority of the request lines: 0 for a line matching a channel in view, 1 otherwise;
+        the same ranking function is returned until the channels in view change"""
+        visible = self.query_one(TimelineView).visible_set() if self.query(TimelineView) else frozenset()
+        if self.ranking is None or self.ranking_keys is not visible:
+            self.ranking_keys = visible
+            self.ranking = lambda line: 0 if matches_any(line_pattern(line), visible) else 1
+        return self.ranking
+
+
+    async def request_node(self, url, lines, options, coarse=None, merged=False) -> None:
+        """Request the availability of the request lines of a node, and the restriction policy of their channels alongside"""
+        if self.config.get("default_extent_first", EXTENT_FIRST):
+            lines = await self.prune(url, lines, options)
+        await asyncio.gather(self.request_traces(url, lines, options, coarse, merged), self.request_restrictions(url, lines, options))
+
+
+    async def request_traces(self, url, lines, options, coarse=None, merged=False) -> None:
+        """Draw the cached availability of the request lines of a node and fetch only the intervals missing from the cache;
+        with coarse options, a coarse timeline is drawn first and refined with the detailed traces.
+        Traces merged at the resolution of the timelines (auto mergegaps) are drawn as coarse ones, to be refined on demand."""
+        rows, missing = await asyncio.to_thread(self.cache.lookup, url, options, lines)
+        if rows:
+            self.status(f'[green]Loaded {len(rows)} segments from the cache of {url}[/green]')
+            cached = Response(url, 200, GEOCSV_HEADER + '\n'.join(rows), f'{options}\n' + '\n'.join(lines))
+            async with self.results_lock:
+                await self.show_results(cached, merged)
+        # long windows are fetched in time shards, in parallel
+        if coarse is None:
+            await self.scheduler.run_shards(url, missing, lambda data: self.request_availability(url, data, options, merged=merged),
+                                            lambda data, r: self.receive_availability(url, data, options, r))
+            return
+        await self.scheduler.run(url, missing, lambda data: self.request_availability(url, data, coarse, draw=False), lambda data, r: self.receive_coarse(r))
+        # the detailed traces of the channels in view are fetched first
+        await self.scheduler.run_shards(url, missing, lambda data: self.request_availability(url, data, options),
+                                        lambda data, r: self.receive_availability(url, data, options, r), self.view_ranking)
+
+
+    async def request_availability(self, url, data, options, draw=True, merged=False) -> Response:
+        """Issue one availability request; with draw, its traces are drawn and staged in the cache in batches as the response arrives,
+        and cached once it completes"""
+        self.status(f'Issuing request to {url}')
+        if not draw:
+            return await self.engine.post(url, f'{options}\n{data}')
+        response = self.cache.begin()
+
+        async def show(rows):
+            await asyncio.to_thread(self.cache.stage, response, rows)
+            async with self.results_lock:
+                await self.show_results(Response(url, 200, rows, f'{options}\n{data}'), merged)
+
+        r = await post_geocsv(self.engine, url, f'{options}\n{data}', show)
+        await asyncio.to_thread(self.cache.commit, response, url, options, data.splitlines(), r.status in (200, 204))
+        return r
+
+
+    async def receive_coarse(self, r) -> None:
+        """Draw the traces of a coarse availability response; failures are left to the detailed requests to report"""
+        if r.status == 200:
+            async with self.results_lock:
+                await self.show_results(r, coarse=True)
+
+
+    async def receive_availability(self, url, data, options, r) -> None:
+        """Report the outcome of an availability response, already drawn and cached as it arrived"""
+        if r.status == 204:
+            self.status(f'[red]No data available from {url}[/red]')
+        elif r.status != 200:
+            self.status(f'[red]Request to {url} failed. See below for more details[/red]')
             self.query_one("#error-results").remove_class("hide")
-            self.query_one("#error-results").update(f'[red]{self.query_one("#error-results").renderable}\n{r.text}[/red]')
+            self.query_one("#error-results").update(f'[red]{self.query_one("#error-results").renderable}\n{escape(r.text)}[/red]')
             self.query_one("#error-results").scroll_end()
-            if "hide" not in self.query_one("#loading").classes:
-                self.query_one("#loading").add_class("hide")
-        else: 
-            self.query_one('#status-line').update(f'{self.query_one("#status-line").renderable}\n[green]Request to {url} successfully returned data[/green]')
-            self.req_text += f'\n{r.text}'
-            self.call_from_thread(self.show_results, r)
-        self.query_one("#status-container").scroll_end()
+        else:
+            self.status(f'[green]Request to {url} successfully returned data[/green]')
+
+
     def change_button_disabled(self, disabled: bool) -> None:
         """Enable or disable the button safely in the main thread."""
         try:
@@ -283,36 +471,34 @@ class AvailabilityUI(App):
         except Exception as e:
             print(f"Error: {e}")
 
-    @work(exclusive=True, thread=True)
-    async def on_button_pressed(self, event: Button.Pressed) -> None:
-        self.call_from_thread(lambda: self.change_button_disabled(True))
-        # Disable the button to prevent multiple clicks
+    def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "reload-nodes":
-            button = self.query_one("#reload-nodes")
-            button.label = "Reloading..."
-            button.disabled = True
-            self.fetch_nodes_from_api()
+            self.refresh_nodes(force=True)
+        else:
+            self.send_request(event.button)
+
+    @work(exclusive=True, group="availability")
+    async def send_request(self, button: Button) -> None:
+        """A function to send availability request when Send button (or the file button) is clicked"""
+        # Disable the button to prevent multiple clicks
+        self.change_button_disabled(True)
         try:
             start = self.query_one("#start").value
             end = self.query_one("#end").value
             if not start.strip():
-                self.query_one("#status-line").update("[red]Error: Start time is required![/red]")
-                self.call_from_thread(lambda: self.change_button_disabled(False))
+                self.status("[red]Error: Start time is required![/red]")
                 return  # Stop execution if invalid
 
             if not end.strip():
-                self.query_one("#status-line").update("[red]Error: End time is required![/red]")
-                self.call_from_thread(lambda: self.change_button_disabled(False))
+                self.status("[red]Error: End time is required![/red]")
                 return  # Stop execution if invalid
 
 
-            self.query_one("#status-line").update("[green]Sending request...[/green]")
-            """A function to send availability request when Send button is clicked"""
-            worker = get_current_worker()
+            self.status("[green]Sending request...[/green]")
             # clear previous results
-            self.req_text = ""
+            self.workers.cancel_group(self, "refine")
             if self.query(ContentSwitcher):
-                self.query_one(ContentSwitcher).remove()
+                await self.query_one(ContentSwitcher).remove()
             self.query_one("#error-results").update("")
             self.query_one("#error-results").add_class("hide")
             # show loading indicator in results
@@ -325,185 +511,202 @@ class AvailabilityUI(App):
             start = self.query_one("#start").value
             end = self.query_one("#end").value
             # request from send button
-            if event.button == self.query_one("#request-button"):
+            if button == self.query_one("#request-button"):
                 params = f"&format=post{'&net='+net if net else ''}{'&sta='+sta if sta else ''}{'&loc='+loc if loc else ''}{'&cha='+cha if cha else ''}{'&start='+start if start else ''}{'&end='+end if end else ''}"
-                self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\nRetrieving routing info from {self.routing}service=availability{params}')
-                self.query_one("#status-container").scroll_end()
-                r = requests.get(f'{self.routing}service=availability{params}')
-                if r.status_code != 200:
-                    self.call_from_thread(lambda: self.change_button_disabled(False)) 
-                    self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[red]Couldn\'t retrieve routing info from {self.routing}service=availability{params}[/red]')
-                    self.query_one("#status-container").scroll_end()
-                    self.query_one("#loading").add_class("hide")
+                self.status(f'Retrieving routing info from {self.routing}service=availability{params}')
+                r = await self.engine.get(f'{self.routing}service=availability{params}')
+                if r.status != 200:
+                    self.status(f'[red]Couldn\'t retrieve routing info from {self.routing}service=availability{params}[/red]')
                 else:
-                    self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[green]Retrieved routing info from {self.routing}service=availability{params}[/green]')
-                    self.query_one("#status-container").scroll_end()
-                    at_least_one = False
-                    for line in r.text.splitlines()+['']:
-                        if line.startswith('http'):
-                            data = ''
-                            url = line
-                        elif line == "" and any([url.startswith(node_url) for node_url in self.query_one("#nodes").selected]):
-                            if not worker.is_cancelled:
-                                at_least_one = True
-                                # execute the requests in parallel and in batches of 100
-                                lines = data.splitlines()
-                                batch_size = 100
-                                for i in range(0, len(lines), batch_size):
-                                    batch_data = '\n'.join(lines[i:i+batch_size])
-                                    self.parallel_requests_availability(url, batch_data)
-                        else:
-                            data += f'{line}\n'
-                    if not at_least_one:
-                        self.query_one('#status-line').update(f'{self.query_one("#status-line").renderable}\n[red]No data available[/red]')
-                        self.call_from_thread(lambda: self.change_button_disabled(False))
-                        self.query_one("#status-container").scroll_end()
-                        if "hide" not in self.query_one("#loading").classes:
-                            self.query_one("#loading").add_class("hide")
+                    self.status(f'[green]Retrieved routing info from {self.routing}service=availability{params}[/green]')
+                    blocks = self.selected_blocks(r.text)
+                    if not blocks:
+                        self.status(f'[red]No data available[/red]')
+                    # execute the requests concurrently and in adaptive batches per node, skipping what is cached
+                    options = self.availability_options()
+                    coarse = self.coarse_options()
+                    merged = self.merged_mode()
+                    await asyncio.gather(*[self.request_node(url, lines, options, coarse, merged) for url, lines in blocks])
             # request from file button
-            elif event.button == self.query_one("#file-button"):
+            elif button == self.query_one("#file-button"):
                 filename = self.query_one("#post-file").value
                 if os.path.isfile(filename):
-                    self.query_one('#status-line').update(f'{self.query_one("#status-line").renderable}\nReading NSLC from file {filename}')
-                    self.query_one("#status-container").scroll_end()
-                    data = ''
-                    with open(filename, 'r') as f:
-                        for l in f.readlines():
-                            if '=' not in l:
-                                data += f"{' '.join(l.split()[:4])} {start} {end}\n"
-                    for url in self.query_one("#nodes").selected:
-                        if not worker.is_cancelled:
-                            self.parallel_requests_availability(url+'availability/1/query', data)
-            
-        
+                    self.status(f'Reading NSLC from file {filename}')
+                    options = self.availability_options()
+                    coarse = self.coarse_options()
+                    merged = self.merged_mode()
+                    routing = self.routing.rstrip('?')
+                    fetches = []
+                    try:
+                        # route the file a chunk at a time, each node getting only its own lines
+                        for lines in chunks(read_post_file(filename, start, end), ROUTE_SIZE):
+                            self.status(f'Retrieving routing info from {routing} for {len(lines)} lines of {filename}')
+                            r = await self.engine.post(routing, routing_data(lines))
+                            if r.status == 200:
+                                blocks = self.selected_blocks(r.text)
+                                fetches.append(asyncio.gather(*[self.request_node(url, node_lines, options, coarse, merged) for url, node_lines in blocks]))
+                            elif r.status != 204:
+                                self.status(f'[red]Couldn\'t retrieve routing info from {routing}[/red]')
+                        await asyncio.gather(*fetches)
+                    finally:
+                        for fetch in fetches:
+                            fetch.cancel()
         finally:
-            pass
-        
+            self.change_button_disabled(False)
+            if "hide" not in self.query_one("#loading").classes:
+                self.query_one("#loading").add_class("hide")
+
 
-    async def show_results(self, r):
+    async def show_results(self, r, coarse=False):
         """The function responsible for drawing and showing the timelines"""
         csv_results = r.text
-        request = r.request
         if not self.query(ContentSwitcher):
-            await self.query_one('#results-widget').mount(ContentSwitcher(Container(id="lines"), ScrollableContainer(Static(id="plain"), id="plain-container"), initial="lines"))
-            infoBar = Static("Quality:     Timestamp:                       Trace start:                       Trace end:                    ", id="info-bar")
-            self.query_one('#lines').mount(infoBar)
-            self.query_one('#lines').mount(ScrollableContainer(id="results-container"))
+            if not self.query_one("#start").value.strip():
+                self.status("[orange1]⚠️ Please enter a start date![/orange1]")
+                return 
+            if not self.query_one("#end").value.strip():
+                self.status("[orange1]⚠️ Please enter an end date![/orange1]")
+                return  # Stop execution if the end date is missing
+            try:
+                start_frame = datetime.strptime(self.query_one("#start").value, "%Y-%m-%dT%H:%M:%S")
+            except:
+                start_frame = datetime.strptime(self.query_one("#start").value+"T00:00:00", "%Y-%m-%dT%H:%M:%S")
+            try:
+                end_frame = datetime.strptime(self.query_one("#end").value, "%Y-%m-%dT%H:%M:%S")
+            except:
+                end_frame = datetime.strptime(self.query_one("#end").value+"T00:00:00", "%Y-%m-%dT%H:%M:%S")
             # Dynamically calculate num_spans based on the results container width
-            num_spans = self.query_one("#results-widget").size.width // 2  # Scale width properly
-            num_spans = max(num_spans, 160)  # Ensure a reasonable span count
-
-
-        if not self.query_one("#start").value.strip():
-            self.query_one("#status-line").update(
-                f"{self.query_one('#status-line').renderable}\n[orange1]⚠️ Please enter a start date![/orange1]"
-            )
-            return 
-        if not self.query_one("#end").value.strip():
-            self.query_one("#status-line").update(
-                f"{self.query_one('#status-line').renderable}\n[orange1]⚠️ Please enter an end date![/orange1]"
-            )
-            return  # Stop execution if the end date is missing
-        try:
-            start_frame = datetime.strptime(self.query_one("#start").value, "%Y-%m-%dT%H:%M:%S")
-        except:
-            start_frame = datetime.strptime(self.query_one("#start").value+"T00:00:00", "%Y-%m-%dT%H:%M:%S")
-        try:
-            end_frame = datetime.strptime(self.query_one("#end").value, "%Y-%m-%dT%H:%M:%S")
-        except:
-            end_frame = datetime.strptime(self.query_one("#end").value+"T00:00:00", "%Y-%m-%dT%H:%M:%S")
-        span_frame = (end_frame - start_frame) / num_spans
-        lines = {} # for lines of each nslc, contains line characters
-        infos = {} # for the info-bar of each nslc, contains a list of lists (one inner list for each span) for each channel; inner lists format: [quality/gaps, timestamp, trace_start, trace_end, span_start, span_end]
-        csv_results = csv_results.splitlines()[5:]
-        for row in csv_results:
-            parts = row.split('|')
-            key = f"{parts[0]}_{parts[1]}_{parts[2]}_{parts[3]}"
-            # initialization
-            if key not in lines:
-                lines[key] = [' ' for i in range(num_spans)]
-                infos[key] = [["", "", "", "", "", ""] for i in range(num_spans)]
-                for i in range(num_spans):
-                    infos[key][i][1] = (start_frame+(i+0.5)*span_frame).strftime("%Y-%m-%dT%H:%M:%S")  # timestamp in the middle of each span
-                    infos[key][i][4] = start_frame + i * span_frame
-                    infos[key][i][5] = end_frame if i == num_spans - 1 else start_frame + (i + 1) * span_frame
-            start_trace = datetime.strptime(parts[6], "%Y-%m-%dT%H:%M:%S.%fZ")
-            end_trace = datetime.strptime(parts[7], "%Y-%m-%dT%H:%M:%S.%fZ")
-            first_span = math.floor((start_trace-start_frame) / span_frame)
-            last_span = min(math.ceil((end_trace-start_frame) / span_frame), num_spans)
-            for i in range(first_span, last_span):
-                if lines[key][i] == ' ':
-                    char = '━'
-                    if i == first_span and infos[key][i][4] < start_trace:
-                        char = '┗'
-                    elif i == last_span - 1 and end_trace < infos[key][i][5]:
-                        char = '┛'
-                    if parts[4] == 'D':
-                        lines[key][i] = f'[orange1]{char}[/orange1]'
-                        infos[key][i] = ['D', infos[key][i][1], start_trace.strftime("%Y-%m-%dT%H:%M:%S"), end_trace.strftime("%Y-%m-%dT%H:%M:%S"), infos[key][i][4], infos[key][i][5]]
-                    elif parts[4] == 'R':
-                        lines[key][i] = f'[green1]{char}[/green1]'
-                        infos[key][i] = ['R', infos[key][i][1], start_trace.strftime("%Y-%m-%dT%H:%M:%S"), end_trace.strftime("%Y-%m-%dT%H:%M:%S"), infos[key][i][4], infos[key][i][5]]
-                    elif parts[4] == 'Q':
-                        lines[key][i] = f'[orchid]{char}[/orchid]'
-                        infos[key][i] = ['Q', infos[key][i][1], start_trace.strftime("%Y-%m-%dT%H:%M:%S"), end_trace.strftime("%Y-%m-%dT%H:%M:%S"), infos[key][i][4], infos[key][i][5]]
-                    elif parts[4] == 'M':
-                        lines[key][i] = f'[turquoise4]{char}[/turquoise4]'
-                        infos[key][i] = ['M', infos[key][i][1], start_trace.strftime("%Y-%m-%dT%H:%M:%S"), end_trace.strftime("%Y-%m-%dT%H:%M:%S"), infos[key][i][4], infos[key][i][5]]
-                elif any(c in lines[key][i] for c in ['━', '┗', '┛']):
-                    lines[key][i] = '╌'
-                    # start of gap is the end of previously found trace in this span and end of gap is the start of the new trace
-                    infos[key][i] = ['1', infos[key][i][1], infos[key][i][3], start_trace.strftime("%Y-%m-%dT%H:%M:%S"), infos[key][i][4], infos[key][i][5]]
-                elif lines[key][i] == '╌' or lines[key][i] == '┄':
-                    lines[key][i] = '┄'
-                    # start of gaps is the start of the first gap in this span and end is the start of the new trace
-                    infos[key][i] = [str(int(infos[key][i][0])+1), infos[key][i][1], infos[key][i][2], start_trace.strftime("%Y-%m-%dT%H:%M:%S"), infos[key][i][4], infos[key][i][5]]
-        # longest possible label to align start of lines
-        longest_label = 26
-        for k in lines:
-            infos[k].append(("", "", "", "", "", "")) # because cursor can go one character after the end of the input
-            # add infos in long gaps
-            # switched off because leads to O(num_spans*num_channels*len(csv_results)) complexity and makes app too slow for long availability output
-            #for i in range(num_spans):
-                #if lines[k][i] == ' ':
-                    # long gap starts after the latest of the traces that exist before the current span
-                    #infos[k][i][2] = max([datetime.strptime(row.split('|')[7], "%Y-%m-%dT%H:%M:%S.%fZ") for row in csv_results if datetime.strptime(row.split('|')[7], "%Y-%m-%dT%H:%M:%S.%fZ") < datetime.strptime(infos[k][i][1], "%Y-%m-%dT%H:%M:%S")] + [start_frame])
-                    #infos[k][i][2] = infos[k][i][2].strftime("%Y-%m-%dT%H:%M:%S")
-                    # long gap ends before the earliest of the traces that exist after the current span
-                    #infos[k][i][3] = min([datetime.strptime(row.split('|')[6], "%Y-%m-%dT%H:%M:%S.%fZ") for row in csv_results if datetime.strptime(row.split('|')[6], "%Y-%m-%dT%H:%M:%S.%fZ") > datetime.strptime(infos[k][i][1], "%Y-%m-%dT%H:%M:%S")] + [end_frame])
-                    #infos[k][i][3] = infos[k][i][3].strftime("%Y-%m-%dT%H:%M:%S")
-            # add line in results
-            await self.query_one('#results-container').mount(Horizontal(Label(f"{k} ┄{' '*(longest_label-len(k))}"), CursoredText(value=''.join(lines[k]), info=infos[k], id=f"_{k}"), classes="result-item"))
-        if self.query(CursoredText):
-            self.query(CursoredText)[0].focus()
+            num_spans = TimelineView.spans_for(self.query_one("#results-widget").size.width)
+            try:
+                mergegaps = float((self.auto_mergegaps() if self.query_one("#auto-mergegaps").value else self.query_one("#mergegaps").value) or 0)
+            except ValueError:
+                mergegaps = 0.0
+            # all responses of the request are folded into the same results
+            self.results = ResultsModel(Frame(np.datetime64(start_frame, 'us').astype(np.int64), np.datetime64(end_frame, 'us').astype(np.int64), num_spans), mergegaps)
+            infoBar = Static("Quality:     Timestamp:                       Trace start:                       Trace end:                    ", id="info-bar")
+            await self.query_one('#results-widget').mount(ContentSwitcher(Container(infoBar, TimelineView(self.results, id="timeline"), id="lines"), PlainView(self.results, id="plain-container"), initial="lines"))
+        timeline = self.query_one(TimelineView)
+        # merge the traces into their channels and redraw only the rows that changed
+        changed = self.results.add(csv_results, coarse, None if coarse else lines_window(r.data.splitlines()))
+        self.channel_nodes.update((self.results.keys[row], r.url) for row in changed)
+        # channels drawn after their restriction policy arrived
+        timeline.set_restrictions({key: self.restricted[key] for key in (self.results.keys[row] for row in changed) if key in self.restricted})
+        timeline.update_rows(changed)
+        if self.query_one(ContentSwitcher).current == "plain-container":
+            self.query_one(PlainView).reload()
+        elif timeline.keys and self.focused is not timeline:
+            timeline.focus()
         if "hide" not in self.query_one("#loading").classes:
             self.query_one("#loading").add_class("hide")
-        # show restrictions info for each channel using /extent method of availability webservice
-        self.show_restriction(request)
-
-
-
-    @work(thread=True)
-    def show_restriction(self, request):
-        """A function for showing whether a channel is restricted or not"""
-        worker = get_current_worker()
-        new_url = request.url.replace("query", "extent")
-        old_body = request.body.split('\n')
-        filtered = [row for row in old_body if "mergegaps" not in row]
-        new_body = '\n'.join(filtered)
-        self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\nRetrieving restrictions info from {new_url}')
-        r = requests.post(new_url, data=new_body)
-        if r.status_code == 200:
-            self.call_from_thread(lambda: self.change_button_disabled(False))
-            self.query_one("#status-line").update(f'{self.query_one("#status-line").renderable}\n[green]Retrieved restrictions info from {new_url}[/green]')
-            for line in r.text.splitlines()[5:]:
-                parts = line.split('|')
-                nslc = f"{parts[0]}_{parts[1]}_{parts[2]}_{parts[3]}"
-                label_item = self.query_one(f"#_{nslc}").parent.query_one(Label)
-                if parts[10] == "RESTRICTED":
-                    label_item.update(f"{label_item.renderable[:len(nslc)+1]}[red1][b]R[/b][/red1]{label_item.renderable[len(nslc)+2:]}")
-                else:
-                    label_item.update(f"{label_item.renderable[:len(nslc)+1]} {label_item.renderable[len(nslc)+2:]}")
+
+
+    async def request_extents(self, url, lines, options, receive) -> None:
+        """Send request lines of a node to the /extent method of the availability webservice in batches, passing each batch
+        and the restriction of the channels returned to receive(lines, restricted), restricted being None if the request failed"""
+        extent_url = url.removesuffix("query") + "extent"
+        extent_options = '\n'.join(line for line in options.split('\n') if "mergegaps" not in line)
+
+        async def handle(data, r):
+            if r.status not in (200, 204):
+                self.status(f'[red]Couldn\'t retrieve extents from {extent_url}[/red]')
+                await receive(data.splitlines(), None)
+                return
+            restricted = parse_extents(r.text) if r.status == 200 else {}
+            self.status(f'[green]Retrieved the extents of {len(restricted)} channels from {extent_url}[/green]')
+            self.apply_restrictions(restricted)
+            await receive(data.splitlines(), restricted)
+
+        await self.scheduler.run(extent_url, lines, lambda data: self.engine.post(extent_url, f'{extent_options}\n{data}'), handle)
+
+
+    async def request_restrictions(self, url, lines, options) -> None:
+        """Show whether the channels of the request lines of a node are restricted, from the cache or from their extents"""
+        cached, missing = await asyncio.to_thread(self.cache.restrictions, url, lines)
+        self.apply_restrictions(cached)
+        await self.request_extents(url, missing, options, lambda batch, restricted: self.store_restrictions(url, batch, restricted))
+
+
+    async def store_restrictions(self, url, lines, restricted) -> None:
+        if restricted is not None:
+            await asyncio.to_thread(self.cache.store_restrictions, url, lines, restricted)
+
+
+    async def prune(self, url, lines, options) -> list:
+        """Replace the wildcard request lines of a node by one line per channel whose extent overlaps their time window,
+        so that the channels without data are not requested; the extents fetched within the TTL are taken from the cache"""
+        wildcards = [line for line in lines if wildcard(line_pattern(line))]
+        if not wildcards:
+            return lines
+        pruned = [line for line in lines if not wildcard(line_pattern(line))]
+        known, missing = await asyncio.to_thread(self.cache.expansions, url, wildcards)
+        for line, keys in known.items():
+            pruned += [channel_line(key, line) for key in keys]
+            self.report_no_data(url, line, keys)
+
+        async def receive(batch, restricted):
+            if restricted is None:
+                # request the lines in full detail rather than not at all
+                pruned.extend(batch)
+                return
+            expanded = []
+            for line in batch:
+                keys = [key for key in restricted if matches(line_pattern(line), key)]
+                expanded += [channel_line(key, line) for key in keys]
+                self.report_no_data(url, line, keys)
+            pruned.extend(expanded)
+            # the extents also answer the restriction lookups of the expanded lines
+            await self.store_restrictions(url, batch + expanded, restricted)
+
+        if missing:
+            self.status(f'Retrieving the extents of {len(missing)} wildcard lines from {url}')
+            await self.request_extents(url, missing, options, receive)
+        return pruned
+
+
+    def report_no_data(self, url, line, keys) -> None:
+        """Report the channels of a wildcard request line without data in its time window, as far as the inventory knows them"""
+        node = url.split("availability/")[0]
+        if self.inventory.indexed([node]):
+            empty = len({'_'.join(codes) for codes in self.inventory.expand([node], *line.split()[:4])} - set(keys))
+        else:
+            empty = 0 if keys else "all"
+        if empty:
+            self.status(f'[orange1]No data for {empty} channels of {line_pattern(line)} in the time window at {url}[/orange1]')
+
+
+    def apply_restrictions(self, restricted) -> None:
+        """Mark the rows of channels as restricted or open, remembering the channels not drawn yet"""
+        self.restricted.update(restricted)
+        if self.query(TimelineView):
+            self.query_one(TimelineView).set_restrictions(restricted)
+
+
+    def refetch(self, frame, span) -> None:
+        """Request a zoomed time frame again, merging only the gaps shorter than its cells; in auto mode, only the channels in view
+        still merged within the frame are fetched again for it, the requested window being kept to zoom out locally"""
+        if self.query_one("#auto-mergegaps").value:
+            keys = [key for key in self.query_one(TimelineView).visible_keys() if self.results.merged(key, frame.start, frame.end)]
+            if keys:
+                self.refine(keys, (frame.start, frame.end))
+            return
+        self.query_one("#start").value = to_string(frame.start)
+        self.query_one("#end").value = to_string(frame.end)
+        self.query_one("#mergegaps").value = str(int(span * 10) / 10)
+        self.action_send_button()
+
+
+    @work(exclusive=True, group="refine")
+    async def refine(self, keys, window=None) -> None:
+        """Fetch the traces of channels merged at the resolution of the timelines again, with the mergegaps of the form,
+        over a part of the requested window if given"""
+        start, end = to_strings(window or self.results.window)
+        lines = {}
+        for key in keys:
+            if key in self.channel_nodes:
+                lines.setdefault(self.channel_nodes[key], []).append(f"{' '.join(code or '--' for code in key.split('_'))} {start} {end}")
+        self.status(f'Retrieving the detailed traces of {keys[0] if len(keys) == 1 else f"{len(keys)} channels"} from {start} to {end}')
+        options = self.availability_options(str(self.query_one("#mergegaps").value))
+        await asyncio.gather(*[self.request_traces(url, node_lines, options) for url, node_lines in lines.items()])
 
 
     def action_toggle_help(self) -> None:
@@ -521,41 +724,34 @@ class AvailabilityUI(App):
 
     def action_first_line(self) -> None:
         """An action to move focus to the first line"""
-        if self.query(CursoredText):
-            self.query(CursoredText)[0].focus()
+        if self.query(TimelineView) and self.query_one(TimelineView).keys:
+            self.query_one(TimelineView).focus()
+            self.query_one(TimelineView).move_cursor(0, 0)
 
 
     def action_last_line(self) -> None:
         """An action to move focus to the last line"""
-        if self.query(CursoredText):
-            self.query(CursoredText)[-1].focus()
+        if self.query(TimelineView) and self.query_one(TimelineView).keys:
+            self.query_one(TimelineView).focus()
+            self.query_one(TimelineView).move_cursor(len(self.query_one(TimelineView).keys) - 1, 0)
             self.query_one("#application-container").scroll_end()
 
 
+    def show_plain(self, nslc) -> None:
+        """Toggle the results to the plain text rows of a channel"""
+        self.query_one(ContentSwitcher).current = "plain-container"
+        self.query_one(PlainView).show(nslc)
+        self.query_one(PlainView).focus()
+        if self.results.merged(nslc):
+            self.refine([nslc])
+
+
     def action_lines_view(self) -> None:
         if self.query(ContentSwitcher) and self.query_one(ContentSwitcher).current == "plain-container":
             self.query_one(ContentSwitcher).current = "lines"
-            nslc_to_focus = '_'.join(str(self.query_one("#plain").renderable).splitlines()[-1].split('|')[:4])
-            self.query_one(f"#_{nslc_to_focus}").focus()
+            self.query_one(TimelineView).move_to_key(self.query_one(PlainView).key)
 
 
     def action_send_button(self) -> None:
         """An action equivalent to pressing send button"""
         self.on_button_pressed(Button.Pressed(button=self.query_one("#request-button")))
-
-
-    def next_line(self):
-        self.action_focus_next()
-        if self.focused not in self.query(CursoredText):
-            self.query(CursoredText)[-1].focus()
-            # below line does not have effect because focus turns out to happen after below line is executed
-            #self.query(CursoredText)[-1].action_end()
-
-
-    def previous_line(self):
-        self.action_focus_previous()
-        if self.focused not in self.query(CursoredText):
-            self.query(CursoredText)[0].focus()
-        else:
-            # below line does not have effect because focus turns out to happen after below line is executed
-            self.query(CursoredText)[0].action_end()
@@ -0,0 +1,326 @@
+"""
+Persistent cache of availability responses, so that only the time intervals not fetched before are requested again.
+"""
+
+import time
+import uuid
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+from appdirs import user_cache_dir
+
+from a10y.database import Database
+from a10y.timeline import to_epoch, to_iso, to_strings
+
+CACHE_FILE = Path(user_cache_dir("a10y")) / "availability.sqlite"
+CACHE_SIZE = 100  # MB of cached segments before the least recently used requests are evicted
+SETTLE = 24 * 3600  # seconds before now whose availability may still change, never cached
+RESTRICTION_TTL = 24  # hours before the restriction policy of a channel is requested again
+CHUNK_SIZE = 500  # values bound to one SQL IN (...)
+STAGED_TTL = 24 * 3600  # seconds after which the rows staged for a response that never completed are dropped
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY, node TEXT NOT NULL, pattern TEXT NOT NULL, options TEXT NOT NULL,
+    used REAL NOT NULL, size INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (node, pattern, options)
+);
+CREATE TABLE IF NOT EXISTS coverage (entry INTEGER NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS segments (entry INTEGER NOT NULL, prefix TEXT NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS extents (node TEXT NOT NULL, pattern TEXT NOT NULL, fetched REAL NOT NULL, PRIMARY KEY (node, pattern));
+CREATE TABLE IF NOT EXISTS restrictions (node TEXT NOT NULL, channel TEXT NOT NULL, restricted INTEGER NOT NULL, PRIMARY KEY (node, channel));
+CREATE TABLE IF NOT EXISTS expansions (
+    node TEXT NOT NULL, pattern TEXT NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL, fetched REAL NOT NULL, channels TEXT NOT NULL,
+    PRIMARY KEY (node, pattern, start, end)
+);
+CREATE TABLE IF NOT EXISTS staged (
+    response TEXT NOT NULL, channel TEXT NOT NULL, prefix TEXT NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL, staged REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_entry ON coverage (entry, start);
+CREATE INDEX IF NOT EXISTS staged_response ON staged (response, channel);
+CREATE INDEX IF NOT EXISTS segments_entry ON segments (entry, start);
+"""
+
+
+def split_line(line):
+    """NSLC pattern and epoch interval of a POST request line, or None if it has no parsable interval"""
+    parts = line.split()
+    if len(parts) != 6:
+        return None
+    try:
+        start, end = to_epoch(parts[4:]).tolist()
+    except ValueError:
+        return None
+    return ' '.join(parts[:4]).upper(), start, end
+
+
+def lines_window(lines):
+    """Time window of the request lines with a parsable interval: (start, end) if they all share it, otherwise a function
+    giving the earliest start and latest end of the lines matching an N_S_L_C channel (None if none do); None without lines"""
+    split = [split for split in map(split_line, lines) if split is not None]
+    windows = {(start, end) for _, start, end in split}
+    if len(windows) < 2:
+        return next(iter(windows), None)
+
+    def channel_window(key):
+        intervals = [(start, end) for pattern, start, end in split if matches(pattern, key)]
+        if not intervals:
+            return None
+        starts, ends = zip(*intervals)
+        return min(starts), max(ends)
+    return channel_window
+
+
+def line_pattern(line) -> str:
+    """NSLC pattern of a POST request line"""
+    return ' '.join(line.split()[:4]).upper()
+
+
+def wildcard(pattern) -> bool:
+    """Whether an NSLC request pattern has FDSN wildcards"""
+    return any(c in pattern for c in '*?')
+
+
+def pattern_key(pattern) -> str:
+    """N_S_L_C channel of an NSLC request pattern without wildcards"""
+    return '_'.join('' if code == '--' else code for code in pattern.split())
+
+
+def channel_line(key, line) -> str:
+    """Request line of an N_S_L_C channel over the time window of another request line"""
+    return f"{' '.join(code or '--' for code in key.split('_'))} {' '.join(line.split()[4:])}"
+
+
+def chunked(values, size=CHUNK_SIZE):
+    """Lists of at most size values, to be bound to the parameters of an SQL IN (...)"""
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def subtract(start, end, intervals) -> list:
+    """The parts of [start, end) not covered by the sorted, disjoint intervals"""
+    missing = []
+    for a, b in intervals:
+        if b <= start or a >= end:
+            continue
+        if a > start:
+            missing.append((start, a))
+        start = max(start, b)
+    if start < end:
+        missing.append((start, end))
+    return missing
+
+
+def matches(pattern, key) -> bool:
+    """Whether an N_S_L_C channel matches an NSLC request pattern with FDSN wildcards"""
+    return all(fnmatchcase(code, '' if p == '--' else p) for code, p in zip(key.split('_'), pattern.split()))
+
+
+def matches_any(pattern, keys) -> bool:
+    """Whether an NSLC request pattern matches any of a set of N_S_L_C channels, looked up directly without wildcards"""
+    if not wildcard(pattern):
+        return pattern_key(pattern) in keys
+    return any(matches(pattern, key) for key in keys)
+
+
+class AvailabilityCache(Database):
+    """SQLite cache of the segments returned per node, NSLC request pattern and request options,
+    along with the time intervals they cover, and of the restriction policy of the channels"""
+
+    SCHEMA = SCHEMA
+
+    def __init__(self, path=CACHE_FILE, size=CACHE_SIZE, restriction_ttl=RESTRICTION_TTL):
+        super().__init__(path)
+        self.size = int(size * 2**20)
+        self.restriction_ttl = restriction_ttl
+
+    def lookup(self, node, options, lines):
+        """Split the request lines of a node into the cached GeoCSV rows and the request lines of the intervals still missing"""
+        if not self.size:
+            return [], list(lines)
+        rows, missing, used = [], [], set()
+        with self.lock, self.db as db:
+            entries = dict(db.execute("SELECT pattern, id FROM entries WHERE node = ? AND options = ?", (node, options)).fetchall())
+            for line in lines:
+                split = split_line(line)
+                if split is None or split[0] not in entries:
+                    missing.append(line)
+                    continue
+                pattern, start, end = split
+                entry = entries[pattern]
+                used.add(entry)
+                intervals = db.execute("SELECT start, end FROM coverage WHERE entry = ? ORDER BY start", (entry,)).fetchall()
+                gaps = subtract(start, end, intervals)
+                if gaps:
+                    bounds = to_strings([t for gap in gaps for t in gap])
+                    missing += [f"{pattern} {bounds[i]} {bounds[i + 1]}" for i in range(0, len(bounds), 2)]
+                segments = db.execute("SELECT prefix, MAX(start, ?), MIN(end, ?) FROM segments WHERE entry = ? AND start < ? AND end > ? ORDER BY start",
+                                      (start, end, entry, end, start)).fetchall()
+                if segments:
+                    prefixes, starts, ends = zip(*segments)
+                    rows += [f"{prefix}|{a}|{b}" for prefix, a, b in zip(prefixes, to_iso(starts), to_iso(ends))]
+            now = time.time()
+            db.executemany("UPDATE entries SET used = ? WHERE id = ?", [(now, entry) for entry in used])
+        return rows, missing
+
+    def store(self, node, options, lines, text) -> int:
+        """Record the segments of a complete response (empty when no data) for the settled intervals of its request lines;
+        returns the number of segments stored"""
+        response = self.begin()
+        self.stage(response, text)
+        return self.commit(response, node, options, lines)
+
+    def begin(self) -> str:
+        """Identifier of a response whose rows are staged batch by batch as they arrive"""
+        return uuid.uuid4().hex
+
+    def stage(self, response, text) -> int:
+        """Keep the data rows of a batch of a response until it completes; returns the number of rows staged"""
+        if not self.size:
+            return 0
+        fields = [row.split('|') for row in text.splitlines() if not row.startswith('#') and not row.startswith('Network|')]
+        fields = [f for f in fields if len(f) >= 8]
+        if not fields:
+            return 0
+        starts = to_epoch([f[6] for f in fields]).tolist()
+        ends = to_epoch([f[7] for f in fields]).tolist()
+        now = time.time()
+        # batches are small and frequent: they are written on the shared connection rather than a new one each
+        with self.lock, self.db as db:
+            db.executemany("INSERT INTO staged VALUES (?, ?, ?, ?, ?, ?)",
+                           [(response, '_'.join(f[:4]), '|'.join(f[:6]), a, b, now) for f, a, b in zip(fields, starts, ends)])
+        return len(fields)
+
+    def commit(self, response, node, options, lines, complete=True) -> int:
+        """Record the rows staged for a complete response for the settled intervals of its request lines, or drop them
+        if the response failed; returns the number of segments stored"""
+        if not self.size:
+            return 0
+        cutoff = int(time.time() - SETTLE) * 10**6
+        stored = 0
+        db = self._connect()
+        try:
+            with db:
+                if complete:
+                    channels = [channel for channel, in db.execute("SELECT DISTINCT channel FROM staged WHERE response = ?", (response,))]
+                    for line in lines:
+                        split = split_line(line)
+                        if split is None:
+                            continue
+                        pattern, start, end = split
+                        end = min(end, cutoff)
+                        if start >= end:
+                            continue
+                        stored += self._store(db, node, pattern, options, start, end, response, [key for key in channels if matches(pattern, key)])
+                    self._evict(db)
+                db.execute("DELETE FROM staged WHERE response = ? OR staged < ?", (response, time.time() - STAGED_TTL))
+        finally:
+            db.close()
+        return stored
+
+    def _store(self, db, node, pattern, options, start, end, response, channels) -> int:
+        """Replace the cached segments of an entry within [start, end) by the rows staged for the given channels of a response,
+        and mark the interval as covered; returns the number of segments inserted"""
+        db.execute("INSERT OR IGNORE INTO entries (node, pattern, options, used) VALUES (?, ?, ?, ?)", (node, pattern, options, time.time()))
+        entry = db.execute("SELECT id FROM entries WHERE node = ? AND pattern = ? AND options = ?", (node, pattern, options)).fetchone()[0]
+        # the response is authoritative within the interval: keep only the parts of older segments outside of it
+        overlapping = db.execute("SELECT rowid, prefix, start, end FROM segments WHERE entry = ? AND start < ? AND end > ?", (entry, end, start)).fetchall()
+        db.executemany("DELETE FROM segments WHERE rowid = ?", [(rowid,) for rowid, *_ in overlapping])
+        outside = [(prefix, a, start) for _, prefix, a, b in overlapping if a < start] + [(prefix, end, b) for _, prefix, a, b in overlapping if b > end]
+        db.executemany("INSERT INTO segments VALUES (?, ?, ?, ?)", [(entry, *segment) for segment in outside])
+        inserted = 0
+        for chunk in chunked(channels):
+            # the same rows may have been staged twice, e.g. by a response retried after it was cut
+            inserted += db.execute(f"INSERT INTO segments SELECT DISTINCT ?, prefix, MAX(start, ?), MIN(end, ?) FROM staged "
+                                   f"WHERE response = ? AND channel IN ({','.join('?' * len(chunk))}) AND start < ? AND end > ?",
+                                   (entry, start, end, response, *chunk, end, start)).rowcount
+        # the server cuts traces at the interval bounds; join them again with their other half
+        for bound in (start, end):
+            pairs = db.execute("SELECT l.rowid, r.rowid, r.end FROM segments l JOIN segments r ON r.entry = l.entry AND r.prefix = l.prefix AND r.start = l.end "
+                               "WHERE l.entry = ? AND l.end = ?", (entry, bound)).fetchall()
+            db.executemany("UPDATE segments SET end = ? WHERE rowid = ?", [(r_end, left) for left, _, r_end in pairs])
+            db.executemany("DELETE FROM segments WHERE rowid = ?", [(right,) for _, right, _ in pairs])
+        intervals = db.execute("SELECT start, end FROM coverage WHERE entry = ?", (entry,)).fetchall() + [(start, end)]
+        merged = []
+        for a, b in sorted(intervals):
+            if merged and a <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], b)
+            else:
+                merged.append([a, b])
+        db.execute("DELETE FROM coverage WHERE entry = ?", (entry,))
+        db.executemany("INSERT INTO coverage VALUES (?, ?, ?)", [(entry, a, b) for a, b in merged])
+        db.execute("UPDATE entries SET used = ?, size = (SELECT COALESCE(SUM(LENGTH(prefix) + 16), 0) FROM segments WHERE entry = ?) WHERE id = ?",
+                   (time.time(), entry, entry))
+        return inserted
+
+    def _evict(self, db) -> None:
+        """Drop the least recently used entries until the cached segments fit in the size limit"""
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        for entry, size in db.execute("SELECT id, size FROM entries ORDER BY used").fetchall():
+            if total <= self.size:
+                break
+            for table, column in (("segments", "entry"), ("coverage", "entry"), ("entries", "id")):
+                db.execute(f"DELETE FROM {table} WHERE {column} = ?", (entry,))
+            total -= size
+
+    def restrictions(self, node, lines):
+        """Split the request lines of a node into the cached restriction (True if restricted) of each channel they match
+        and the lines whose extents were never requested or are older than the TTL"""
+        if not self.size:
+            return {}, list(lines)
+        cutoff = time.time() - self.restriction_ttl * 3600
+        patterns = list(dict.fromkeys(map(line_pattern, lines)))
+        with self.lock, self.db as db:
+            fresh = set()
+            for chunk in chunked(patterns):
+                fresh.update(pattern for pattern, in db.execute(f"SELECT pattern FROM extents WHERE node = ? AND fetched > ? AND pattern IN ({','.join('?' * len(chunk))})",
+                                                                 (node, cutoff, *chunk)))
+            # the channels of exact patterns are looked up by key, only wildcard patterns are matched against every channel
+            keys = [pattern_key(pattern) for pattern in fresh if not wildcard(pattern)]
+            wildcards = [pattern for pattern in fresh if wildcard(pattern)]
+            restricted = {}
+            for chunk in chunked(keys):
+                restricted.update(db.execute(f"SELECT channel, restricted FROM restrictions WHERE node = ? AND channel IN ({','.join('?' * len(chunk))})",
+                                             (node, *chunk)).fetchall())
+            if wildcards:
+                restricted.update((channel, flag) for channel, flag in db.execute("SELECT channel, restricted FROM restrictions WHERE node = ?", (node,))
+                                  if any(matches(pattern, channel) for pattern in wildcards))
+        return {channel: bool(flag) for channel, flag in restricted.items()}, [line for line in lines if line_pattern(line) not in fresh]
+
+    def expansions(self, node, lines):
+        """Split the wildcard request lines of a node into the channels with data in the time window of each line,
+        as returned within the TTL by the extents of the same pattern over a window covering it, and the lines still unknown"""
+        if not self.size:
+            return {}, list(lines)
+        cutoff = time.time() - self.restriction_ttl * 3600
+        known, missing = {}, []
+        with self.lock, self.db as db:
+            for line in lines:
+                split = split_line(line)
+                row = db.execute("SELECT channels FROM expansions WHERE node = ? AND pattern = ? AND start <= ? AND end >= ? AND fetched > ? "
+                                 "ORDER BY end - start LIMIT 1", (node, *split, cutoff)).fetchone() if split else None
+                if row is None:
+                    missing.append(line)
+                else:
+                    known[line] = row[0].split(',') if row[0] else []
+        return known, missing
+
+    def store_restrictions(self, node, lines, restricted) -> None:
+        """Record the restriction of the channels returned by the extents of the request lines of a node,
+        and the channels with data in the time window of its wildcard lines"""
+        if not self.size:
+            return
+        now = time.time()
+        expansions = []
+        for line in lines:
+            split = split_line(line)
+            if split is not None and wildcard(split[0]):
+                expansions.append((node, *split, now, ','.join(key for key in restricted if matches(split[0], key))))
+        db = self._connect()
+        try:
+            with db:
+                db.executemany("INSERT OR REPLACE INTO restrictions VALUES (?, ?, ?)", [(node, channel, int(flag)) for channel, flag in restricted.items()])
+                db.executemany("INSERT OR REPLACE INTO extents VALUES (?, ?, ?)", [(node, line_pattern(line), now) for line in lines])
+                db.execute("DELETE FROM expansions WHERE fetched < ?", (now - self.restriction_ttl * 3600,))
+                db.executemany("INSERT OR REPLACE INTO expansions VALUES (?, ?, ?, ?, ?, ?)", expansions)
+        finally:
+            db.close()
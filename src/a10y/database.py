@@ -0,0 +1,37 @@
+"""
+SQLite files of the user cache directory, shared by the inventory index and the availability cache.
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class Database:
+    """An SQLite file in WAL mode created with its schema on first use"""
+
+    SCHEMA = ""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()  # held by the lookups using the shared connection, which may run in a thread
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(self.SCHEMA)
+        return db
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """Connection shared under the lock by the lookups and small writes; larger writers open their own"""
+        if self._db is None:
+            self._db = self._connect()
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
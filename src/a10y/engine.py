@@ -0,0 +1,362 @@
+"""
+Asynchronous HTTP engine shared by the whole application.
+"""
+
+import asyncio
+import codecs
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import islice
+from urllib.parse import urlparse
+
+import aiohttp
+from multidict import CIMultiDict
+
+from a10y.timeline import GeoCSVStream, span_edges, to_epoch, to_strings
+
+# Default limits for the pooled connections
+LIMIT = 64
+LIMIT_PER_HOST = 4
+KEEPALIVE_TIMEOUT = 60
+
+# Timeouts, retries and circuit breaker of the requests to each node
+CONNECT_TIMEOUT = 10  # seconds to connect to a node
+READ_TIMEOUT = 60  # seconds without receiving anything from a node
+RETRIES = 2  # retries of a request after a 5xx status or a connection error
+BACKOFF = 0.5  # seconds before the first retry, doubled for each next one, with jitter
+FAILURES = 5  # consecutive failures after which a node is skipped
+COOLDOWN = 60  # seconds a failing node is skipped before it is tried again
+
+# Adaptive batching of the request lines sent to each node
+BATCH_SIZE = 100  # lines of the first batch sent to a node
+MIN_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 2000
+BATCH_INCREASE = 20  # lines added to the batches of a node after each fast, full batch
+TARGET_LATENCY = 10.0  # seconds; slower batches halve the batch size
+TARGET_BYTES = 8 * 2**20  # larger responses halve the batch size
+OVERLOADED = (0, 413, 429, 500, 502, 503, 504)  # statuses that halve the batch size
+
+# Time shards of the long windows of a request, fetched in parallel
+SHARD_LENGTH = 30 * 86400  # seconds; shorter windows are not split
+MAX_SHARDS = 16  # shards of the window of a request line
+
+
+@dataclass
+class Response:
+    """Outcome of a request made through the engine"""
+
+    url: str
+    status: int
+    text: str
+    data: str = ""
+    headers: CIMultiDict = field(default_factory=CIMultiDict)  # looked up whatever the case of the names
+    size: int = 0  # characters of the body, including those passed to a receive callback
+
+
+def failed(status) -> bool:
+    """Whether a response status means the node failed (connection error or server error)"""
+    return status == 0 or status >= 500
+
+
+class NodeHealth:
+    """Latency and errors of the requests to one node (host), with a circuit breaker skipping it while it keeps failing"""
+
+    def __init__(self, failures=FAILURES, cooldown=COOLDOWN):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0  # consecutive failures
+        self.latency = None  # moving average of the latency of its requests (seconds)
+        self.open_until = 0.0  # monotonic time until which the node is skipped
+
+    def available(self) -> bool:
+        """Whether requests may be sent to the node; once the cooldown is over, one more failure skips it again"""
+        return time.monotonic() >= self.open_until
+
+    def record(self, status, latency) -> None:
+        self.requests += 1
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if failed(status):
+            self.errors += 1
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                self.open_until = time.monotonic() + self.cooldown
+        else:
+            self.failures = 0
+
+    def summary(self) -> str:
+        """Latency and errors, or the time left before the node is tried again"""
+        if not self.available():
+            return f"skipped for {self.open_until - time.monotonic():.0f} s"
+        if not self.requests:
+            return ""
+        return f"{self.latency * 1000:.0f} ms, {self.errors}/{self.requests} errors"
+
+
+class HttpEngine:
+    """A single pooled aiohttp session with keep-alive, capped per node (host), with timeouts, retries with backoff
+    and the health of each node"""
+
+    def __init__(self, limit=LIMIT, limit_per_host=LIMIT_PER_HOST, keepalive_timeout=KEEPALIVE_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.nodes = {}  # NodeHealth of each host
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Create the session lazily, so that it binds to the running event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def health(self, url) -> NodeHealth:
+        """Health of the node (host) of a URL"""
+        host = urlparse(url).netloc
+        if host not in self.nodes:
+            self.nodes[host] = NodeHealth()
+        return self.nodes[host]
+
+    async def request(self, method, url, data=None, headers=None, receive=None) -> Response:
+        """Issue a request and return its status and body, retrying after server and connection errors;
+        connection errors, timeouts and skipped nodes are reported with status 0.
+        With receive, the body of a successful response is passed to `await receive(chunk, final)` as it arrives
+        instead of being kept; a request that fails once its body started to arrive is not retried."""
+        health = self.health(url)
+        for attempt in range(self.retries + 1):
+            if not health.available():
+                return Response(url, 0, f"{urlparse(url).netloc} is {health.summary()} after {health.failures} failures in a row", data or "")
+            started = time.monotonic()
+            r = await self._request(method, url, data, headers, receive)
+            health.record(r.status, time.monotonic() - started)
+            if not failed(r.status) or attempt == self.retries or (r.status == 0 and r.size):
+                return r
+            await asyncio.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+    async def _request(self, method, url, data, headers, receive) -> Response:
+        size = 0
+        try:
+            async with self._get_session().request(method, url, data=data, headers=headers) as r:
+                if receive is None or r.status != 200:
+                    text = await r.text()
+                    return Response(url, r.status, text, data or "", CIMultiDict(r.headers), len(text))
+                decoder = codecs.getincrementaldecoder(r.charset or 'utf-8')(errors='replace')
+                async for chunk in r.content.iter_any():
+                    text = decoder.decode(chunk)
+                    size += len(text)
+                    await receive(text, False)
+                await receive(decoder.decode(b'', final=True), True)
+                return Response(url, r.status, "", data or "", CIMultiDict(r.headers), size)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return Response(url, 0, f"Connection error: {e!r}", data or "", size=size)
+
+    async def get(self, url, headers=None) -> Response:
+        return await self.request("GET", url, headers=headers)
+
+    async def post(self, url, data, receive=None) -> Response:
+        return await self.request("POST", url, data=data, receive=receive)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class NodeBatching:
+    """Batch size and requests in flight of one node, the size adapted from its responses (AIMD)"""
+
+    def __init__(self, size=BATCH_SIZE, in_flight=LIMIT_PER_HOST):
+        self.size = size
+        self.slots = asyncio.Semaphore(in_flight)
+
+    def record(self, lines, status, latency, length) -> None:
+        """Halve the batch size after an overloaded, slow or large response, grow it a little after a fast, full one"""
+        if status in OVERLOADED or latency > TARGET_LATENCY or length > TARGET_BYTES:
+            self.size = max(MIN_BATCH_SIZE, min(self.size, lines) // 2)
+        elif lines >= self.size:
+            self.size = min(MAX_BATCH_SIZE, self.size + BATCH_INCREASE)
+
+
+class PendingLines:
+    """Request lines waiting to be sent, in groups of equal priority taken lowest first; the lines are grouped
+    again only when priority() returns another ranking(line) function, e.g. once the channels in view changed"""
+
+    def __init__(self, lines, priority=None):
+        self.priority = priority
+        self.ranking = None
+        self.groups = {0: deque(lines)}
+
+    def __len__(self):
+        return sum(len(group) for group in self.groups.values())
+
+    def regroup(self) -> None:
+        if self.priority is None:
+            return
+        ranking = self.priority()
+        if ranking is self.ranking:
+            return
+        self.ranking = ranking
+        lines = [line for _, group in sorted(self.groups.items()) for line in group]
+        self.groups = {}
+        for line in lines:
+            self.groups.setdefault(ranking(line), deque()).append(line)
+
+    def take(self, size) -> list:
+        """At most size lines, of the lowest priority first"""
+        batch = []
+        for rank in sorted(self.groups):
+            group = self.groups[rank]
+            while group and len(batch) < size:
+                batch.append(group.popleft())
+        return batch
+
+    def put_back(self, lines) -> None:
+        """Return lines to the front of the lowest priority group"""
+        self.groups.setdefault(min(self.groups, default=0), deque()).extendleft(reversed(lines))
+
+
+class BatchScheduler:
+    """Sends the request lines of each node in batches sized from its observed latency, response size and errors,
+    with a cap on the requests in flight to each node"""
+
+    def __init__(self, size=BATCH_SIZE, in_flight=LIMIT_PER_HOST):
+        self.size = size
+        self.in_flight = in_flight
+        self.nodes = {}  # NodeBatching of each node URL
+
+    def node(self, url) -> NodeBatching:
+        if url not in self.nodes:
+            self.nodes[url] = NodeBatching(self.size, self.in_flight)
+        return self.nodes[url]
+
+    def shard_count(self, url, lines) -> int:
+        """Shards to split the windows of the request lines of a node into, so that a few lines still fill
+        the requests in flight to it while many lines are batched as they are"""
+        return max(1, min(MAX_SHARDS, self.in_flight * self.node(url).size // max(len(lines), 1)))
+
+    async def run_shards(self, url, lines, send, handle, priority=None) -> None:
+        """Split the long windows of the lines into time shards and run the batches of every shard in parallel,
+        within the cap on the requests in flight to the node"""
+        await asyncio.gather(*[self.run(url, shard, send, handle, priority) for shard in shard_lines(lines, self.shard_count(url, lines))])
+
+    async def run(self, url, lines, send, handle, priority=None) -> None:
+        """Send the lines to a node in batches with send(data) -> Response, passing each batch and its response
+        to handle(data, response); batches rejected as too large (413) are sent again in smaller ones.
+        With priority() returning a ranking(line) function, each batch takes the pending lines of lowest rank first."""
+        node = self.node(url)
+        pending = PendingLines(lines, priority)
+        running = set()
+
+        async def issue(batch):
+            data = '\n'.join(batch)
+            started = time.monotonic()
+            r = await send(data)
+            node.record(len(batch), r.status, time.monotonic() - started, r.size)
+            if r.status == 413 and len(batch) > 1:
+                pending.put_back(batch)
+            else:
+                await handle(data, r)
+
+        try:
+            while pending or running:
+                if pending:
+                    await node.slots.acquire()
+                    pending.regroup()
+                    # the batch size is read once a slot is free, so that it follows the latest responses
+                    task = asyncio.ensure_future(issue(pending.take(node.size)))
+                    task.add_done_callback(lambda _: node.slots.release())
+                    running.add(task)
+                else:
+                    done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+        finally:
+            for task in running:
+                task.cancel()
+
+
+def shard_lines(lines, count, length=SHARD_LENGTH) -> list:
+    """Split the window of each request line into at most count shards of at least length seconds, cut on whole seconds;
+    returns the lines of each shard, lines without a parsable window being in the first one"""
+    shards = [[] for _ in range(count)]
+    for line in lines:
+        parts = line.split()
+        try:
+            start, end = to_epoch(parts[4:]).tolist() if len(parts) == 6 else (0, 0)
+        except ValueError:
+            start, end = 0, 0
+        num_shards = min(count, (end - start) // (length * 10**6))
+        if num_shards < 2:
+            shards[0].append(line)
+            continue
+        edges = span_edges(start, end, num_shards) // 10**6 * 10**6
+        edges[0], edges[-1] = start, end
+        bounds = to_strings(edges)
+        prefix = ' '.join(parts[:4])
+        for i in range(num_shards):
+            shards[i].append(f"{prefix} {bounds[i]} {bounds[i + 1]}")
+    return [shard for shard in shards if shard]
+
+
+async def post_geocsv(engine, url, data, handle) -> Response:
+    """POST an availability request (format=geocsv), passing its data rows to `await handle(rows)` in batches as they arrive;
+    the text of a successful response is left empty, its rows having been handled"""
+    stream = GeoCSVStream()
+
+    async def receive(chunk, final):
+        rows = stream.feed(chunk, final)
+        if rows:
+            await handle(rows)
+
+    return await engine.post(url, data, receive)
+
+
+def parse_routing(text):
+    """Split a routing service response (format=post) into a list of (url, lines) blocks"""
+    blocks = []
+    for line in text.splitlines():
+        if line.startswith('http'):
+            blocks.append((line, []))
+        elif line.strip() and blocks:
+            blocks[-1][1].append(line)
+    return blocks
+
+
+def parse_extents(text) -> dict:
+    """Restriction (True if restricted) of each N_S_L_C channel of an availability extent response"""
+    restricted = {}
+    for line in text.splitlines():
+        parts = line.split('|')
+        if len(parts) > 10 and not line.startswith('#') and not line.startswith('Network|'):
+            restricted['_'.join(parts[:4])] = parts[10] == "RESTRICTED"
+    return restricted
+
+
+def routing_data(lines, service="availability"):
+    """Body of a routing service POST request (format=post) for the given request lines"""
+    return f"service={service}\nformat=post\n" + '\n'.join(lines)
+
+
+def chunks(lines, size):
+    """Yield lists of at most size lines from any iterable, without reading it all"""
+    lines = iter(lines)
+    while chunk := list(islice(lines, size)):
+        yield chunk
+
+
+def availability_options(quality, merge, mergegaps, restricted):
+    """The option lines of an availability POST request (format=geocsv)"""
+    return f'{"quality="+quality if quality else ""}\n{"mergegaps="+mergegaps if mergegaps else ""}\nformat=geocsv\n{"merge="+merge if merge else ""}\n{"includerestricted=TRUE" if restricted else ""}'
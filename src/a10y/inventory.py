@@ -0,0 +1,103 @@
+"""
+Local inventory index of the EIDA nodes, used for instant NSLC autocomplete.
+"""
+
+import time
+from pathlib import Path
+
+from appdirs import user_cache_dir
+
+from a10y.database import Database
+
+INVENTORY_FILE = Path(user_cache_dir("a10y")) / "inventory.sqlite"
+INVENTORY_TTL = 24  # hours before the inventory of a node is fetched again
+LEVELS = ("net", "sta", "loc", "cha")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    net TEXT NOT NULL, sta TEXT NOT NULL, loc TEXT NOT NULL, cha TEXT NOT NULL, node TEXT NOT NULL,
+    PRIMARY KEY (net, sta, loc, cha, node)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS nodes (node TEXT PRIMARY KEY, fetched REAL NOT NULL);
+"""
+
+
+def inventory_url(node_url):
+    """The fdsnws-station request for the channel inventory of a node"""
+    return f"{node_url}station/1/query?level=channel&format=text"
+
+
+def patterns(value):
+    """GLOB patterns for an FDSN code list like 'GE,F*' ('--' stands for the empty location code)"""
+    if not value.strip():
+        return ['*']
+    return ['' if p == '--' else p for p in (v.strip().upper() for v in value.split(','))]
+
+
+class Inventory(Database):
+    """SQLite index of (network, station, location, channel) codes per node"""
+
+    SCHEMA = SCHEMA
+
+    def __init__(self, path=INVENTORY_FILE, ttl=INVENTORY_TTL):
+        super().__init__(path)
+        self.ttl = ttl * 3600
+
+    def fetched(self, nodes) -> dict:
+        """Time of the last successful fetch for each of the given nodes that has one"""
+        nodes = list(nodes)
+        rows = self.db.execute(f"SELECT node, fetched FROM nodes WHERE node IN ({','.join('?' * len(nodes))})", nodes)
+        return dict(rows.fetchall())
+
+    def indexed(self, nodes) -> bool:
+        """Whether all given nodes have been indexed at least once (even if stale)"""
+        nodes = list(nodes)
+        return bool(nodes) and len(self.fetched(nodes)) == len(nodes)
+
+    def stale(self, nodes) -> list:
+        """The nodes whose inventory is missing or older than the TTL"""
+        fetched = self.fetched(nodes)
+        return [n for n in nodes if time.time() - fetched.get(n, 0) > self.ttl]
+
+    def store(self, node, text) -> int:
+        """Replace the inventory of a node with the channels of an fdsnws-station text response"""
+        rows = set()
+        for line in text.splitlines():
+            if line.startswith('#') or not line.strip():
+                continue
+            parts = line.split('|')
+            if len(parts) >= 4:
+                rows.add(tuple(p.strip() for p in parts[:4]) + (node,))
+        db = self._connect()
+        try:
+            with db:
+                db.execute("DELETE FROM channels WHERE node = ?", (node,))
+                db.executemany("INSERT OR IGNORE INTO channels VALUES (?, ?, ?, ?, ?)", rows)
+                db.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?)", (node, time.time()))
+        finally:
+            db.close()
+        return len(rows)
+
+    def _where(self, nodes, codes):
+        """WHERE clause and parameters restricting to nodes and to the given codes per level"""
+        nodes = list(nodes)
+        clauses = [f"node IN ({','.join('?' * len(nodes))})"]
+        params = nodes
+        for level, value in zip(LEVELS, codes):
+            level_patterns = patterns(value)
+            if level_patterns != ['*']:
+                clauses.append('(' + ' OR '.join(f"{level} GLOB ?" for _ in level_patterns) + ')')
+                params = params + level_patterns
+        return ' AND '.join(clauses), params
+
+    def codes(self, level, nodes, net="", sta="", loc="", cha="") -> list:
+        """Sorted distinct codes of a level among the channels matching the (wildcarded) codes"""
+        where, params = self._where(nodes, (net, sta, loc, cha))
+        rows = self.db.execute(f"SELECT DISTINCT {level} FROM channels WHERE {where} ORDER BY {level}", params)
+        return [r[0] for r in rows]
+
+    def expand(self, nodes, net="", sta="", loc="", cha="") -> list:
+        """All NSLC tuples matching the (wildcarded) codes"""
+        where, params = self._where(nodes, (net, sta, loc, cha))
+        rows = self.db.execute(f"SELECT DISTINCT net, sta, loc, cha FROM channels WHERE {where} ORDER BY net, sta, loc, cha", params)
+        return rows.fetchall()
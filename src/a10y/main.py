@@ -1,144 +1,56 @@
 import argparse
-import requests
 import os
-import logging
-import tomli
 from datetime import datetime, timedelta
-from a10y.app import AvailabilityUI
-from pathlib import Path
-from appdirs import user_cache_dir 
-import json 
-from urllib.parse import urlparse
-import time
-import threading
-import itertools
 import sys
-from urllib.parse import urlparse
+# Heavier modules (Textual, HTTP, numpy, TOML parsing) are imported where they are needed,
+# so that --help, configuration errors and headless queries start fast
 # Common constants
-DEFAULT_NODES = [
-    ("GFZ", "https://geofon.gfz.de/fdsnws/", True),
-    ("ODC", "https://orfeus-eu.org/fdsnws/", True),
-    ("ETHZ", "https://eida.ethz.ch/fdsnws/", True),
-    ("RESIF", "https://ws.resif.fr/fdsnws/", True),
-    ("INGV", "https://webservices.ingv.it/fdsnws/", True),
-    ("LMU", "https://erde.geophysik.uni-muenchen.de/fdsnws/", True),
-    ("ICGC", "https://ws.icgc.cat/fdsnws/", True),
-    ("NOA", "https://eida.gein.noa.gr/fdsnws/", True),
-    ("BGR", "https://eida.bgr.de/fdsnws/", True),
-    ("BGS", "https://eida.bgs.ac.uk/fdsnws/", True),
-    ("NIEP", "https://eida-sc3.infp.ro/fdsnws/", True),
-    ("KOERI", "https://eida.koeri.boun.edu.tr/fdsnws/", True),
-    ("UIB-NORSAR", "https://eida.geo.uib.no/fdsnws/", True),
-]
-
-CACHE_DIR = Path(user_cache_dir("a10y"))
-CACHE_FILE = CACHE_DIR / "nodes_cache.json"
-QUERY_URL = "https://www.orfeus-eu.org/eidaws/routing/1/globalconfig?format=fdsn"
-
-def parse_arguments():
+ROUTING_URL = "https://www.orfeus-eu.org/eidaws/routing/1/query?"
+AUTOCOMPLETE_DEBOUNCE = 0.3  # seconds to wait for typing to settle before autocomplete lookups
+STATUS_LINES = 1000  # lines kept in the status log
+PROGRESSIVE = 30  # days above which time windows are drawn coarse first, then refined
+EXTENT_FIRST = True  # request the extents of wildcard lines first, so that only the channels with data are requested
+
+def parse_arguments(argv=None):
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description="Availability UI application")
     parser.add_argument("-p", "--post", default=None, help="Default file path for POST requests")
     parser.add_argument("-c", "--config", default=None, help="Configuration file path")
-    return parser.parse_args()
-
-def ensure_cache_dir():
-    """Ensure the cache directory exists."""
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-
-
-
-QUERY_URL = "https://www.orfeus-eu.org/eidaws/routing/1/globalconfig?format=fdsn"
-
-def loading_animation(stop_event):
-    """Display a loading animation while nodes are being fetched."""
-    for frame in itertools.cycle(['|', '/', '-', '\\']):  # Simple animation
-        if stop_event.is_set():
-            break
-        sys.stdout.write(f"\rPlease wait... {frame} ")  # Overwrite the same line
-        sys.stdout.flush()
-        time.sleep(0.5)
-    sys.stdout.write("\rFetching complete! ✅\n")  # Clear animation
-
-def fetch_nodes_from_api():
-    """Fetch fresh nodes from API and save to cache, with a loading animation."""
-    nodes_urls = []
-    stop_event = threading.Event()
-
-    # Start loading animation in a separate thread
-    animation_thread = threading.Thread(target=loading_animation, args=(stop_event,))
-    animation_thread.start()
-
-    try:
-        response = requests.get(QUERY_URL, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-
-        for node in data.get("datacenters", []):
-            node_name = node["name"]
-            fdsnws_url = None
-
-            for repo in node.get("repositories", []):
-                for service in repo.get("services", []):
-                    if service["name"] == "fdsnws-station-1":
-                        fdsnws_url = service["url"]
-                        break
-                if fdsnws_url:
-                    break
-
-            if fdsnws_url:
-                parsed_url = urlparse(fdsnws_url)
-                base_url = f"{parsed_url.scheme}://{parsed_url.netloc}/fdsnws/"
-                nodes_urls.append((node_name, base_url, True))
-
-        if nodes_urls:
-            save_nodes_to_cache(nodes_urls)
-
-    except requests.RequestException as e:
-        logging.warning(f"Failed to fetch nodes from API: {e}")
-
-    finally:
-        stop_event.set()  # Stop loading animation
-        animation_thread.join()  # Wait for the animation to stop
-
-    return nodes_urls if nodes_urls else None
-
-
-def save_nodes_to_cache(nodes):
-    """Save nodes to cache file."""
-    ensure_cache_dir()
-    with open(CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump({"nodes": nodes}, f)
-
-def load_cached_nodes():
-    """Load cached nodes, fetch from API if missing or invalid."""
-    ensure_cache_dir()
-
-    if CACHE_FILE.exists():
+    subparsers = parser.add_subparsers(dest="command")
+    query = subparsers.add_parser("query", help="Write availability to stdout without the user interface")
+    # without a default, so that the options given before the subcommand are kept
+    query.add_argument("-p", "--post", default=argparse.SUPPRESS, help="File of NSLC to request instead of the NSLC options")
+    query.add_argument("-c", "--config", default=argparse.SUPPRESS, help="Configuration file path")
+    query.add_argument("--net", default="", help="Network code(s), comma separated, wildcards allowed")
+    query.add_argument("--sta", default="", help="Station code(s)")
+    query.add_argument("--loc", default="", help="Location code(s)")
+    query.add_argument("--cha", default="", help="Channel code(s)")
+    query.add_argument("--start", default=None, help="Start time (default from the configuration)")
+    query.add_argument("--end", default=None, help="End time (default from the configuration)")
+    query.add_argument("--quality", default=None, help="Quality codes, comma separated (e.g. D,M)")
+    query.add_argument("--merge", default=None, help="Merge options, comma separated (samplerate, quality, overlap)")
+    query.add_argument("--mergegaps", default=None, help="Merge gaps shorter than this many seconds")
+    query.add_argument("--restricted", default=None, action=argparse.BooleanOptionalAction, help="Include restricted data")
+    query.add_argument("--nodes", default="", help="Names or URLs of the nodes to request, comma separated (default all)")
+    query.add_argument("--format", default="geocsv", choices=["geocsv", "json", "summary"],
+                       help="GeoCSV rows, JSON lines, or percentage of availability per channel")
+    args = parser.parse_args(argv)
+    if args.command == "query":
+        for option in ("start", "end"):
+            value = getattr(args, option)
+            if value is not None and not valid_time(value):
+                query.error(f"argument --{option}: invalid time {value!r} (expected YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)")
+    return args
+
+def valid_time(value):
+    """Whether a time given on the command line is a date or a date and time the services and timelines can parse"""
+    for time_format in ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f"):
         try:
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                cache_data = json.load(f)
-                nodes = cache_data.get("nodes", [])
-
-                if not all(isinstance(n, list) and len(n) == 3 for n in nodes):
-                    raise ValueError("Invalid cache format")
-
-                return [(str(name), str(url), True) for name, url, _ in nodes]
-
-        except (json.JSONDecodeError, ValueError) as e:
-            logging.warning(f"Cache file is corrupted: {e}. Deleting it.")
-            CACHE_FILE.unlink()
-
-    nodes_from_api = fetch_nodes_from_api()
-    if nodes_from_api:
-        return nodes_from_api
-
-    return DEFAULT_NODES
-
-def load_nodes():
-    """Always load from cache if available, otherwise use fallback values."""
-    cached_nodes = load_cached_nodes()
-    return cached_nodes if cached_nodes else DEFAULT_NODES
+            datetime.strptime(value.removesuffix("Z"), time_format)
+            return True
+        except ValueError:
+            pass
+    return False
 
 def load_defaults():
     """Return default configuration values."""
@@ -151,10 +63,20 @@ def load_defaults():
         "default_quality_Q": True,
         "default_quality_M": True,
         "default_mergegaps": "1.0",
+        "default_auto_mergegaps": False,
         "default_merge_samplerate": False,
         "default_merge_quality": False,
         "default_merge_overlap": True,
         "default_includerestricted": True,
+        "default_autocomplete_debounce": AUTOCOMPLETE_DEBOUNCE,
+        "default_inventory_ttl": 24,
+        "default_cache_size": 100,
+        "default_progressive": PROGRESSIVE,
+        "default_restriction_ttl": 24,
+        "default_extent_first": EXTENT_FIRST,
+        "default_nodes_ttl": 24,
+        "default_status_lines": STATUS_LINES,
+        "default_status_log": None,
     }
 
 def load_config(config_path, defaults):
@@ -166,6 +88,8 @@ def load_config(config_path, defaults):
     if not os.path.isfile(config_path):
         return defaults
 
+    import logging
+    import tomli
     try:
         with open(config_path, "rb") as f:
             config = tomli.load(f)
@@ -197,7 +121,9 @@ def load_config(config_path, defaults):
 
     if "mergegaps" in config:
         try:
-            defaults["default_mergegaps"] = str(float(config["mergegaps"]))
+            defaults["default_auto_mergegaps"] = config["mergegaps"] == "auto"
+            if not defaults["default_auto_mergegaps"]:
+                defaults["default_mergegaps"] = str(float(config["mergegaps"]))
         except ValueError:
             raise ValueError(f"Invalid mergegaps format in {config_path}")
 
@@ -217,10 +143,98 @@ def load_config(config_path, defaults):
     if "includerestricted" in config:
         defaults["default_includerestricted"] = bool(config["includerestricted"])
 
+    if "autocomplete_debounce" in config:
+        try:
+            defaults["default_autocomplete_debounce"] = max(float(config["autocomplete_debounce"]), 0.0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid autocomplete_debounce format in {config_path}")
+
+    if "inventory_ttl" in config:
+        try:
+            defaults["default_inventory_ttl"] = max(float(config["inventory_ttl"]), 0.0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid inventory_ttl format in {config_path}")
+
+    if "nodes_ttl" in config:
+        try:
+            defaults["default_nodes_ttl"] = max(float(config["nodes_ttl"]), 0.0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid nodes_ttl format in {config_path}")
+
+    if "status_lines" in config:
+        try:
+            defaults["default_status_lines"] = max(int(config["status_lines"]), 1)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid status_lines format in {config_path}")
+
+    if "status_log" in config:
+        if not isinstance(config["status_log"], str):
+            raise ValueError(f"Invalid status_log path in {config_path}")
+        defaults["default_status_log"] = os.path.expanduser(config["status_log"])
+
+    if "cache_size" in config:
+        try:
+            defaults["default_cache_size"] = max(float(config["cache_size"]), 0.0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid cache_size format in {config_path}")
+
+    if "restriction_ttl" in config:
+        try:
+            defaults["default_restriction_ttl"] = max(float(config["restriction_ttl"]), 0.0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid restriction_ttl format in {config_path}")
+
+    if "extent_first" in config:
+        defaults["default_extent_first"] = bool(config["extent_first"])
+
+    if "progressive" in config:
+        try:
+            defaults["default_progressive"] = max(float(config["progressive"]), 0.0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid progressive format in {config_path}")
+
     return defaults
 
+def query(args, defaults):
+    """Run an availability query without the user interface; returns the exit status"""
+    import asyncio
+    from a10y.cache import AvailabilityCache
+    from a10y.engine import availability_options
+    from a10y.nodes import load_nodes
+    from a10y.query import Query, GeoCSVWriter, JSONLinesWriter, SummaryWriter, read_post_file
+
+    quality = args.quality if args.quality is not None else ",".join(q for q in ["D", "R", "Q", "M"] if defaults[f"default_quality_{q}"])
+    if any(q not in ["D", "R", "Q", "M"] for q in quality.split(",") if q):
+        raise ValueError(f"Invalid quality codes: {quality}")
+    merge = args.merge if args.merge is not None else ",".join(m for m in ["samplerate", "quality", "overlap"] if defaults[f"default_merge_{m}"])
+    if any(m not in ["samplerate", "quality", "overlap"] for m in merge.split(",") if m):
+        raise ValueError(f"Invalid merge options: {merge}")
+    mergegaps = args.mergegaps if args.mergegaps is not None else defaults["default_mergegaps"]
+    restricted = args.restricted if args.restricted is not None else defaults["default_includerestricted"]
+    start = args.start or defaults["default_starttime"]
+    end = args.end or defaults["default_endtime"]
+
+    nodes = [url for name, url, _ in load_nodes()
+             if not args.nodes or any(n.strip().upper() == name.upper() or n.strip() == url for n in args.nodes.split(","))]
+    if args.format == "json":
+        writer = JSONLinesWriter(sys.stdout)
+    elif args.format == "summary":
+        writer = SummaryWriter(sys.stdout, start, end)
+    else:
+        writer = GeoCSVWriter(sys.stdout)
+    runner = Query(nodes, ROUTING_URL, availability_options(quality, merge, mergegaps, restricted), writer,
+                   cache=AvailabilityCache(size=defaults["default_cache_size"]))
+    post_lines = read_post_file(args.post, start, end) if args.post else None
+    return asyncio.run(runner.run(args.net, args.sta, args.loc, args.cha, start, end, post_lines))
+
 def main():
     args = parse_arguments()
+    if args.command == "query":
+        defaults = load_config(args.config, load_defaults())
+        sys.exit(query(args, defaults))
+
+    from a10y.app import AvailabilityUI
+    from a10y.nodes import load_nodes
     nodes_urls = load_nodes()
     defaults = load_defaults()
     defaults["default_file"] = args.post
@@ -228,7 +242,7 @@ def main():
 
     app = AvailabilityUI(
         nodes_urls=nodes_urls,
-        routing="https://www.orfeus-eu.org/eidaws/routing/1/query?",
+        routing=ROUTING_URL,
         **defaults
     )
     app.run()
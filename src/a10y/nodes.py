@@ -0,0 +1,94 @@
+"""
+List of the EIDA nodes, served from a local cache and refreshed from the global configuration of the routing service.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from appdirs import user_cache_dir
+
+DEFAULT_NODES = [
+    ("GFZ", "https://geofon.gfz.de/fdsnws/", True),
+    ("ODC", "https://orfeus-eu.org/fdsnws/", True),
+    ("ETHZ", "https://eida.ethz.ch/fdsnws/", True),
+    ("RESIF", "https://ws.resif.fr/fdsnws/", True),
+    ("INGV", "https://webservices.ingv.it/fdsnws/", True),
+    ("LMU", "https://erde.geophysik.uni-muenchen.de/fdsnws/", True),
+    ("ICGC", "https://ws.icgc.cat/fdsnws/", True),
+    ("NOA", "https://eida.gein.noa.gr/fdsnws/", True),
+    ("BGR", "https://eida.bgr.de/fdsnws/", True),
+    ("BGS", "https://eida.bgs.ac.uk/fdsnws/", True),
+    ("NIEP", "https://eida-sc3.infp.ro/fdsnws/", True),
+    ("KOERI", "https://eida.koeri.boun.edu.tr/fdsnws/", True),
+    ("UIB-NORSAR", "https://eida.geo.uib.no/fdsnws/", True),
+]
+
+CACHE_DIR = Path(user_cache_dir("a10y"))
+CACHE_FILE = CACHE_DIR / "nodes_cache.json"
+QUERY_URL = "https://www.orfeus-eu.org/eidaws/routing/1/globalconfig?format=fdsn"
+NODES_TTL = 24  # hours before the node list is checked again
+
+
+def parse_globalconfig(text) -> list:
+    """The (name, fdsnws base URL, selected) nodes of a routing globalconfig response, empty if it is invalid"""
+    nodes_urls = []
+    try:
+        data = json.loads(text)
+        for node in data.get("datacenters", []):
+            node_name = node["name"]
+            fdsnws_url = None
+
+            for repo in node.get("repositories", []):
+                for service in repo.get("services", []):
+                    if service["name"] == "fdsnws-station-1":
+                        fdsnws_url = service["url"]
+                        break
+                if fdsnws_url:
+                    break
+
+            if fdsnws_url:
+                parsed_url = urlparse(fdsnws_url)
+                base_url = f"{parsed_url.scheme}://{parsed_url.netloc}/fdsnws/"
+                nodes_urls.append((node_name, base_url, True))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logging.warning(f"Invalid node list: {e}")
+        return []
+    return nodes_urls
+
+
+def read_cache(path=CACHE_FILE) -> dict:
+    """The cached nodes with the time and validators (ETag, Last-Modified) of their fetch; empty if there is no valid cache"""
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache_data = json.load(f)
+        nodes = cache_data.get("nodes", [])
+        if not nodes or not all(isinstance(n, list) and len(n) == 3 for n in nodes):
+            raise ValueError("Invalid cache format")
+        cache_data["nodes"] = [(str(name), str(url), True) for name, url, _ in nodes]
+        return cache_data
+    except (json.JSONDecodeError, ValueError, AttributeError) as e:
+        logging.warning(f"Cache file is corrupted: {e}. Deleting it.")
+        path.unlink()
+        return {}
+
+
+def save_nodes(nodes, etag=None, last_modified=None, path=CACHE_FILE) -> None:
+    """Save nodes to the cache file along with the validators of the response they come from"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"nodes": nodes, "fetched": time.time(), "etag": etag, "last_modified": last_modified}, f)
+
+
+def load_nodes(path=CACHE_FILE) -> list:
+    """Nodes from the cache if available, otherwise the default ones; never blocks on the network"""
+    return read_cache(path).get("nodes") or DEFAULT_NODES
+
+
+def stale(cache_data, ttl=NODES_TTL) -> bool:
+    """Whether the cached node list is missing or older than the TTL (hours)"""
+    return time.time() - cache_data.get("fetched", 0) > ttl * 3600
@@ -0,0 +1,209 @@
+"""
+Headless availability queries: the routing and per-node fan-out of the application, streamed to a file without any UI.
+"""
+
+import asyncio
+import json
+import sys
+from itertools import islice
+
+import numpy as np
+
+from a10y.cache import AvailabilityCache, line_pattern, matches
+from a10y.engine import BatchScheduler, HttpEngine, Response, chunks, parse_routing, post_geocsv, routing_data
+from a10y.timeline import GEOCSV_HEADER, covered, parse_geocsv, to_epoch
+
+FORMATS = ("geocsv", "json", "summary")
+ROUTE_SIZE = 1000  # lines of a POST file routed at once
+SEEN_ROWS = 100_000  # rows remembered by the row writers to drop the ones returned again
+FIELDS = ("network", "station", "location", "channel", "quality", "samplerate", "earliest", "latest")
+
+
+def data_rows(text):
+    """The data rows of a GeoCSV response"""
+    return [row for row in text.splitlines() if row and not row.startswith('#') and not row.startswith('Network|')]
+
+
+def read_post_file(filename, start, end):
+    """POST request lines of the NSLC listed in a file, for the given time window; the file is read lazily"""
+    with open(filename, 'r') as f:
+        for l in f:
+            if '=' not in l and l.strip():
+                yield f"{' '.join(l.split()[:4])} {start} {end}"
+
+
+class RowsWriter:
+    """Writes the rows of every response as soon as they arrive, once: the latest rows written are remembered
+    to drop the ones returned again, e.g. by overlapping request lines"""
+
+    joins = False  # rows are written as returned, so the windows of the lines are not split into time shards
+
+    def __init__(self, out, remember=SEEN_ROWS):
+        self.out = out
+        self.remember = remember
+        self.seen = {}  # latest rows written, oldest first
+
+    def format(self, rows) -> str:
+        return ''.join(f"{row}\n" for row in rows)
+
+    def write(self, text) -> None:
+        rows = []
+        for row in data_rows(text):
+            if row not in self.seen:
+                self.seen[row] = None
+                rows.append(row)
+        for row in list(islice(self.seen, max(len(self.seen) - self.remember, 0))):
+            del self.seen[row]
+        if rows:
+            self.out.write(self.format(rows))
+            self.out.flush()
+
+    def finish(self, lines) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class GeoCSVWriter(RowsWriter):
+    """GeoCSV rows after a single header"""
+
+    def __init__(self, out, remember=SEEN_ROWS):
+        super().__init__(out, remember)
+        out.write(GEOCSV_HEADER)
+
+
+class JSONLinesWriter(RowsWriter):
+    """One JSON object per row"""
+
+    def format(self, rows) -> str:
+        return ''.join(f"{json.dumps(dict(zip(FIELDS, row.split('|'))))}\n" for row in rows)
+
+
+class SummaryWriter:
+    """Percentage of the time window covered by each channel, written once the responses of its node arrived
+    (a channel returned again later is written again, with its updated figures)"""
+
+    joins = True  # traces cut by the bounds of time shards are counted once
+
+    def __init__(self, out, start, end):
+        self.out = out
+        self.start, self.end = to_epoch([start, end]).tolist()
+        self.traces = {}  # starts and ends arrays of the traces of each channel, per response
+        self.pending = set()  # channels with traces not summarized yet
+        out.write("Network|Station|Location|Channel|Availability|Traces\n")
+
+    def write(self, text) -> None:
+        channels, channel, _, starts, ends, _ = parse_geocsv(text)
+        for i, key in enumerate(channels):
+            self.traces.setdefault(key, []).append((starts[channel == i], ends[channel == i]))
+        self.pending.update(channels)
+
+    def finish(self, lines) -> None:
+        """Summarize the channels of request lines whose responses all arrived"""
+        patterns = {line_pattern(line) for line in lines}
+        self.summarize([key for key in self.pending if any(matches(pattern, key) for pattern in patterns)])
+
+    def summarize(self, keys) -> None:
+        """Write the line of each of the channels, in the order they were first returned"""
+        keys = set(keys)
+        for key in [key for key in self.traces if key in keys]:
+            starts, ends = (np.concatenate(arrays) for arrays in zip(*self.traces[key]))
+            percent = 100 * covered(starts, ends, self.start, self.end) / max(self.end - self.start, 1)
+            # the parts of a trace cut by the request bounds, and overlapping traces, count once
+            order = np.argsort(starts, kind='stable')
+            count = 1 + int((starts[order][1:] > np.maximum.accumulate(ends[order])[:-1]).sum())
+            self.out.write(f"{key.replace('_', '|')}|{percent:.2f}|{count}\n")
+            self.pending.discard(key)
+        self.out.flush()
+
+    def close(self) -> None:
+        self.summarize(self.pending)
+
+
+class Query:
+    """Routing and per-node fan-out of an availability request, writing the responses as they arrive"""
+
+    def __init__(self, nodes, routing, options, writer, cache=None, engine=None, log=sys.stderr):
+        self.nodes = nodes  # base URLs of the nodes to request
+        self.routing = routing
+        self.options = options  # option lines of the POST requests
+        self.writer = writer
+        self.cache = cache if cache is not None else AvailabilityCache()
+        self.engine = engine if engine is not None else HttpEngine()
+        self.scheduler = BatchScheduler()
+        self.log = log
+        self.failed = 0
+
+    def report(self, message) -> None:
+        print(message, file=self.log)
+
+    async def route(self, net, sta, loc, cha, start, end) -> list:
+        """Routing blocks of the request that belong to the nodes"""
+        params = f"&format=post{'&net='+net if net else ''}{'&sta='+sta if sta else ''}{'&loc='+loc if loc else ''}{'&cha='+cha if cha else ''}{'&start='+start if start else ''}{'&end='+end if end else ''}"
+        r = await self.engine.get(f'{self.routing}service=availability{params}')
+        if r.status != 200:
+            self.report(f"Couldn't retrieve routing info from {self.routing}service=availability{params}")
+            self.failed += 1
+            return []
+        return self.selected(r.text)
+
+    async def route_lines(self, lines) -> list:
+        """Routing blocks of POST request lines that belong to the nodes"""
+        r = await self.engine.post(self.routing.rstrip('?'), routing_data(lines))
+        if r.status not in (200, 204):
+            self.report(f"Couldn't retrieve routing info from {self.routing.rstrip('?')}: {r.text.strip()}")
+            self.failed += 1
+        return self.selected(r.text) if r.status == 200 else []
+
+    def selected(self, text) -> list:
+        return [(url, lines) for url, lines in parse_routing(text) if any(url.startswith(node) for node in self.nodes)]
+
+    async def request_node(self, url, lines) -> None:
+        """Write the cached availability of the request lines of a node and fetch only the intervals missing from the cache"""
+        rows, missing = await asyncio.to_thread(self.cache.lookup, url, self.options, lines)
+        if rows:
+            self.writer.write(GEOCSV_HEADER + '\n'.join(rows))
+        # long windows are fetched in time shards only if the writer joins the traces cut at their bounds
+        run = self.scheduler.run_shards if self.writer.joins else self.scheduler.run
+        await run(url, missing, lambda data: self.request_availability(url, data), lambda data, r: self.receive_availability(url, data, r))
+        self.writer.finish(lines)
+
+    async def request_availability(self, url, data) -> Response:
+        """Issue one availability request, writing and staging in the cache its rows in batches as the response arrives,
+        and caching them once it completes"""
+        response = self.cache.begin()
+
+        async def write(rows):
+            self.writer.write(rows)
+            await asyncio.to_thread(self.cache.stage, response, rows)
+
+        r = await post_geocsv(self.engine, url, f'{self.options}\n{data}', write)
+        await asyncio.to_thread(self.cache.commit, response, url, self.options, data.splitlines(), r.status in (200, 204))
+        return r
+
+    async def receive_availability(self, url, data, r) -> None:
+        if r.status not in (200, 204):
+            self.report(f"Request to {url} failed: {r.text.strip()}")
+            self.failed += 1
+
+    async def run(self, net="", sta="", loc="", cha="", start="", end="", post_lines=None) -> int:
+        """Request the NSLC codes, or the lines of a POST file, through the routing service; returns the exit status"""
+        fetches = []
+        try:
+            if post_lines is not None:
+                # route the file a chunk at a time, fetching the lines of each node while the next chunk is routed
+                for lines in chunks(post_lines, ROUTE_SIZE):
+                    blocks = await self.route_lines(lines)
+                    fetches.append(asyncio.gather(*[self.request_node(url, node_lines) for url, node_lines in blocks]))
+                await asyncio.gather(*fetches)
+            else:
+                blocks = await self.route(net, sta, loc, cha, start, end)
+                await asyncio.gather(*[self.request_node(url, lines) for url, lines in blocks])
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+            self.writer.close()
+            await self.engine.close()
+            self.cache.close()
+        return 1 if self.failed else 0
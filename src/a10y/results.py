@@ -0,0 +1,199 @@
+"""
+Results model that the availability responses of a request are folded into.
+"""
+
+import numpy as np
+
+from a10y.timeline import GEOCSV_HEADER, QUALITIES, Frame, SegmentIndex, parse_geocsv, bin_traces, cell_info, to_iso
+
+QUALITY_CODES = np.array(['', *QUALITIES])  # quality letter of each code, empty for an unknown quality
+
+
+class ResultsModel:
+    """Traces and cell states of every channel of a request, updated in place as responses arrive.
+
+    The traces of all channels are held in flat columns sorted by (row, start), the traces of row i being
+    those between offsets[i] and offsets[i + 1], rather than in per-channel objects or response texts.
+    """
+
+    def __init__(self, frame: Frame, mergegaps=0.0):
+        self.frame = frame
+        self.window = (frame.start, frame.end)  # time window the traces were requested for
+        self.mergegaps = mergegaps  # gaps shorter than this (seconds) were merged by the nodes
+        self.keys = []  # NSLC (N_S_L_C) of each row
+        self.rows = {}  # row of each NSLC
+        self.offsets = np.zeros(1, dtype=np.int64)  # first trace of each row, and the number of traces
+        self.quality = np.empty(0, dtype=np.uint8)
+        self.starts = np.empty(0, dtype=np.int64)
+        self.ends = np.empty(0, dtype=np.int64)
+        self.samplerates = np.empty(0, dtype=np.float64)
+        self.coarse = np.empty(0, dtype=bool)  # traces of a coarse response, not refined yet
+        self.states = []  # uint8 cell states of each row
+        self.restrictions = []  # restriction marker of each row: ┄ unknown, R restricted, empty open
+        self._indexes = {}  # SegmentIndex views of the rows looked up since the last response
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add_rows(self, keys) -> list:
+        """Row of each channel, appending empty ones for the channels not seen yet (the offsets growing once)"""
+        count = len(self.keys)
+        for key in keys:
+            if key not in self.rows:
+                self.rows[key] = len(self.keys)
+                self.keys.append(key)
+                self.states.append(np.zeros(self.frame.num_spans, dtype=np.uint8))
+                self.restrictions.append('┄')
+        if len(self.keys) > count:
+            self.offsets = np.r_[self.offsets, np.full(len(self.keys) - count, self.offsets[-1])]
+        return [self.rows[key] for key in keys]
+
+    def trace_rows(self) -> np.ndarray:
+        """Row of each trace"""
+        return np.repeat(np.arange(len(self.keys)), np.diff(self.offsets))
+
+    def row_windows(self, window, channels):
+        """Start and end of the window of each row, for a (start, end) window or a function giving it per channel;
+        the coarse traces of channels without a window are replaced whole"""
+        lo = np.full(len(self.keys), np.iinfo(np.int64).min)
+        hi = np.full(len(self.keys), np.iinfo(np.int64).max)
+        if not callable(window):
+            lo[:], hi[:] = window
+            return lo, hi
+        for key in channels:
+            bounds = window(key)
+            if bounds is not None:
+                lo[self.rows[key]], hi[self.rows[key]] = bounds
+        return lo, hi
+
+    def index(self, row) -> SegmentIndex:
+        """Traces of a row, as views on the columns"""
+        if row not in self._indexes:
+            lo, hi = self.offsets[row], self.offsets[row + 1]
+            self._indexes[row] = SegmentIndex(self.quality[lo:hi], self.starts[lo:hi], self.ends[lo:hi])
+        return self._indexes[row]
+
+    def add(self, text, coarse=False, window=None) -> set:
+        """Fold the traces of a GeoCSV response into their channels; returns the rows whose cells changed.
+
+        Traces of a coarse response (large mergegaps) are replaced by those of the first detailed response of their channels,
+        only within the (start, end) window of the detailed response if given, or within window(key) for each channel
+        if the window is a function. Traces cut at the bounds of time shards are joined again.
+        """
+        channels, channel, quality, starts, ends, samplerates = parse_geocsv(text)
+        if not channels:
+            return set()
+        count = len(self.keys)
+        new_rows = np.array(self.add_rows(channels), dtype=np.int64)[channel]
+        touched = np.unique(new_rows)
+        # gather the traces already known for the touched rows only, from their slices of the columns
+        lengths = self.offsets[touched + 1] - self.offsets[touched]
+        index = np.arange(lengths.sum()) + np.repeat(self.offsets[touched] - (np.cumsum(lengths) - lengths), lengths)
+        rows = np.repeat(touched, lengths)
+        old_quality, old_starts, old_ends = self.quality[index], self.starts[index], self.ends[index]
+        old_samplerates, old_coarse = self.samplerates[index], self.coarse[index]
+        kept = np.ones(len(index), dtype=bool) if coarse else ~old_coarse
+        parts = [(rows[kept], old_quality[kept], old_starts[kept], old_ends[kept], old_samplerates[kept], old_coarse[kept])]
+        if not coarse and window is not None:
+            # the parts of the coarse traces outside of the window are still to be refined
+            lo, hi = self.row_windows(window, channels)
+            left = old_coarse & (old_starts < lo[rows])
+            right = old_coarse & (old_ends > hi[rows])
+            parts.append((rows[left], old_quality[left], old_starts[left], np.minimum(old_ends[left], lo[rows[left]]), old_samplerates[left], old_coarse[left]))
+            parts.append((rows[right], old_quality[right], np.maximum(old_starts[right], hi[rows[right]]), old_ends[right], old_samplerates[right], old_coarse[right]))
+        parts.append((new_rows, quality, starts, ends, samplerates, np.full(len(new_rows), coarse)))
+        channel, quality, starts, ends, samplerates, flags = map(np.concatenate, zip(*parts))
+        # detailed traces sort before the same coarse ones, so that they are the ones kept
+        order = np.lexsort((flags, ends, quality, starts, channel))
+        channel, quality, starts, ends, samplerates, flags = channel[order], quality[order], starts[order], ends[order], samplerates[order], flags[order]
+        # the same trace may be returned twice, e.g. by overlapping batches
+        unique = np.r_[True, (np.diff(channel) != 0) | (np.diff(starts) != 0) | (np.diff(ends) != 0) | (np.diff(quality) != 0)]
+        channel, quality, starts, ends, samplerates, flags = channel[unique], quality[unique], starts[unique], ends[unique], samplerates[unique], flags[unique]
+        # a trace ending where the next one of its channel starts, with the same quality and sample rate, was cut by the request bounds
+        same_rate = (samplerates[1:] == samplerates[:-1]) | (np.isnan(samplerates[1:]) & np.isnan(samplerates[:-1]))
+        joined = np.r_[False, (np.diff(channel) == 0) & (starts[1:] == ends[:-1]) & (np.diff(quality) == 0) & (flags[1:] == flags[:-1]) & same_rate]
+        if joined.any():
+            first = np.flatnonzero(~joined)
+            ends = np.maximum.reduceat(ends, first)
+            channel, quality, starts, samplerates, flags = channel[first], quality[first], starts[first], samplerates[first], flags[first]
+        states = bin_traces(np.searchsorted(touched, channel), quality, starts, ends, len(touched), self.frame.start, self.frame.end, self.frame.num_spans)
+        # splice the traces of the touched rows back in place of their old ones, the other rows staying as they are
+        removed = np.zeros(len(self.keys), dtype=np.int64)
+        removed[touched] = lengths
+        positions = (self.offsets[:-1] - np.cumsum(removed) + removed)[channel]
+        self.quality = np.insert(np.delete(self.quality, index), positions, quality)
+        self.starts = np.insert(np.delete(self.starts, index), positions, starts)
+        self.ends = np.insert(np.delete(self.ends, index), positions, ends)
+        self.samplerates = np.insert(np.delete(self.samplerates, index), positions, samplerates)
+        self.coarse = np.insert(np.delete(self.coarse, index), positions, flags)
+        counts = np.diff(self.offsets)
+        counts[touched] = np.bincount(np.searchsorted(touched, channel), minlength=len(touched))
+        self.offsets = np.r_[0, np.cumsum(counts)]
+        self._indexes = {}
+        changed = set()
+        for i, row in enumerate(touched.tolist()):
+            if row >= count or not np.array_equal(self.states[row], states[i]):
+                self.states[row] = states[i]
+                changed.add(row)
+        return changed
+
+    def rebin(self, frame: Frame) -> None:
+        """Bin the traces of every channel into the cells of another time frame"""
+        self.frame = frame
+        if not self.keys:
+            return
+        self.states = list(bin_traces(self.trace_rows(), self.quality, self.starts, self.ends, len(self.keys), frame.start, frame.end, frame.num_spans))
+
+    def zoomed(self, center, factor) -> Frame:
+        """Frame `factor` times shorter (longer if below 1) than the current one around a time, kept within the requested window"""
+        window_start, window_end = self.window
+        num_spans = self.frame.num_spans
+        length = int(min(max((self.frame.end - self.frame.start) / factor, num_spans), window_end - window_start))
+        start = int(min(max(center - length // 2, window_start), window_end - length))
+        return Frame(start, start + length, num_spans)
+
+    def set_restriction(self, key, restricted):
+        """Mark a channel as restricted or open; returns its row, if the channel is known"""
+        if key not in self.rows:
+            return None
+        row = self.rows[key]
+        self.restrictions[row] = 'R' if restricted else ' '
+        return row
+
+    def info(self, row, column):
+        """Info bar data of a cell, see timeline.cell_info"""
+        return cell_info(self.frame, self.index(row), self.states[row], column)
+
+    def merged(self, key, start=None, end=None) -> bool:
+        """Whether a channel still has coarse traces to refine, within [start, end) if given"""
+        if key not in self.rows:
+            return False
+        row = self.rows[key]
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        coarse = self.coarse[lo:hi]
+        if start is not None:
+            coarse = coarse & (self.starts[lo:hi] < end) & (self.ends[lo:hi] > start)
+        return bool(coarse.any())
+
+    def count(self, key) -> int:
+        """Number of traces of a channel"""
+        if key not in self.rows:
+            return 0
+        row = self.rows[key]
+        return int(self.offsets[row + 1] - self.offsets[row])
+
+    def plain_rows(self, key, first=0, last=None) -> list:
+        """GeoCSV rows of the traces first to last (excluded) of a channel, rebuilt from the columns"""
+        if key not in self.rows:
+            return []
+        row = self.rows[key]
+        lo = self.offsets[row] + first
+        hi = self.offsets[row + 1] if last is None else min(self.offsets[row] + last, self.offsets[row + 1])
+        prefix = key.replace('_', '|')
+        samplerates = ['' if np.isnan(rate) else str(rate) for rate in self.samplerates[lo:hi].tolist()]
+        return [f"{prefix}|{q}|{rate}|{a}|{b}" for q, rate, a, b in
+                zip(QUALITY_CODES[self.quality[lo:hi]].tolist(), samplerates, to_iso(self.starts[lo:hi]), to_iso(self.ends[lo:hi]))]
+
+    def plain(self, key) -> str:
+        """GeoCSV text of the traces of a channel"""
+        return GEOCSV_HEADER + '\n'.join(self.plain_rows(key))
@@ -0,0 +1,295 @@
+"""
+Vectorized parsing of GeoCSV availability responses and binning of their traces into timeline cells.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+QUALITIES = "DRQM"  # quality codes 1-4 in cell states, 0 meaning no data
+COLORS = ("", "orange1", "green1", "orchid", "turquoise4")
+
+# Cell state (uint8): quality code in the low bits, edge flags for partially covered cells, or the gap count
+EDGE_START = 0x08  # the trace starts inside the cell ┗
+EDGE_END = 0x10  # the trace ends inside the cell ┛
+GAPS = 0x80  # the cell holds more than one trace; the low 7 bits count the gaps between them
+QUALITY_MASK = 0x07
+
+
+def cell_char(state) -> str:
+    """The character drawn for a cell state"""
+    if state & GAPS:
+        return '╌' if (state & ~GAPS) == 1 else '┄'
+    if not state:
+        return ' '
+    if state & EDGE_START:
+        return '┗'
+    if state & EDGE_END:
+        return '┛'
+    return '━'
+
+
+CELL_CHARS = np.array([cell_char(state) for state in range(256)])
+
+
+def row_plain(states) -> str:
+    """Characters of a row of cell states"""
+    return ''.join(CELL_CHARS[states].tolist())
+
+
+def cell_color(state) -> str:
+    """Color of a cell state; cells with gaps are not colored"""
+    return COLORS[state & QUALITY_MASK] if not state & GAPS else ""
+
+
+def row_runs(states):
+    """Start, end and state of each run of identical cells of a row"""
+    boundaries = np.flatnonzero(np.diff(states)) + 1
+    return zip(np.r_[0, boundaries].tolist(), np.r_[boundaries, len(states)].tolist(), states[np.r_[0, boundaries]].tolist())
+
+
+def cell_markup(state, length=1) -> str:
+    """The (colored) markup of a run of cells with the same state"""
+    chars = cell_char(state) * length
+    color = cell_color(state)
+    return f'[{color}]{chars}[/{color}]' if color else chars
+
+
+GEOCSV_HEADER = """#dataset: GeoCSV 2.0
+#delimiter: |
+#field_unit: unitless|unitless|unitless|unitless|unitless|hertz|ISO_8601|ISO_8601
+#field_type: string|string|string|string|string|float|datetime|datetime
+Network|Station|Location|Channel|Quality|SampleRate|Earliest|Latest
+"""
+
+
+def to_epoch(values) -> np.ndarray:
+    """Convert an array of ISO timestamps (with or without trailing Z) to int64 epoch microseconds"""
+    return np.char.rstrip(np.asarray(values, dtype=str), 'Z').astype('datetime64[us]').astype(np.int64)
+
+
+def parse_geocsv(text):
+    """Parse the data rows of a GeoCSV availability response in one pass.
+
+    Returns the channel keys (N_S_L_C, in order of appearance) and, for each row, the index of its channel,
+    its uint8 quality code, its start and end epochs (int64 microseconds) and its sample rate (NaN if missing) as arrays.
+    Rows whose number of fields differs from the field names (or from the first row, without them) are skipped.
+    """
+    lines = text.split('\n')
+    header = 0
+    num_columns = 0
+    while header < len(lines) and (lines[header].startswith('#') or lines[header].startswith('Network|')):
+        if lines[header].startswith('Network|'):
+            num_columns = lines[header].count('|') + 1
+        header += 1
+    rows = [line for line in lines[header:] if line]
+    # the rows of a stream batch come without the field names: the first one tells the columns
+    num_columns = num_columns or (rows[0].count('|') + 1 if rows else 0)
+    # a ragged row (truncated, or with a stray delimiter) would shift the columns of all the rows after it
+    if any(row.count('|') != num_columns - 1 for row in rows):
+        rows = [row for row in rows if row.count('|') == num_columns - 1]
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return [], empty, np.empty(0, dtype=np.uint8), empty, empty, np.empty(0)
+    fields = '|'.join(rows).split('|')
+    channels = {}
+    channel = np.fromiter((channels.setdefault(key, len(channels)) for key in map('_'.join, zip(*(fields[i::num_columns] for i in range(4))))),
+                          dtype=np.int64, count=len(rows))
+    codes = np.array(fields[4::num_columns])
+    quality = np.zeros(len(rows), dtype=np.uint8)
+    for code, q in enumerate(QUALITIES, 1):
+        quality[codes == q] = code
+    samplerates = np.array(fields[5::num_columns])
+    samplerates[samplerates == ''] = 'nan'
+    return list(channels), channel, quality, to_epoch(fields[6::num_columns]), to_epoch(fields[7::num_columns]), samplerates.astype(np.float64)
+
+
+STREAM_BATCH = 64 * 2**10  # characters of data rows of the first batch of a GeoCSV stream, the next ones growing with the rows returned
+MAX_STREAM_BATCH = 2**20  # characters of data rows of a batch at most, so that a large response is never buffered for long
+
+
+class GeoCSVStream:
+    """Incremental parser of a GeoCSV response fed in chunks as they arrive.
+
+    The header (the #key: value metadata lines, then the field names) is parsed as it comes, whatever its length, and the
+    complete data rows are returned in batches that grow with the rows returned so far up to a fixed size, so that a
+    large response is drawn progressively while only one batch of its rows is held at a time.
+    """
+
+    def __init__(self, batch=STREAM_BATCH, limit=MAX_STREAM_BATCH):
+        self.batch = batch
+        self.limit = limit
+        self.metadata = {}  # values of the header lines
+        self.fields = []  # names of the fields
+        self.returned = 0  # characters of the data rows returned so far
+        self._header = True
+        self._rest = ""  # incomplete last line of the chunks fed so far
+        self._rows = []  # complete data rows not returned yet
+        self._size = 0
+
+    def feed(self, chunk, final=False) -> str:
+        """Add a chunk of the response; returns the next batch of data rows, empty until there are enough of them
+        (or all the rows left once final)"""
+        lines = (self._rest + chunk).split('\n')
+        self._rest = "" if final else lines.pop()
+        first = 0
+        while self._header and first < len(lines):
+            line = lines[first]
+            if line.startswith('#'):
+                key, _, value = line[1:].partition(':')
+                self.metadata[key.strip()] = value.strip()
+            elif line.startswith('Network'):
+                self.fields = line.split(self.metadata.get('delimiter', '|'))
+            elif line:
+                self._header = False
+                break
+            first += 1
+        rows = [line for line in lines[first:] if line]
+        self._rows += rows
+        self._size += sum(map(len, rows))
+        if not self._rows or (not final and self._size < min(max(self.batch, self.returned), self.limit)):
+            return ""
+        text = '\n'.join(self._rows)
+        self.returned += self._size
+        self._rows, self._size = [], 0
+        return text
+
+
+def to_iso(epochs) -> list:
+    """Format epoch microseconds as GeoCSV timestamps"""
+    return [f"{t}Z" for t in np.datetime_as_string(np.asarray(epochs, dtype=np.int64).astype('datetime64[us]'), unit='us').tolist()]
+
+
+def to_datetime(epoch) -> datetime:
+    """Convert epoch microseconds to a naive UTC datetime"""
+    return datetime(1970, 1, 1) + timedelta(microseconds=int(epoch))
+
+
+def to_string(epoch) -> str:
+    """Format epoch microseconds as a YYYY-MM-DDTHH:MM:SS string"""
+    return to_datetime(epoch).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def to_strings(epochs) -> list:
+    """Format epoch microseconds as YYYY-MM-DDTHH:MM:SS strings"""
+    return np.datetime_as_string(np.asarray(epochs).astype('datetime64[us]').astype('datetime64[s]')).tolist()
+
+
+def span_edges(frame_start, frame_end, num_spans) -> np.ndarray:
+    """Epoch boundaries (num_spans + 1) of the cells of a time frame"""
+    edges = frame_start + (np.arange(num_spans + 1) * ((frame_end - frame_start) / num_spans)).astype(np.int64)
+    edges[-1] = frame_end
+    return edges
+
+
+def bin_traces(channel, quality, starts, ends, num_channels, frame_start, frame_end, num_spans):
+    """Bin traces into the cells of a time frame.
+
+    channel holds the row index (0..num_channels-1) of each trace; traces must be sorted by (channel, start).
+    Returns the (num_channels, num_spans) uint8 cell states.
+    """
+    span = (frame_end - frame_start) / num_spans
+    first = np.clip(np.floor((starts - frame_start) / span), 0, num_spans).astype(np.int64)
+    last = np.clip(np.ceil((ends - frame_start) / span), 0, num_spans).astype(np.int64)
+    keep = first < last
+    index = np.arange(len(starts), dtype=np.int64)
+    offset = channel.astype(np.int64) * num_spans
+    size = num_channels * num_spans
+    # difference arrays: number of traces and sum of their indices covering each cell
+    count = np.zeros(size + 1, dtype=np.int64)
+    owner = np.zeros(size + 1, dtype=np.int64)
+    np.add.at(count, offset[keep] + first[keep], 1)
+    np.add.at(count, offset[keep] + last[keep], -1)
+    np.add.at(owner, offset[keep] + first[keep], index[keep])
+    np.add.at(owner, offset[keep] + last[keep], -index[keep])
+    count = np.cumsum(count)[:size].reshape(num_channels, num_spans)
+    owner = np.cumsum(owner)[:size].reshape(num_channels, num_spans)
+
+    states = np.zeros((num_channels, num_spans), dtype=np.uint8)
+    single = count == 1
+    owners = owner[single]
+    cells = np.nonzero(single)[1]
+    edges = span_edges(frame_start, frame_end, num_spans)
+    flags = np.where((cells == first[owners]) & (edges[cells] < starts[owners]), EDGE_START,
+                     np.where((cells == last[owners] - 1) & (ends[owners] < edges[cells + 1]), EDGE_END, 0))
+    states[single] = quality[owners] | flags
+    multiple = count > 1
+    states[multiple] = GAPS | np.minimum(count[multiple] - 1, 0x7f)
+
+    return states
+
+
+def row_markup(states) -> str:
+    """Markup of a row of cell states, with one color tag per run of identical cells"""
+    return ''.join(cell_markup(state, run_end - run_start) for run_start, run_end, state in row_runs(states))
+
+
+def covered(starts, ends, start, end) -> int:
+    """Time (microseconds) of [start, end) covered by at least one of the traces"""
+    order = np.argsort(starts, kind='stable')
+    starts, ends = np.clip(starts[order], start, end), np.clip(ends[order], start, end)
+    # time already covered by the traces before each one
+    reach = np.maximum.accumulate(np.r_[start, ends])[:-1]
+    return int(np.maximum(ends - np.maximum(starts, reach), 0).sum())
+
+
+def sort_traces(channel, starts) -> np.ndarray:
+    """The order that sorts traces by (channel, start), as needed by bin_traces"""
+    return np.lexsort((starts, channel))
+
+
+class SegmentIndex:
+    """The traces of one channel sorted by start, answering lookups around a time in O(log n)"""
+
+    def __init__(self, quality, starts, ends):
+        self.quality = quality
+        self.starts = starts
+        self.ends = ends
+        # latest end among the traces up to each one, so that overlapping traces are handled
+        self.reach = np.maximum.accumulate(ends) if len(ends) else ends
+
+    def covering(self, t0, t1):
+        """Indices of the first and last trace overlapping [t0, t1), or None"""
+        first = int(np.searchsorted(self.reach, t0, side='right'))
+        last = int(np.searchsorted(self.starts, t1, side='left')) - 1
+        return (first, last) if first <= last else None
+
+    def around(self, t):
+        """End of the latest trace before t and start of the first trace after t (None if there is none)"""
+        following = int(np.searchsorted(self.starts, t, side='left'))
+        previous_end = int(self.reach[following - 1]) if following > 0 else None
+        next_start = int(self.starts[following]) if following < len(self.starts) else None
+        return previous_end, next_start
+
+
+class Frame:
+    """A time frame divided in num_spans cells"""
+
+    def __init__(self, start, end, num_spans):
+        self.start = start
+        self.end = end
+        self.num_spans = num_spans
+        self.edges = span_edges(start, end, num_spans)
+
+    def timestamp(self, i) -> str:
+        """Timestamp in the middle of a cell"""
+        return to_string((self.edges[i] + self.edges[i + 1]) // 2)
+
+
+def cell_info(frame, index, states, i):
+    """Info bar data of cell i of a channel: [quality/gaps, timestamp, trace or gap start, trace or gap end, span_start, span_end]"""
+    if i >= frame.num_spans:
+        return ["", "", "", "", "", ""]
+    t0, t1 = int(frame.edges[i]), int(frame.edges[i + 1])
+    span = [to_datetime(t0), to_datetime(t1)]
+    state = int(states[i])
+    covering = index.covering(t0, t1)
+    if not state or covering is None:
+        # a long gap lasts from the end of the previous trace to the start of the next one
+        previous_end, next_start = index.around(t0)
+        return ["", frame.timestamp(i), to_string(max(previous_end or frame.start, frame.start)), to_string(min(next_start or frame.end, frame.end))] + span
+    first, last = covering
+    if state & GAPS:
+        # gaps start at the end of the first trace in this span and end at the start of the last one
+        return [str(state & ~GAPS), frame.timestamp(i), to_string(index.ends[first]), to_string(index.starts[last])] + span
+    return [QUALITIES[(state & QUALITY_MASK) - 1], frame.timestamp(i), to_string(index.starts[first]), to_string(index.ends[first])] + span
@@ -1,14 +1,24 @@
 from textual.widgets import Static, Input, Button, Label, Select, Checkbox, SelectionList, LoadingIndicator
-from textual.containers import Container, Horizontal, ScrollableContainer
+from textual.containers import Container, Horizontal
 from textual_autocomplete import AutoComplete, Dropdown
 from textual.app import ComposeResult
 from datetime import datetime
+from collections import deque
+import asyncio
 import os
+import threading
 from textual.suggester import Suggester
 from textual import events
+from textual.binding import Binding
+from textual.geometry import Region, Size
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from rich.segment import Segment
+from rich.style import Style
 from rich.text import Text
-from rich.cells import get_character_cell_size
+import numpy as np
 from a10y import __version__
+from a10y.timeline import GEOCSV_HEADER, Frame, cell_color, row_plain, row_runs
 
 class Explanations(Static):
     """Explanations box with common key functions"""
@@ -85,6 +95,7 @@ class Requests(Static):
         yield Horizontal(
             Label("Mergegaps:", classes="request-label"),
             Input(value=self.config["default_mergegaps"], type="number", id="mergegaps"),
+            Checkbox("Auto", self.config.get("default_auto_mergegaps", False), id="auto-mergegaps"),
             Label("Merge Options:", classes="request-label"),
             Checkbox("Samplerate", self.config["default_merge_samplerate"], id="samplerate"),
             Checkbox("Quality", self.config["default_merge_quality"], id="qual"),
@@ -96,7 +107,7 @@ class Requests(Static):
             Checkbox("M", self.config["default_quality_M"], id="qm"),
             id="options"
         )
-        yield Button("Reload Nodes\n(Restart the app)", variant="primary", id="reload-nodes", disabled=False)
+        yield Button("Reload Nodes", variant="primary", id="reload-nodes", disabled=False)
         yield Horizontal(
             Checkbox("Include Restricted", self.config["default_includerestricted"], id="restricted"),
             Button("Send", variant="primary", id="request-button",disabled=False),
@@ -107,11 +118,151 @@ class Requests(Static):
         
 
 
+class StatusLog(ScrollView):
+    """Append-only log of status messages keeping the latest lines in a ring buffer; messages can be written
+    from any thread and are drawn at most once per frame, older lines spill to an optional log file"""
+
+    DEFAULT_CSS = """
+    StatusLog {
+        height: auto;
+    }
+    """
+
+    FRAME_INTERVAL = 1 / 60
+
+    def __init__(self, max_lines=1000, log_file=None, name=None, id=None, classes=None, disabled=False):
+        super().__init__(name=name, id=id, classes=classes, disabled=disabled)
+        self.lines = deque(maxlen=max(max_lines, 1))  # rendered strip of each line
+        self.log_file = log_file
+        self.line_width = 0
+        self.pending = []  # messages written since the last flush
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.loop = None
+        self.thread = None
+
+    def on_mount(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.thread = threading.get_ident()
+        self.schedule()
+
+    def write(self, message) -> None:
+        """Append a (markup) message; thread-safe"""
+        with self.lock:
+            self.pending.append(message)
+            if self.scheduled or self.loop is None:
+                return
+            self.scheduled = True
+        if threading.get_ident() == self.thread:
+            self.schedule()
+        else:
+            self.loop.call_soon_threadsafe(self.schedule)
+
+    def schedule(self) -> None:
+        self.set_timer(self.FRAME_INTERVAL, self.flush)
+
+    def flush(self) -> None:
+        """Draw the messages written since the last frame"""
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.scheduled = False
+        spilled = []
+        for message in pending:
+            for line in message.split('\n'):
+                text = Text.from_markup(line)
+                if len(self.lines) == self.lines.maxlen:
+                    spilled.append(self.lines[0].text)
+                strip = Strip(list(text.render(self.app.console, end="")))
+                self.lines.append(strip)
+                self.line_width = max(self.line_width, strip.cell_length)
+        if spilled and self.log_file:
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(''.join(f"{line}\n" for line in spilled))
+        following = self.scroll_offset.y >= self.max_scroll_y
+        self.virtual_size = Size(self.line_width, len(self.lines))
+        self.refresh()
+        if following:
+            self.scroll_end(animate=False)
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        row = scroll_y + y
+        width = self.size.width
+        if row >= len(self.lines):
+            return Strip.blank(width, self.rich_style)
+        return self.lines[row].crop(scroll_x, scroll_x + width)
+
+
 class Status(Static):
-    """Status line to show user what request is currently issued"""
+    """Status log to show user what requests are issued"""
+
+    def __init__(self, max_lines=1000, log_file=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_lines = max_lines
+        self.log_file = log_file
 
     def compose(self) -> ComposeResult:
-        yield ScrollableContainer(Static(f'Welcome to Availability UI application version 1.0! 🙂\nCurrent session started at {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', id="status-line"), id="status-container")
+        status_log = StatusLog(self.max_lines, self.log_file, id="status-log")
+        status_log.write(f'Welcome to Availability UI application version 1.0! 🙂\nCurrent session started at {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
+        yield status_log
+
+
+class PlainView(ScrollView, can_focus=True):
+    """GeoCSV rows of one channel, formatted from the results model a page at a time as they are scrolled into view"""
+
+    DEFAULT_CSS = """
+    PlainView {
+        height: auto;
+    }
+    """
+
+    PAGE_SIZE = 500  # rows formatted at once
+
+    def __init__(self, results, name=None, id=None, classes=None, disabled=False):
+        super().__init__(name=name, id=id, classes=classes, disabled=disabled)
+        self.results = results  # ResultsModel the rows are read from
+        self.key = None  # NSLC of the channel shown
+        self.header = GEOCSV_HEADER.splitlines()
+        self.count = 0  # number of rows of the channel
+        self.pages = {}  # formatted rows of each page scrolled into view
+
+    def show(self, key) -> None:
+        """Show the rows of a channel from the top"""
+        self.key = key
+        self.count = -1
+        self.reload()
+        self.scroll_home(animate=False)
+
+    def reload(self) -> None:
+        """Follow the rows of the channel shown once more of its traces have arrived"""
+        count = self.results.count(self.key)
+        if count == self.count:
+            return
+        self.count = count
+        self.pages = {}
+        width = max([len(line) for line in self.header] + [len(row) for row in self.page(0)])
+        self.virtual_size = Size(width, len(self.header) + count)
+        self.refresh()
+
+    def page(self, page) -> list:
+        if page not in self.pages:
+            self.pages[page] = self.results.plain_rows(self.key, page * self.PAGE_SIZE, (page + 1) * self.PAGE_SIZE)
+        return self.pages[page]
+
+    def line(self, i) -> str:
+        """Header line or row i of the text shown"""
+        if i < len(self.header):
+            return self.header[i]
+        i -= len(self.header)
+        return self.page(i // self.PAGE_SIZE)[i % self.PAGE_SIZE]
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        row = scroll_y + y
+        width = self.size.width
+        if self.key is None or row >= len(self.header) + self.count:
+            return Strip.blank(width, self.rich_style)
+        return Strip([Segment(self.line(row))]).crop(scroll_x, scroll_x + width)
 
 
 class Results(Static):
@@ -143,227 +294,367 @@ class FileSuggester(Suggester):
         return None
 
 
-class CursoredText(Input):
-    """Widget that shows a Static text with a cursor that can be moved within text content"""
+class TimelineView(ScrollView, can_focus=True):
+    """Grid of channel timelines drawn line by line, with a single cursor (row, column) moving within it"""
 
     DEFAULT_CSS = """
-    CursoredText {
+    TimelineView {
         background: $background;
-        padding: 0 0;
-        border: none;
-        height: 1;
+        height: auto;
     }
-    CursoredText:focus {
-        border: none;
-    }
-    CursoredText>.input--cursor {
+    TimelineView > .timeline--cursor {
         background: $surface;
         color: $text;
         text-style: reverse;
     }
     """
 
-    enriched = ""
-    info = []
-
-    def __init__(self, value=None, info=[], name=None, id=None, classes=None, disabled=False):
-        super().__init__(value=Text.from_markup(value).plain, name=name, id=id, classes=classes, disabled=disabled)
-        self.enriched = value
-        self.info = info
+    COMPONENT_CLASSES = {"timeline--cursor"}
+
+    BINDINGS = [
+        Binding("right", "cursor_right", show=False),
+        Binding("left", "cursor_left", show=False),
+        Binding("home", "home", show=False),
+        Binding("end", "end", show=False),
+        Binding("down", "next_row", show=False),
+        Binding("up", "previous_row", show=False),
+        Binding("tab", "next_row(True)", show=False),
+        Binding("shift+tab", "previous_row(True)", show=False),
+        Binding("pagedown", "page_down", show=False),
+        Binding("pageup", "page_up", show=False),
+    ]
+
+    LABEL_WIDTH = 28  # longest possible label (NSLC, restriction marker and padding) to align start of lines
+    MARGIN = 2
+
+    KEYS_HELP = """[gold3]ctrl+c[/gold3]: close app  [gold3]ctrl+s[/gold3]: send request  [gold3]esc[/gold3]: cancel request  [gold3]up/down/pgUp/pgDown[/gold3]: move to channel above/below
+            [gold3]t[/gold3]: toggle results view           [gold3]tab/shif+tab[/gold3]: jump to next/previous channel            [gold3]ctrl+t/ctrl+b[/gold3]: jump to top/bottom channel
+            [gold3]right/left[/gold3]: move cursor on line  [gold3]home/end[/gold3]: jump to beginning/end of line                [gold3]n/p[/gold3]: jump to next/previous trace
+            [gold3]c[/gold3]: capture NSLC under cursor     [gold3]s/e[/gold3]: capture timestamp under cursor as Start/End Time  [gold3]z[/gold3]: capture time span under cursor as Start and End Time
+            [gold3]+/-[/gold3]: zoom in/out around cursor
+            Quality codes colors: [orange1][b]D[/b][/orange1] [green1][b]R[/b][/green1] [orchid][b]Q[/b][/orchid] [turquoise4][b]M[/b][/turquoise4]    Restriction policy: [i]empty[/i]/┄/[red1][b]R[/b][/red1] (open/unknown/restricted)"""
+    DEFAULT_KEYS_HELP = """[gold3]ctrl+c[/gold3]: close app  [gold3]tab/shif+tab[/gold3]: cycle through options  [gold3]ctrl+s[/gold3]: send request  [gold3]esc[/gold3]: cancel request
+            [gold3]up/down/pgUp/pgDown[/gold3]: scroll up/down if in scrollable window"""
+
+    FRAME_INTERVAL = 1 / 60  # changed rows are drawn at most once per frame
+    ZOOM_FACTOR = 2  # how much + and - narrow or widen the time frame
+
+    def __init__(self, results, name=None, id=None, classes=None, disabled=False):
+        super().__init__(name=name, id=id, classes=classes, disabled=disabled)
+        self.results = results  # ResultsModel the rows are drawn from
+        self.cursor_row = 0
+        self.cursor_column = 0
+        self.dirty = set()  # rows changed since the last update
+        self.update_timer = None
+        self.drawn = {}  # rendered strip (without cursor) and characters of each row, until the row changes
+        self.view = None  # scroll offset, height and number of rows the keys in view were taken at
+        self.view_keys = frozenset()
 
     @property
-    def _value(self) -> Text:
-        """Value rendered as rich renderable"""
-        return Text.from_markup(self.enriched)
+    def keys(self):
+        """NSLC of each row"""
+        return self.results.keys
 
     @property
-    def _cursor_at_end(self) -> bool:
-        """Flag to indicate if the cursor is at the end"""
-        return self.cursor_position >= len(self.value) - 1
+    def num_spans(self):
+        return self.results.frame.num_spans
+
+    @staticmethod
+    def spans_for(width) -> int:
+        """Number of cells of the timelines drawn in a results area of the given width"""
+        return max(width // 2, 160)
+
+    def set_frame(self, frame, time=None) -> None:
+        """Re-bin all rows into another time frame, keeping the cursor at the same time"""
+        edges = self.results.frame.edges
+        if time is None:
+            time = (edges[self.cursor_column] + edges[self.cursor_column + 1]) // 2
+        self.results.rebin(frame)
+        self.cursor_column = max(0, min(int(np.searchsorted(frame.edges, time, side='right')) - 1, frame.num_spans - 1))
+        self.update_rows(range(len(self.keys)))
+
+    def zoom(self, factor) -> None:
+        """Zoom in (factor above 1) or out around the cursor, re-binning the traces already retrieved"""
+        frame = self.results.frame
+        center = (frame.edges[self.cursor_column] + frame.edges[self.cursor_column + 1]) // 2
+        zoomed = self.results.zoomed(center, factor)
+        if (zoomed.start, zoomed.end) == (frame.start, frame.end):
+            return
+        self.set_frame(zoomed, center)
+        span = (zoomed.end - zoomed.start) / zoomed.num_spans / 10**6
+        if factor > 1 and span < self.results.mergegaps:
+            # cells are now shorter than the gaps merged by the nodes, so ask them for the details
+            self.app.refetch(zoomed, span)
+
+    def update_rows(self, rows) -> None:
+        """Schedule changed (or new) rows to be drawn, coalescing updates to one per frame"""
+        rows = set(rows)
+        self.dirty.update(rows)
+        for row in rows:
+            self.drawn.pop(row, None)
+        if self.update_timer is None:
+            self.update_timer = self.set_timer(self.FRAME_INTERVAL, self.flush)
+
+    def flush(self) -> None:
+        """Draw the rows changed since the last update"""
+        self.update_timer = None
+        size = Size(self.LABEL_WIDTH + self.MARGIN + self.num_spans, len(self.keys))
+        if size != self.virtual_size:
+            self.virtual_size = size
+            self.refresh()
+        else:
+            for row in self.dirty:
+                self.refresh_row(row)
+        self.dirty.clear()
+        if self.has_focus:
+            self.update_info_bar()
+
+    def on_resize(self, event: events.Resize) -> None:
+        """Re-bin the rows to fit the new width of the results"""
+        num_spans = self.spans_for(self.app.query_one("#results-widget").size.width)
+        if num_spans != self.num_spans:
+            frame = self.results.frame
+            self.set_frame(Frame(frame.start, frame.end, num_spans))
+
+    def set_restrictions(self, restricted) -> None:
+        """Mark the rows of channels as restricted or open, in one update"""
+        rows = [row for row in (self.results.set_restriction(key, flag) for key, flag in restricted.items()) if row is not None]
+        if rows:
+            self.update_rows(rows)
+
+    def refresh_row(self, row) -> None:
+        """Refresh a single row if it is visible"""
+        y = row - self.scroll_offset.y
+        if 0 <= y < self.size.height:
+            self.refresh(Region(0, y, self.size.width, 1))
+
+    def draw(self, row):
+        """The strip (without cursor) and characters of a row, rendered once until the row changes"""
+        if row not in self.drawn:
+            key = self.keys[row]
+            restriction = self.results.restrictions[row]
+            segments = [Segment(f"{key} "), Segment('R', Style(color="red1", bold=True)) if restriction == 'R' else Segment(restriction),
+                        Segment(' ' * (self.LABEL_WIDTH - len(key) - 2 + self.MARGIN))]
+            plain = row_plain(self.results.states[row])
+            segments += [Segment(plain[start:end], Style(color=cell_color(state) or None)) for start, end, state in row_runs(self.results.states[row])]
+            self.drawn[row] = (Strip(segments).simplify(), plain)
+        return self.drawn[row]
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        row = scroll_y + y
+        width = self.size.width
+        if row >= len(self.keys):
+            return Strip.blank(width, self.rich_style)
+        strip, plain = self.draw(row)
+        if row == self.cursor_row and self.has_focus and self.cursor_column < len(plain):
+            x = self.LABEL_WIDTH + self.MARGIN + self.cursor_column
+            cursor = Strip([Segment(plain[self.cursor_column], self.get_component_rich_style("timeline--cursor"))])
+            strip = Strip.join([strip.crop(0, x), cursor, strip.crop(x + 1, strip.cell_length)])
+        return strip.crop(scroll_x, scroll_x + width)
+
+    def plain(self, row) -> str:
+        """Characters of the cells of a row"""
+        return self.draw(row)[1]
+
+    def visible_keys(self) -> list:
+        """NSLC of the rows in view"""
+        return self.keys[self.scroll_offset.y:self.scroll_offset.y + self.size.height]
+
+    def visible_set(self) -> frozenset:
+        """NSLC of the rows in view, the same set until the view scrolls, resizes or gets more rows"""
+        view = (self.scroll_offset.y, self.size.height, len(self.keys))
+        if view != self.view:
+            self.view = view
+            self.view_keys = frozenset(self.visible_keys())
+        return self.view_keys
+
+    def move_cursor(self, row=None, column=None) -> None:
+        """Move the cursor, scroll to keep it visible and update the info bar"""
+        previous_row = self.cursor_row
+        if row is not None:
+            self.cursor_row = max(0, min(row, len(self.keys) - 1))
+        if column is not None:
+            self.cursor_column = max(0, min(column, self.num_spans - 1))
+        if self.cursor_row < self.scroll_offset.y:
+            self.scroll_to(y=self.cursor_row, animate=False)
+        elif self.cursor_row >= self.scroll_offset.y + self.size.height:
+            self.scroll_to(y=self.cursor_row - self.size.height + 1, animate=False)
+        self.refresh_row(previous_row)
+        self.refresh_row(self.cursor_row)
+        self.update_info_bar()
+
+    def move_to_key(self, key) -> None:
+        """Focus the row of a channel"""
+        if key in self.results.rows:
+            self.focus()
+            self.move_cursor(self.results.rows[key], 0)
+
+    def info(self):
+        """Info of the cell under the cursor"""
+        return self.results.info(self.cursor_row, self.cursor_column) if self.keys else ["", "", "", "", "", ""]
 
     def update_info_bar(self) -> None:
         """Update info bar when cursor moves"""
-        if self.info[self.cursor_position][1]:
-            if self.value[self.cursor_position] == ' ':
-                #self.parent.parent.parent.parent.parent.query_one("#info-bar").update(f"Gap          Timestamp: {self.info[self.cursor_position][1]}     Gap start: {self.info[self.cursor_position][2]}     Gap end: {self.info[self.cursor_position][3]} ")
-                self.parent.parent.parent.parent.parent.query_one("#info-bar").update(f"Gap          Timestamp: {self.info[self.cursor_position][1]} ")
-            elif self.info[self.cursor_position][0].isdigit():
-                self.parent.parent.parent.parent.parent.query_one("#info-bar").update(f"Gaps: {self.info[self.cursor_position][0]}      Timestamp: {self.info[self.cursor_position][1]}    Gaps start: {self.info[self.cursor_position][2]}    Gaps end: {self.info[self.cursor_position][3]} ")
+        if not self.keys:
+            return
+        info = self.info()
+        info_bar = self.app.query_one("#info-bar")
+        edges = self.results.frame.edges
+        # gaps merged by the nodes (auto mergegaps) are not drawn, so say so for the cells not refined yet
+        merged = f"   Gaps under {self.results.mergegaps:g}s merged" if self.results.merged(
+            self.keys[self.cursor_row], edges[self.cursor_column], edges[self.cursor_column + 1]) else ""
+        if info[1]:
+            if self.plain(self.cursor_row)[self.cursor_column] == ' ':
+                info_bar.update(f"Gap          Timestamp: {info[1]}     Gap start: {info[2]}     Gap end: {info[3]} {merged}")
+            elif info[0].isdigit():
+                info_bar.update(f"Gaps: {info[0]}      Timestamp: {info[1]}    Gaps start: {info[2]}    Gaps end: {info[3]} {merged}")
             else:
-                self.parent.parent.parent.parent.parent.query_one("#info-bar").update(f"Quality: {self.info[self.cursor_position][0]}   Timestamp: {self.info[self.cursor_position][1]}   Trace start: {self.info[self.cursor_position][2]}   Trace end: {self.info[self.cursor_position][3]} ")
+                info_bar.update(f"Quality: {info[0]}   Timestamp: {info[1]}   Trace start: {info[2]}   Trace end: {info[3]} {merged}")
         else:
-            self.parent.parent.parent.parent.parent.query_one("#info-bar").update("")
-
-    async def _on_key(self, event: events.Key) -> None:
-        if event.is_printable:
-            # capture nslc
-            if event.character == 'c':
-                nslc = self.id.split('_')[1:]
-                self.parent.parent.parent.parent.parent.parent.query_one("#network").value = str(nslc[0])
-                self.parent.parent.parent.parent.parent.parent.query_one("#station").value = str(nslc[1])
-                self.parent.parent.parent.parent.parent.parent.query_one("#location").value = str(nslc[2])
-                self.parent.parent.parent.parent.parent.parent.query_one("#channel").value = str(nslc[3])
-            # capture timestamp as start time
-            elif event.character == 's':
-                self.parent.parent.parent.parent.parent.parent.query_one("#start").value = self.info[self.cursor_position][1]
-            # capture timestamp as end time
-            elif event.character == 'e':
-                self.parent.parent.parent.parent.parent.parent.query_one("#end").value = self.info[self.cursor_position][1]
-            # capture time span as start and end time
-            elif event.character == 'z':
-                self.parent.parent.parent.parent.parent.parent.query_one("#start").value = self.info[self.cursor_position][4].strftime("%Y-%m-%dT%H:%M:%S")
-                self.parent.parent.parent.parent.parent.parent.query_one("#end").value = self.info[self.cursor_position][5].strftime("%Y-%m-%dT%H:%M:%S")
-            # toggle results view
-            elif event.character == 't':
-                # self.parent.parent.parent.parent = ContentSwitcher
-                self.parent.parent.parent.parent.current = "plain-container"
-                if self.parent.parent.parent.parent.parent.parent.parent.focused in self.parent.parent.query(CursoredText):
-                    active_nslc = self.parent.parent.parent.parent.parent.parent.parent.focused.id.split('_')[1:]
-                    text = self.parent.parent.parent.parent.parent.parent.parent.parent.req_text.splitlines()
-                    new_text = '\n'.join(text[:6])
-                    for row in text[5:]:
-                        parts = row.split('|')
-                        if parts:
-                            if all([p == an for (p, an) in zip(parts, active_nslc)]):
-                                new_text += '\n' + row
-                    self.parent.parent.parent.parent.query_one("#plain").update(new_text)
-            # toggle help
-            elif event.character == '?':
-                self.parent.parent.parent.parent.parent.parent.parent.parent.action_toggle_help()
-            # move to next trace
-            elif event.character == 'n':
-                temp1 = self.value.find(' ', self.cursor_position)
-                temp2 = self.value.find('╌', self.cursor_position)
-                temp3 = self.value.find('┄', self.cursor_position)
-                temp4 = self.value.find('┗', self.cursor_position + 1)
-                temp5 = self.value.find('┛', self.cursor_position)
-                if max(temp1, temp2, temp3, temp4, temp5) != -1:
-                    temp = min([n for n in (temp1, temp2, temp3, temp4, temp5) if n >= 0])
-                    temp1 = self.value.find('━', temp)
-                    temp2 = self.value.find('┗', temp + 1)
-                    temp3 = self.value.find('┛', temp + 1)
-                    if max(temp1, temp2, temp3) != -1:
-                        self.cursor_position = min([n for n in (temp1, temp2, temp3) if n >= 0])
-                    else:
-                        self.parent.parent.parent.parent.parent.parent.parent.parent.next_line()
-                else:
-                    self.parent.parent.parent.parent.parent.parent.parent.parent.next_line()
-                self.update_info_bar()
-            # move to previous trace
-            elif event.character == 'p':
-                temp1 = self.value.rfind(' ', 0, self.cursor_position + 1)
-                temp2 = self.value.rfind('╌', 0, self.cursor_position + 1)
-                temp3 = self.value.rfind('┄', 0, self.cursor_position + 1)
-                temp4 = self.value.rfind('┗', 0, self.cursor_position + 1)
-                temp5 = self.value.rfind('┛', 0, self.cursor_position + 1)
-                temp = max(temp1, temp2, temp3, temp4, temp5)
-                if temp != -1:
-                    temp1 = self.value.rfind('━', 0, temp)
-                    temp2 = self.value.rfind('┗', 0, temp)
-                    temp3 = self.value.rfind('┛', 0, temp)
-                    if max(temp1, temp2, temp3) != -1:
-                        temp = max([n for n in (temp1, temp2, temp3) if n >= 0])
-                        temp1 = self.value.rfind(' ', 0, temp)
-                        temp2 = self.value.rfind('╌', 0, temp)
-                        temp3 = self.value.rfind('┄', 0, temp)
-                        temp4 = self.value.rfind('┗', 0, temp)
-                        temp5 = self.value.rfind('┛', 0, temp)
-                        temp = max(temp1, temp2, temp3, temp4, temp5)
-                        if temp == -1:
-                            self.cursor_position = 0
-                        else:
-                            self.cursor_position = temp if self.value[temp] in ['┗', '┛'] else temp + 1
-                    else:
-                        self.parent.parent.parent.parent.parent.parent.parent.parent.previous_line()
-                else:
-                    self.parent.parent.parent.parent.parent.parent.parent.parent.previous_line()
-                self.update_info_bar()
-            event.stop()
-            assert event.character is not None
-            event.prevent_default()
-
-    def _on_focus(self, event: events.Focus) -> None:
-        self.cursor_position = 0
-        if self.cursor_blink:
-            self._blink_timer.resume()
-        self.app.cursor_position = self.cursor_screen_offset
-        self.has_focus = True
-        self.refresh()
-        if self.parent is not None:
-            self.parent.post_message(events.DescendantFocus(self))
-        self.update_info_bar()
-        self.parent.parent.parent.parent.parent.parent.parent.parent.query_one("#explanations-keys").update(
-            """[gold3]ctrl+c[/gold3]: close app  [gold3]ctrl+s[/gold3]: send request  [gold3]esc[/gold3]: cancel request  [gold3]up/down/pgUp/pgDown[/gold3]: scroll up/down if in scrollable window
-            [gold3]t[/gold3]: toggle results view           [gold3]tab/shif+tab[/gold3]: jump to next/previous channel            [gold3]ctrl+t/ctrl+b[/gold3]: jump to top/bottom channel
-            [gold3]right/left[/gold3]: move cursor on line  [gold3]home/end[/gold3]: jump to beginning/end of line                [gold3]n/p[/gold3]: jump to next/previous trace
-            [gold3]c[/gold3]: capture NSLC under cursor     [gold3]s/e[/gold3]: capture timestamp under cursor as Start/End Time  [gold3]z[/gold3]: capture time span under cursor as Start and End Time
-            Quality codes colors: [orange1][b]D[/b][/orange1] [green1][b]R[/b][/green1] [orchid][b]Q[/b][/orchid] [turquoise4][b]M[/b][/turquoise4]    Restriction policy: [i]empty[/i]/┄/[red1][b]R[/b][/red1] (open/unknown/restricted)""",
-        )
-        event.prevent_default()
-
-    def _on_blur(self, event: events.Blur) -> None:
-        super()._on_blur(event)
-        try:
-            self.parent.parent.parent.parent.parent.parent.parent.parent.query_one("#explanations-keys").update(
-                """[gold3]ctrl+c[/gold3]: close app  [gold3]tab/shif+tab[/gold3]: cycle through options  [gold3]ctrl+s[/gold3]: send request  [gold3]esc[/gold3]: cancel request
-                [gold3]up/down/pgUp/pgDown[/gold3]: scroll up/down if in scrollable window""")
-        except:
-            pass
-
-    def _on_paste(self, event: events.Paste) -> None:
-        event.stop()
-        event.prevent_default()
+            info_bar.update("")
 
     def action_cursor_right(self) -> None:
-        super().action_cursor_right()
-        if self.cursor_position >= len(self.value):
-            self.cursor_position = len(self.value) - 1
-        self.update_info_bar()
+        self.move_cursor(column=self.cursor_column + 1)
 
     def action_cursor_left(self) -> None:
-        super().action_cursor_left()
-        self.update_info_bar()
+        self.move_cursor(column=self.cursor_column - 1)
 
     def action_home(self) -> None:
-        self.cursor_position = 0
-        self.update_info_bar()
+        self.move_cursor(column=0)
 
     def action_end(self) -> None:
-        self.cursor_position = len(self.value) - 1
-        self.update_info_bar()
+        self.move_cursor(column=self.num_spans - 1)
 
-    async def _on_click(self, event: events.Click) -> None:
-        offset = event.get_content_offset(self)
-        if offset is None:
-            return
-        event.stop()
-        click_x = offset.x + self.view_position
-        cell_offset = 0
-        _cell_size = get_character_cell_size
-        for index, char in enumerate(self.value):
-            cell_width = _cell_size(char)
-            if cell_offset <= click_x < (cell_offset + cell_width):
-                self.cursor_position = index
-                break
-            cell_offset += cell_width
+    def action_next_row(self, leave=False) -> None:
+        """Move to the next channel; with tab, leave the results after the last one"""
+        if self.cursor_row == len(self.keys) - 1 and leave:
+            self.screen.focus_next()
         else:
-            self.cursor_position = len(self.value) - 1
-        self.update_info_bar()
+            self.move_cursor(self.cursor_row + 1, 0)
 
-    def action_delete_right(self) -> None:
-        pass
-
-    def action_delete_right_word(self) -> None:
-        pass
+    def action_previous_row(self, leave=False) -> None:
+        """Move to the previous channel; with shift+tab, leave the results before the first one"""
+        if self.cursor_row == 0 and leave:
+            self.screen.focus_previous()
+        else:
+            self.move_cursor(self.cursor_row - 1, 0)
+
+    def action_page_down(self) -> None:
+        self.move_cursor(self.cursor_row + self.size.height)
+
+    def action_page_up(self) -> None:
+        self.move_cursor(self.cursor_row - self.size.height)
+
+    def next_trace(self) -> None:
+        """Move to the start of the next trace, or to the next channel"""
+        value = self.plain(self.cursor_row)
+        position = self.cursor_column
+        temp1 = value.find(' ', position)
+        temp2 = value.find('╌', position)
+        temp3 = value.find('┄', position)
+        temp4 = value.find('┗', position + 1)
+        temp5 = value.find('┛', position)
+        if max(temp1, temp2, temp3, temp4, temp5) != -1:
+            temp = min([n for n in (temp1, temp2, temp3, temp4, temp5) if n >= 0])
+            temp1 = value.find('━', temp)
+            temp2 = value.find('┗', temp + 1)
+            temp3 = value.find('┛', temp + 1)
+            if max(temp1, temp2, temp3) != -1:
+                self.move_cursor(column=min([n for n in (temp1, temp2, temp3) if n >= 0]))
+                return
+        if self.cursor_row < len(self.keys) - 1:
+            self.move_cursor(self.cursor_row + 1, 0)
+
+    def previous_trace(self) -> None:
+        """Move to the start of the previous trace, or to the previous channel"""
+        value = self.plain(self.cursor_row)
+        position = self.cursor_column
+        temp1 = value.rfind(' ', 0, position + 1)
+        temp2 = value.rfind('╌', 0, position + 1)
+        temp3 = value.rfind('┄', 0, position + 1)
+        temp4 = value.rfind('┗', 0, position + 1)
+        temp5 = value.rfind('┛', 0, position + 1)
+        temp = max(temp1, temp2, temp3, temp4, temp5)
+        if temp != -1:
+            temp1 = value.rfind('━', 0, temp)
+            temp2 = value.rfind('┗', 0, temp)
+            temp3 = value.rfind('┛', 0, temp)
+            if max(temp1, temp2, temp3) != -1:
+                temp = max([n for n in (temp1, temp2, temp3) if n >= 0])
+                temp1 = value.rfind(' ', 0, temp)
+                temp2 = value.rfind('╌', 0, temp)
+                temp3 = value.rfind('┄', 0, temp)
+                temp4 = value.rfind('┗', 0, temp)
+                temp5 = value.rfind('┛', 0, temp)
+                temp = max(temp1, temp2, temp3, temp4, temp5)
+                if temp == -1:
+                    self.move_cursor(column=0)
+                else:
+                    self.move_cursor(column=temp if value[temp] in ['┗', '┛'] else temp + 1)
+                return
+        if self.cursor_row > 0:
+            self.move_cursor(self.cursor_row - 1, self.num_spans - 1)
 
-    def action_delete_right_all(self) -> None:
-        pass
+    def on_key(self, event: events.Key) -> None:
+        if not event.is_printable or not self.keys:
+            return
+        # capture nslc
+        if event.character == 'c':
+            nslc = self.keys[self.cursor_row].split('_')
+            self.app.query_one("#network").value = str(nslc[0])
+            self.app.query_one("#station").value = str(nslc[1])
+            self.app.query_one("#location").value = str(nslc[2])
+            self.app.query_one("#channel").value = str(nslc[3])
+        # capture timestamp as start time
+        elif event.character == 's':
+            self.app.query_one("#start").value = self.info()[1]
+        # capture timestamp as end time
+        elif event.character == 'e':
+            self.app.query_one("#end").value = self.info()[1]
+        # capture time span as start and end time
+        elif event.character == 'z':
+            info = self.info()
+            if info[4]:
+                self.app.query_one("#start").value = info[4].strftime("%Y-%m-%dT%H:%M:%S")
+                self.app.query_one("#end").value = info[5].strftime("%Y-%m-%dT%H:%M:%S")
+        # toggle results view
+        elif event.character == 't':
+            self.app.show_plain(self.keys[self.cursor_row])
+        # toggle help
+        elif event.character == '?':
+            self.app.action_toggle_help()
+        # move to next trace
+        elif event.character == 'n':
+            self.next_trace()
+        # move to previous trace
+        elif event.character == 'p':
+            self.previous_trace()
+        # zoom in or out around the cursor
+        elif event.character in ('+', '='):
+            self.zoom(self.ZOOM_FACTOR)
+        elif event.character == '-':
+            self.zoom(1 / self.ZOOM_FACTOR)
+        else:
+            return
+        event.stop()
+        event.prevent_default()
 
-    def action_delete_left(self) -> None:
-        pass
+    def on_focus(self, event: events.Focus) -> None:
+        self.refresh_row(self.cursor_row)
+        self.update_info_bar()
+        self.app.query_one("#explanations-keys").update(self.KEYS_HELP)
 
-    def action_delete_left_word(self) -> None:
-        pass
+    def on_blur(self, event: events.Blur) -> None:
+        self.refresh_row(self.cursor_row)
+        try:
+            self.app.query_one("#explanations-keys").update(self.DEFAULT_KEYS_HELP)
+        except:
+            pass
 
-    def action_delete_left_all(self) -> None:
-        pass
+    def on_click(self, event: events.Click) -> None:
+        offset = event.get_content_offset(self)
+        if offset is None or not self.keys:
+            return
+        event.stop()
+        self.move_cursor(self.scroll_offset.y + offset.y, self.scroll_offset.x + offset.x - self.LABEL_WIDTH - self.MARGIN)
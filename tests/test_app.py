@@ -1,6 +1,31 @@
 from a10y.app import AvailabilityUI
+from a10y.engine import Response
 import pytest
 
+
+def app_config(path, **overrides):
+    """Application settings of the tests, keeping the local index and cache in the directory path, with the given defaults
+    (without their default_ prefix) overridden"""
+    config = {
+        "default_starttime": "2024-01-01T00:00:00",
+        "default_endtime": "2024-01-02T00:00:00",
+        "default_mergegaps": "0.0",
+        "default_merge_samplerate": False,
+        "default_merge_quality": False,
+        "default_merge_overlap": False,
+        "default_quality_D": False,
+        "default_quality_R": False,
+        "default_quality_Q": False,
+        "default_quality_M": False,
+        "default_includerestricted": False,
+        "default_file": "",
+        "default_inventory_file": path / "inventory.sqlite",
+        "default_cache_file": path / "availability.sqlite",
+    }
+    config.update({f"default_{key}": value for key, value in overrides.items()})
+    return config
+
+
 @pytest.mark.asyncio
 async def test_send_button():
     """Test clicking the send button."""
@@ -38,3 +63,176 @@ async def test_send_button():
 
         assert button.disabled is False, "Button should be re-enabled after request found"
 
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_debounce(tmp_path):
+    """Test that fast typing issues a single routing lookup for the last value."""
+    config = app_config(tmp_path, autocomplete_debounce=0.2)
+
+    app = AvailabilityUI(nodes_urls=[], routing="https://www.orfeus-eu.org/eidaws/routing/1/query?", **config)
+    # no background refresh of the node list and inventories
+    app.refresh_nodes = app.refresh_inventory = lambda *args, **kwargs: None
+    looked_up = []
+
+    async def fake_get(url, headers=None):
+        if app.routing in url:
+            looked_up.append(url)
+        return Response(url, 204, "")
+
+    app.engine.get = fake_get
+    async with app.run_test() as pilot:
+        app.query_one("#network").value = "G"
+        app.query_one("#network").value = "GE"
+        await pilot.pause(0.5)
+
+        assert looked_up == [f"{app.routing}service=station&format=post&net=GE"]
+
+
+@pytest.mark.asyncio
+async def test_nodes_refresh(tmp_path, monkeypatch):
+    """Test that a stale node list is refreshed in the background and shown without restart."""
+    monkeypatch.setattr("a10y.app.read_cache", lambda: {})
+    saved = []
+    monkeypatch.setattr("a10y.app.save_nodes", lambda *args: saved.append(args))
+    config = app_config(tmp_path)
+    globalconfig = '{"datacenters": [{"name": "GFZ", "repositories": [{"services": [{"name": "fdsnws-station-1", "url": "https://geofon.gfz.de/fdsnws/station/1/"}]}]}]}'
+
+    app = AvailabilityUI(nodes_urls=[("ODC", "https://orfeus-eu.org/fdsnws/", True)], routing="https://www.orfeus-eu.org/eidaws/routing/1/query?", **config)
+
+    async def fake_get(url, headers=None):
+        if "globalconfig" in url:
+            return Response(url, 200, globalconfig, headers={"ETag": '"v1"'})
+        return Response(url, 204, "")
+
+    app.engine.get = fake_get
+    async with app.run_test() as pilot:
+        await pilot.pause(0.5)
+        assert app.query_one("#nodes").selected == ["https://geofon.gfz.de/fdsnws/"]
+        assert saved == [([("GFZ", "https://geofon.gfz.de/fdsnws/", True)], '"v1"', None)]
+        assert not app.query_one("#reload-nodes").disabled
+
+
+@pytest.mark.asyncio
+async def test_status_log(tmp_path):
+    """Test that status messages from other threads are kept in a ring buffer, older lines spilling to the log file."""
+    import asyncio
+    from a10y.widgets import StatusLog
+
+    log_file = tmp_path / "a10y.log"
+    config = app_config(tmp_path, status_lines=3, status_log=str(log_file))
+
+    app = AvailabilityUI(nodes_urls=[], routing="https://www.orfeus-eu.org/eidaws/routing/1/query?", **config)
+    # no background refresh messages
+    app.refresh_nodes = app.refresh_inventory = app.autocomplete = lambda *args, **kwargs: None
+    async with app.run_test() as pilot:
+        await pilot.pause(0.2)
+        status_log = app.query_one(StatusLog)
+        status_log.lines.clear()
+        log_file.write_text("")
+        await asyncio.to_thread(lambda: [app.status(f"[green]message {i}[/green]") for i in range(5)])
+        await pilot.pause(0.2)
+        assert [line.text for line in status_log.lines] == ["message 2", "message 3", "message 4"]
+        assert log_file.read_text() == "message 0\nmessage 1\n"
+
+
+EXTENTS = "#dataset: GeoCSV 2.0\nNetwork|Station|Location|Channel|Quality|SampleRate|Earliest|Latest|Updated|TimeSpans|Restriction\n" \
+          "GE|APE||HHZ|D|100.0|2024-01-01T00:00:00Z|2024-01-02T00:00:00Z|2024-01-03T00:00:00Z|1|OPEN\n" \
+          "GE|ARPR||HHZ|D|100.0|2024-01-01T00:00:00Z|2024-01-02T00:00:00Z|2024-01-03T00:00:00Z|1|RESTRICTED\n"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status", [200, 503])
+async def test_wildcards_pruned(tmp_path, status):
+    """Test that wildcard lines are expanded into the channels with data, from the extents of the node and then from the cache,
+    that the channels without data are reported, and that the lines are requested as they are if the extents fail."""
+    from a10y.widgets import StatusLog
+
+    url = "https://node/fdsnws/availability/1/query"
+    line = "GE * * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00"
+    app = AvailabilityUI(nodes_urls=[], routing="https://routing/query?", **app_config(tmp_path))
+    app.refresh_nodes = app.refresh_inventory = app.autocomplete = lambda *args, **kwargs: None
+    app.inventory.store("https://node/fdsnws/", "#\nGE|APE||HHZ\nGE|ARPR||HHZ\nGE|KBS||HHZ\n")
+    posts = []
+
+    async def fake_post(post_url, data, receive=None):
+        posts.append(post_url)
+        return Response(post_url, status, EXTENTS if status == 200 else "Service unavailable", data)
+
+    async with app.run_test() as pilot:
+        app.engine.post = fake_post
+        pruned = await app.prune(url, [line], "format=geocsv")
+        await pilot.pause(0.1)
+        if status != 200:
+            assert pruned == [line]
+            return
+        assert pruned == ["GE APE -- HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00", "GE ARPR -- HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00"]
+        assert any("No data for 1 channels of GE * * HHZ" in line.text for line in app.query_one(StatusLog).lines)
+        assert app.restricted == {"GE_APE__HHZ": False, "GE_ARPR__HHZ": True}
+        # the same window, or a shorter one, is expanded from the cache without requesting the extents again
+        assert await app.prune(url, [line], "format=geocsv") == pruned
+        assert await app.prune(url, ["GE * * HHZ 2024-01-01T06:00:00 2024-01-01T12:00:00"], "format=geocsv") == \
+            ["GE APE -- HHZ 2024-01-01T06:00:00 2024-01-01T12:00:00", "GE ARPR -- HHZ 2024-01-01T06:00:00 2024-01-01T12:00:00"]
+        assert posts == ["https://node/fdsnws/availability/1/extent"]
+
+
+TRACES = "#dataset: GeoCSV 2.0\nNetwork|Station|Location|Channel|Quality|SampleRate|Earliest|Latest\n" \
+         "YY|B|00|BHZ|M|20.0|2024-01-01T20:00:00.000000Z|2024-01-02T00:00:00.000000Z\n" \
+         "XX|A||HHZ|D|100.0|2024-01-01T04:00:00.000000Z|2024-01-01T13:00:00.000000Z\n" \
+         "XX|A||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-01T03:00:00.000000Z\n"
+
+
+@pytest.mark.asyncio
+async def test_timeline_keys(tmp_path):
+    """Test the keys of the results: moving between traces and channels, capturing the channel and times, and toggling the plain view."""
+    from textual.widgets import ContentSwitcher
+    from a10y.widgets import TimelineView
+
+    node = "https://node/fdsnws/"
+    app = AvailabilityUI(nodes_urls=[("NODE", node, True)], routing="https://routing/query?", **app_config(tmp_path))
+    app.refresh_nodes = app.refresh_inventory = app.autocomplete = lambda *args, **kwargs: None
+
+    async def fake_get(url, headers=None):
+        return Response(url, 200, f"{node}availability/1/query\nXX A -- HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00\n"
+                                  "YY B 00 BHZ 2024-01-01T00:00:00 2024-01-02T00:00:00\n")
+
+    async def fake_post(url, data, receive=None):
+        if "extent" in url:
+            return Response(url, 503, "Service unavailable", data)
+        await receive(TRACES, True)
+        return Response(url, 200, "", data)
+
+    async with app.run_test(size=(200, 60)) as pilot:
+        app.engine.get = fake_get
+        app.engine.post = fake_post
+        await pilot.click("#request-button")
+        await pilot.pause(1)
+        timeline = app.query_one(TimelineView)
+        info_bar = app.query_one("#info-bar")
+        assert app.focused is timeline and timeline.keys == ["YY_B_00_BHZ", "XX_A__HHZ"]
+        assert (timeline.cursor_row, timeline.cursor_column) == (0, 0)
+
+        await pilot.press("n")
+        assert (timeline.cursor_row, timeline.cursor_column) == (0, 133)
+        assert str(info_bar.renderable).startswith("Quality: M")
+        await pilot.press("n")
+        assert (timeline.cursor_row, timeline.cursor_column) == (1, 0)
+        await pilot.press("n", "p")
+        assert (timeline.cursor_row, timeline.cursor_column) == (1, 0)
+        assert str(info_bar.renderable).startswith("Quality: D")
+
+        await pilot.press("c", "z")
+        assert [app.query_one(f"#{field}").value for field in ("network", "station", "location", "channel")] == ["XX", "A", "", "HHZ"]
+        assert (app.query_one("#start").value, app.query_one("#end").value) == ("2024-01-01T00:00:00", "2024-01-01T00:09:00")
+        await pilot.press("right", "s", "end", "e")
+        assert (app.query_one("#start").value, app.query_one("#end").value) == ("2024-01-01T00:13:30", "2024-01-01T23:55:30")
+
+        await pilot.press("t")
+        assert app.query_one(ContentSwitcher).current == "plain-container"
+        await pilot.press("t")
+        assert app.query_one(ContentSwitcher).current == "lines"
+        assert app.focused is timeline and timeline.cursor_row == 1
+        await pilot.press("shift+tab")
+        assert timeline.cursor_row == 0
+        await pilot.press("tab", "tab")
+        assert app.focused is not timeline
@@ -0,0 +1,82 @@
+from a10y.cache import AvailabilityCache
+from a10y.timeline import GEOCSV_HEADER
+
+NODE = "https://geofon.gfz.de/fdsnws/availability/1/query"
+OPTIONS = "quality=D\nmergegaps=1.0\nformat=geocsv\nmerge=overlap\n"
+FIRST_WEEK = GEOCSV_HEADER + """GE|APE||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-03T00:00:00.000000Z
+GE|APE||HHZ|D|100.0|2024-01-04T00:00:00.000000Z|2024-01-08T00:00:00.000000Z
+GE|ARPR||HHZ|D|100.0|2024-01-02T00:00:00.000000Z|2024-01-05T00:00:00.000000Z
+"""
+TAIL = GEOCSV_HEADER + """GE|APE||HHZ|D|100.0|2024-01-08T00:00:00.000000Z|2024-01-10T00:00:00.000000Z
+"""
+
+
+def test_cached_intervals(tmp_path):
+    """Test that only the missing intervals are requested and that cut traces are joined again."""
+    cache = AvailabilityCache(tmp_path / "availability.sqlite")
+    week = ["GE * * HH? 2024-01-01T00:00:00 2024-01-08T00:00:00"]
+    assert cache.lookup(NODE, OPTIONS, week) == ([], week)
+    assert cache.store(NODE, OPTIONS, week, FIRST_WEEK) == 3
+
+    rows, missing = cache.lookup(NODE, OPTIONS, ["GE * * HH? 2024-01-02T00:00:00 2024-01-10T00:00:00"])
+    assert missing == ["GE * * HH? 2024-01-08T00:00:00 2024-01-10T00:00:00"]
+    assert rows[0] == "GE|APE||HHZ|D|100.0|2024-01-02T00:00:00.000000Z|2024-01-03T00:00:00.000000Z"
+    assert len(rows) == 3
+    # other options or patterns are not answered by the cache
+    assert cache.lookup(NODE, "format=geocsv\n", week)[1] == week
+    assert cache.lookup(NODE, OPTIONS, ["GE APE * HHZ 2024-01-01T00:00:00 2024-01-08T00:00:00"])[0] == []
+
+    cache.store(NODE, OPTIONS, missing, TAIL)
+    rows, missing = cache.lookup(NODE, OPTIONS, ["GE * * HH? 2024-01-01T00:00:00 2024-01-10T00:00:00"])
+    assert missing == []
+    assert "GE|APE||HHZ|D|100.0|2024-01-04T00:00:00.000000Z|2024-01-10T00:00:00.000000Z" in rows
+    assert len(rows) == 3
+    cache.close()
+
+
+def test_staged_batches(tmp_path):
+    """Test that the batches of a response are cached only once it completes, and dropped if it fails."""
+    cache = AvailabilityCache(tmp_path / "availability.sqlite")
+    week = ["GE * * HH? 2024-01-01T00:00:00 2024-01-08T00:00:00"]
+    rows = FIRST_WEEK.splitlines()[-3:]
+    failed = cache.begin()
+    assert cache.stage(failed, rows[0]) == 1
+    assert cache.commit(failed, NODE, OPTIONS, week, complete=False) == 0
+    response = cache.begin()
+    cache.stage(response, '\n'.join(rows[:2]))
+    assert cache.lookup(NODE, OPTIONS, week) == ([], week)
+    cache.stage(response, rows[2])
+    assert cache.commit(response, NODE, OPTIONS, week) == 3
+    assert sorted(cache.lookup(NODE, OPTIONS, week)[0]) == sorted(rows)
+    assert cache.db.execute("SELECT COUNT(*) FROM staged").fetchone()[0] == 0
+    cache.close()
+
+
+def test_eviction(tmp_path):
+    """Test that the least recently used requests are evicted beyond the size limit."""
+    cache = AvailabilityCache(tmp_path / "availability.sqlite", size=100 / 2**20)
+    first = ["GE * * HH? 2024-01-01T00:00:00 2024-01-08T00:00:00"]
+    second = ["GE APE * HH? 2024-01-01T00:00:00 2024-01-08T00:00:00"]
+    cache.store(NODE, OPTIONS, first, FIRST_WEEK)
+    cache.store(NODE, OPTIONS, second, FIRST_WEEK)
+    assert cache.lookup(NODE, OPTIONS, first) == ([], first)
+    assert len(cache.lookup(NODE, OPTIONS, second)[0]) == 2
+    cache.close()
+
+
+def test_cached_restrictions(tmp_path):
+    """Test that the restriction policy of the channels is answered from the cache until its TTL."""
+    cache = AvailabilityCache(tmp_path / "availability.sqlite")
+    lines = ["GE * * HH? 2024-01-01T00:00:00 2024-01-08T00:00:00", "XX A * HHZ 2024-01-01T00:00:00 2024-01-08T00:00:00"]
+    assert cache.restrictions(NODE, lines) == ({}, lines)
+    cache.store_restrictions(NODE, lines[:1], {"GE_APE__HHZ": False, "GE_ARPR__HHZ": True})
+    assert cache.restrictions(NODE, lines) == ({"GE_APE__HHZ": False, "GE_ARPR__HHZ": True}, lines[1:])
+    assert cache.restrictions(NODE, ["GE APE * HHZ 2024-01-01T00:00:00 2024-01-08T00:00:00"])[0] == {}
+    # exact lines, as expanded from the extents, are looked up by channel
+    exact = [f"GE S{i} -- HHZ 2024-01-01T00:00:00 2024-01-08T00:00:00" for i in range(2000)]
+    cache.store_restrictions(NODE, exact, {f"GE_S{i}__HHZ": i % 2 == 1 for i in range(2000)})
+    cached, missing = cache.restrictions(NODE, exact[:3] + lines[1:])
+    assert cached == {"GE_S0__HHZ": False, "GE_S1__HHZ": True, "GE_S2__HHZ": False} and missing == lines[1:]
+    cache.restriction_ttl = 0
+    assert cache.restrictions(NODE, lines) == ({}, lines)
+    cache.close()
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from a10y.engine import BatchScheduler, HttpEngine, Response, shard_lines
+
+
+@pytest.mark.asyncio
+async def test_batches_adapt_to_node():
+    """Test that batches rejected as too large are sent again smaller, with a cap on the requests in flight."""
+    scheduler = BatchScheduler(size=100, in_flight=2)
+    lines = [f"XX S{i} * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00" for i in range(250)]
+    in_flight, most, handled = 0, 0, []
+
+    async def send(data):
+        nonlocal in_flight, most
+        in_flight += 1
+        most = max(most, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return Response("node", 413 if data.count('\n') >= 30 else 200, "", data)
+
+    async def handle(data, r):
+        assert r.status == 200
+        handled.extend(data.split('\n'))
+
+    await scheduler.run("node", lines, send, handle)
+    assert sorted(handled) == sorted(lines)
+    assert most == 2
+    assert scheduler.node("node").size < 100
+
+
+@pytest.mark.asyncio
+async def test_lines_in_view_first():
+    """Test that the lines in view are sent first, and grouped again only once the channels in view change."""
+    scheduler = BatchScheduler(size=2, in_flight=1)
+    lines = [f"XX S{i} -- HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00" for i in range(6)]
+    views = [{"XX_S4__HHZ"}, {"XX_S1__HHZ", "XX_S2__HHZ"}]
+    rankings, ranked, sent = [], [], []
+
+    def priority():
+        visible = views[0] if not sent else views[1]
+        if not rankings or rankings[-1][0] is not visible:
+            rankings.append((visible, lambda line: ranked.append(line) or (0 if f"XX_{line.split()[1]}__HHZ" in visible else 1)))
+        return rankings[-1][1]
+
+    async def send(data):
+        sent.append(data.split('\n'))
+        return Response("node", 200, "", data)
+
+    async def handle(data, r):
+        pass
+
+    await scheduler.run("node", lines, send, handle, priority)
+    assert [line.split()[1] for batch in sent for line in batch] == ["S4", "S0", "S1", "S2", "S3", "S5"]
+    assert len(rankings) == 2 and len(ranked) == 6 + 4
+
+
+@pytest.mark.asyncio
+async def test_failing_node_skipped():
+    """Test that server errors are retried and that a node failing repeatedly is skipped for a while."""
+    engine = HttpEngine(retries=2, backoff=0)
+    calls = []
+
+    async def fake_request(method, url, data, headers, receive):
+        calls.append(url)
+        return Response(url, 503, "Service unavailable")
+
+    engine._request = fake_request
+    assert (await engine.get("https://node.a/fdsnws/availability/1/query")).status == 503
+    assert len(calls) == 3
+    r = await engine.get("https://node.a/fdsnws/station/1/query")
+    assert r.status == 0 and "skipped" in r.text
+    assert len(calls) == 5
+    assert engine.health("https://node.a/").summary().startswith("skipped for")
+    assert engine.health("https://node.b/").available()
+
+
+@pytest.mark.asyncio
+async def test_headers_case_insensitive():
+    """Test that the headers of a response are looked up whatever the case the server gave them."""
+    async def handler(request):
+        return web.Response(text="ok", headers={"etag": '"v1"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    async with TestServer(app) as server:
+        engine = HttpEngine()
+        r = await engine.get(str(server.make_url("/")))
+        await engine.close()
+    assert r.status == 200 and r.headers.get("ETag") == '"v1"' and r.headers["Last-Modified"].startswith("Mon")
+
+
+def test_long_windows_sharded():
+    """Test that long windows are split into shards cut on whole seconds, and short ones are left whole."""
+    lines = ["XX A * HHZ 2014-01-01T00:00:00 2024-01-01T00:00:00", "XX B * HHZ 2024-01-01T00:00:00 2024-01-15T00:00:00"]
+    shards = shard_lines(lines, 3)
+    assert shards == [["XX A * HHZ 2014-01-01T00:00:00 2017-05-02T08:00:00", lines[1]],
+                      ["XX A * HHZ 2017-05-02T08:00:00 2020-08-31T16:00:00"],
+                      ["XX A * HHZ 2020-08-31T16:00:00 2024-01-01T00:00:00"]]
+    assert BatchScheduler(size=100, in_flight=4).shard_count("node", lines) == 16
+    assert BatchScheduler(size=100, in_flight=4).shard_count("node", lines * 500) == 1
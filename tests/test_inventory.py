@@ -0,0 +1,27 @@
+from a10y.inventory import Inventory
+
+STATION_TEXT = """#Network|Station|Location|Channel|Latitude|Longitude|Elevation|Depth|Azimuth|Dip|SensorDescription|Scale|ScaleFreq|ScaleUnits|SampleRate|StartTime|EndTime
+GE|APE||BHZ|37.07|25.52|620.0|0.0|0.0|-90.0|STS-2|6.0E8|1.0|M/S|20.0|2008-01-01T00:00:00|
+GE|APE||HHZ|37.07|25.52|620.0|0.0|0.0|-90.0|STS-2|6.0E8|1.0|M/S|100.0|2008-01-01T00:00:00|
+GE|APE||HHZ|37.07|25.52|620.0|0.0|0.0|-90.0|STS-2|6.0E8|1.0|M/S|100.0|2001-01-01T00:00:00|2008-01-01T00:00:00
+GE|ARPR|00|HHN|39.09|38.33|1495.0|0.0|0.0|0.0|STS-2|6.0E8|1.0|M/S|100.0|2010-01-01T00:00:00|
+GR|BFO||HHZ|48.33|8.33|589.0|0.0|0.0|-90.0|STS-2|6.0E8|1.0|M/S|100.0|1991-01-01T00:00:00|
+"""
+NODE = "https://geofon.gfz.de/fdsnws/"
+
+
+def test_store_and_lookup(tmp_path):
+    """Test codes lookups with FDSN wildcards on a stored inventory."""
+    inventory = Inventory(tmp_path / "inventory.sqlite")
+    assert inventory.stale([NODE]) == [NODE]
+    assert inventory.store(NODE, STATION_TEXT) == 4
+    assert inventory.indexed([NODE]) and inventory.stale([NODE]) == []
+
+    assert inventory.codes("net", [NODE]) == ["GE", "GR"]
+    assert inventory.codes("sta", [NODE], "ge") == ["APE", "ARPR"]
+    assert inventory.codes("sta", [NODE], "G*", "A??") == ["APE"]
+    assert inventory.codes("loc", [NODE], "GE", "A*") == ["", "00"]
+    assert inventory.codes("cha", [NODE], "GE", "APE", "--") == ["BHZ", "HHZ"]
+    assert inventory.expand([NODE], "GE,GR", "", "", "HH?") == [("GE", "APE", "", "HHZ"), ("GE", "ARPR", "00", "HHN"), ("GR", "BFO", "", "HHZ")]
+    assert inventory.codes("net", ["https://other.node/fdsnws/"]) == []
+    inventory.close()
@@ -0,0 +1,129 @@
+import io
+import subprocess
+import sys
+
+import pytest
+
+from a10y.cache import AvailabilityCache
+from a10y.engine import Response
+from a10y.query import Query, GeoCSVWriter, JSONLinesWriter, SummaryWriter, read_post_file
+from a10y.timeline import GEOCSV_HEADER
+
+NODE = "https://geofon.gfz.de/fdsnws/"
+ROUTING = "https://routing/query?"
+RESPONSE = GEOCSV_HEADER + """GE|APE||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-01T12:00:00.000000Z
+GE|APE||HHZ|D|100.0|2024-01-01T18:00:00.000000Z|2024-01-02T00:00:00.000000Z
+"""
+
+
+ROUTES = (f"{NODE}availability/1/query\nGE APE * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00\n"
+          f"https://other.node/fdsnws/availability/1/query\nXX A * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00\n")
+
+
+class FakeEngine:
+    def __init__(self):
+        self.posts = []
+
+    async def get(self, url):
+        return Response(url, 200, ROUTES)
+
+    async def post(self, url, data, receive=None):
+        self.posts.append((url, data))
+        if receive is None:
+            return Response(url, 200, ROUTES if url == ROUTING.rstrip('?') else RESPONSE, data)
+        # the body arrives in chunks cutting the lines
+        for i in range(0, len(RESPONSE), 50):
+            await receive(RESPONSE[i:i + 50], False)
+        await receive("", True)
+        return Response(url, 200, "", data, size=len(RESPONSE))
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("writer, expected", [
+    (GeoCSVWriter, GEOCSV_HEADER + RESPONSE.split("Latest\n")[1]),
+    (JSONLinesWriter, '{"network": "GE", "station": "APE", "location": "", "channel": "HHZ", "quality": "D", "samplerate": "100.0", '
+                      '"earliest": "2024-01-01T00:00:00.000000Z", "latest": "2024-01-01T12:00:00.000000Z"}\n'),
+    (lambda out: SummaryWriter(out, "2024-01-01T00:00:00", "2024-01-02T00:00:00"), "Network|Station|Location|Channel|Availability|Traces\nGE|APE||HHZ|75.00|2\n"),
+])
+async def test_query_streams_selected_nodes(tmp_path, writer, expected):
+    """Test that a headless query only requests the selected nodes and writes their rows."""
+    out = io.StringIO()
+    engine = FakeEngine()
+    query = Query([NODE], ROUTING, "format=geocsv", writer(out), AvailabilityCache(tmp_path / "cache.sqlite"), engine, io.StringIO())
+    assert await query.run("GE", "APE", "", "HHZ", "2024-01-01T00:00:00", "2024-01-02T00:00:00") == 0
+    assert [url for url, _ in engine.posts] == [f"{NODE}availability/1/query"]
+    assert out.getvalue().startswith(expected)
+
+
+@pytest.mark.asyncio
+async def test_post_file_routed(tmp_path):
+    """Test that the lines of a POST file are routed, each node getting only its own lines."""
+    post_file = tmp_path / "nslc.txt"
+    post_file.write_text("quality=D\nGE APE * HHZ\nXX A * HHZ\n")
+    engine = FakeEngine()
+    query = Query([NODE], ROUTING, "format=geocsv", GeoCSVWriter(io.StringIO()), AvailabilityCache(tmp_path / "cache.sqlite"), engine, io.StringIO())
+    assert await query.run(post_lines=read_post_file(post_file, "2024-01-01T00:00:00", "2024-01-02T00:00:00")) == 0
+    assert engine.posts == [
+        ("https://routing/query", "service=availability\nformat=post\nGE APE * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00\nXX A * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00"),
+        (f"{NODE}availability/1/query", "format=geocsv\nGE APE * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00"),
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("writer, posts", [
+    (GeoCSVWriter, 1),
+    (lambda out: SummaryWriter(out, "2014-01-01T00:00:00", "2024-01-01T00:00:00"), 16),
+])
+async def test_rows_not_sharded(tmp_path, writer, posts):
+    """Test that long windows are split into time shards only for the summary, the rows being written as the nodes return them."""
+    engine = FakeEngine()
+    query = Query([NODE], ROUTING, "format=geocsv", writer(io.StringIO()), AvailabilityCache(tmp_path / "cache.sqlite"), engine, io.StringIO())
+    await query.request_node(f"{NODE}availability/1/query", ["GE APE -- HHZ 2014-01-01T00:00:00 2024-01-01T00:00:00"])
+    assert len(engine.posts) == posts
+
+
+@pytest.mark.asyncio
+async def test_summary_per_node(tmp_path):
+    """Test that the summary of the channels of a node is written once its responses arrived, before the end of the query."""
+    out = io.StringIO()
+    writer = SummaryWriter(out, "2024-01-01T00:00:00", "2024-01-02T00:00:00")
+    query = Query([NODE], ROUTING, "format=geocsv", writer, AvailabilityCache(tmp_path / "cache.sqlite"), FakeEngine(), io.StringIO())
+    await query.request_node(f"{NODE}availability/1/query", ["GE APE * HHZ 2024-01-01T00:00:00 2024-01-02T00:00:00"])
+    assert out.getvalue().endswith("GE|APE||HHZ|75.00|2\n")
+    writer.close()
+    assert out.getvalue().count("GE|APE") == 1
+
+
+def test_no_textual_import():
+    """Test that the headless query does not import Textual."""
+    code = "import sys, a10y.main, a10y.query; print('textual' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout.strip() == "False"
+
+
+def test_options_before_subcommand():
+    """Test that the configuration file given before the query subcommand is kept, and after it too."""
+    from a10y.main import parse_arguments
+    assert parse_arguments(["-c", "x.toml", "query"]).config == "x.toml"
+    assert parse_arguments(["query", "-c", "y.toml"]).config == "y.toml"
+
+
+def test_invalid_times_rejected():
+    """Test that invalid query times are reported as usage errors rather than tracebacks."""
+    from a10y.main import parse_arguments
+    assert parse_arguments(["query", "--start", "2024-01-01", "--end", "2024-01-02T00:00:00Z"]).end == "2024-01-02T00:00:00Z"
+    with pytest.raises(SystemExit):
+        parse_arguments(["query", "--start", "yesterday"])
+
+
+def test_rows_remembered_bounded():
+    """Test that the row writers drop rows returned again while remembering only the latest ones."""
+    out = io.StringIO()
+    writer = GeoCSVWriter(out, remember=1)
+    rows = RESPONSE.split("Latest\n")[1]
+    writer.write(RESPONSE)
+    writer.write(RESPONSE)
+    assert out.getvalue() == GEOCSV_HEADER + rows + rows.split("\n", 1)[0] + "\n"
+    assert len(writer.seen) == 1
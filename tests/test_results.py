@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import numpy as np
+from rich.text import Text
+
+from a10y.cache import lines_window
+from a10y.results import ResultsModel
+from a10y.timeline import Frame, row_markup
+
+HEADER = """#dataset: GeoCSV 2.0
+#delimiter: |
+#field_unit: unitless|unitless|unitless|unitless|unitless|hertz|ISO_8601|ISO_8601
+#field_type: string|string|string|string|string|float|datetime|datetime
+Network|Station|Location|Channel|Quality|SampleRate|Earliest|Latest
+"""
+FIRST_EPOCH = HEADER + "XX|A||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-01T03:00:00.000000Z\n"
+SECOND_EPOCH = HEADER + "XX|A||HHZ|D|100.0|2024-01-01T04:00:00.000000Z|2024-01-01T13:00:00.000000Z\nYY|B|00|BHZ|M|20.0|2024-01-01T20:00:00.000000Z|2024-01-02T00:00:00.000000Z\n"
+
+
+def epoch(*args):
+    return np.datetime64(datetime(*args), 'us').astype(np.int64)
+
+
+def test_responses_fold_into_channels():
+    """Test that responses returning the same channel update its row in place."""
+    results = ResultsModel(Frame(epoch(2024, 1, 1), epoch(2024, 1, 2), 4))
+    assert results.add(FIRST_EPOCH) == {0}
+    assert Text.from_markup(row_markup(results.states[0])).plain == "┛   "
+
+    assert results.add(SECOND_EPOCH) == {0, 1}
+    assert results.keys == ["XX_A__HHZ", "YY_B_00_BHZ"]
+    assert [Text.from_markup(row_markup(states)).plain for states in results.states] == ["╌━┛ ", "   ┗"]
+    assert np.diff(results.offsets).tolist() == [2, 1]
+
+    # a repeated response changes nothing
+    assert results.add(SECOND_EPOCH) == set()
+    assert np.diff(results.offsets).tolist() == [2, 1]
+    assert results.info(0, 0)[:4] == ["1", "2024-01-01T03:00:00", "2024-01-01T03:00:00", "2024-01-01T04:00:00"]
+
+
+def test_plain_rows_rebuilt_from_columns():
+    """Test that the plain view of a channel is rebuilt from the columns, without keeping the responses."""
+    results = ResultsModel(Frame(epoch(2024, 1, 1), epoch(2024, 1, 2), 4))
+    results.add(SECOND_EPOCH)
+    results.add(FIRST_EPOCH)
+    assert results.plain("XX_A__HHZ") == HEADER + "XX|A||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-01T03:00:00.000000Z\n" \
+                                                  "XX|A||HHZ|D|100.0|2024-01-01T04:00:00.000000Z|2024-01-01T13:00:00.000000Z"
+    assert results.plain_rows("XX_A__HHZ", 1, 5) == ["XX|A||HHZ|D|100.0|2024-01-01T04:00:00.000000Z|2024-01-01T13:00:00.000000Z"]
+    assert results.index(1).starts.tolist() == [epoch(2024, 1, 1, 20)]
+
+
+def test_coarse_traces_refined():
+    """Test that the traces of a coarse response are replaced by the detailed ones of the same channel."""
+    results = ResultsModel(Frame(epoch(2024, 1, 1), epoch(2024, 1, 2), 4))
+    results.add(HEADER + "XX|A||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-01T13:00:00.000000Z\n", coarse=True)
+    assert Text.from_markup(row_markup(results.states[0])).plain == "━━┛ "
+    assert results.merged("XX_A__HHZ")
+    assert results.add(SECOND_EPOCH) == {0, 1}
+    assert [Text.from_markup(row_markup(states)).plain for states in results.states] == ["┗━┛ ", "   ┗"]
+    assert not results.coarse.any() and not results.merged("XX_A__HHZ")
+
+
+def test_shards_stitched():
+    """Test that traces cut at shard bounds are joined again, and coarse traces are refined only within each shard."""
+    results = ResultsModel(Frame(epoch(2024, 1, 1), epoch(2024, 1, 2), 4))
+    results.add(HEADER + "XX|A||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-02T00:00:00.000000Z\n", coarse=True)
+    results.add(HEADER + "XX|A||HHZ|D|100.0|2024-01-01T02:00:00.000000Z|2024-01-01T12:00:00.000000Z\n", window=(epoch(2024, 1, 1), epoch(2024, 1, 1, 12)))
+    assert Text.from_markup(row_markup(results.states[0])).plain == "┗━━━"
+    assert results.coarse.tolist() == [False, True]
+    results.add(HEADER + "XX|A||HHZ|D|100.0|2024-01-01T12:00:00.000000Z|2024-01-01T20:00:00.000000Z\n", window=(epoch(2024, 1, 1, 12), epoch(2024, 1, 2)))
+    assert results.plain_rows("XX_A__HHZ") == ["XX|A||HHZ|D|100.0|2024-01-01T02:00:00.000000Z|2024-01-01T20:00:00.000000Z"]
+    assert Text.from_markup(row_markup(results.states[0])).plain == "┗━━┛"
+
+
+def test_mixed_windows_refined_per_channel():
+    """Test that a batch mixing a shard of one channel and the whole window of another refines each within its own window."""
+    results = ResultsModel(Frame(epoch(2024, 1, 1), epoch(2024, 1, 2), 4))
+    results.add(HEADER + "XX|A||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-02T00:00:00.000000Z\n"
+                         "YY|B|00|BHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-02T00:00:00.000000Z\n", coarse=True)
+    window = lines_window(["format=geocsv", "XX A -- HHZ 2024-01-01T00:00:00 2024-01-01T12:00:00",
+                           "YY B 00 BHZ 2024-01-01T00:00:00 2024-01-02T00:00:00"])
+    results.add(HEADER + "XX|A||HHZ|D|100.0|2024-01-01T02:00:00.000000Z|2024-01-01T12:00:00.000000Z\n"
+                         "YY|B|00|BHZ|D|100.0|2024-01-01T02:00:00.000000Z|2024-01-01T12:00:00.000000Z\n", window=window)
+    assert [Text.from_markup(row_markup(states)).plain for states in results.states] == ["┗━━━", "┗━  "]
+    assert results.merged("XX_A__HHZ") and not results.merged("YY_B_00_BHZ")
+    assert results.merged("XX_A__HHZ", epoch(2024, 1, 1, 12), epoch(2024, 1, 2)) and not results.merged("XX_A__HHZ", epoch(2024, 1, 1), epoch(2024, 1, 1, 12))
+
+
+def test_zoom_rebins_locally():
+    """Test that zoomed frames stay within the requested window and re-bin the retained traces."""
+    results = ResultsModel(Frame(epoch(2024, 1, 1), epoch(2024, 1, 2), 4))
+    results.add(SECOND_EPOCH)
+    frame = results.zoomed(epoch(2024, 1, 1, 22), 2)
+    assert (frame.start, frame.end, frame.num_spans) == (epoch(2024, 1, 1, 12), epoch(2024, 1, 2), 4)
+    results.rebin(frame)
+    assert [Text.from_markup(row_markup(states)).plain for states in results.states] == ["┛   ", "  ┗━"]
+    assert results.info(1, 2)[2] == "2024-01-01T20:00:00"
+
+    frame = results.zoomed(epoch(2024, 1, 1, 22), 1 / 4)
+    assert (frame.start, frame.end) == results.window
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+IMPORT_BUDGET = 100_000  # microseconds for importing a10y.main; importing Textual alone takes several times more
+HEAVY_MODULES = ["textual", "textual_autocomplete", "rich", "aiohttp", "requests", "numpy", "tomli"]
+
+
+def import_time(module) -> int:
+    """Cumulative import time (microseconds) of a module in a fresh interpreter, as reported by -X importtime"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True).stderr
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise AssertionError(f"{module} not found in the import times")
+
+
+def test_cold_start_budget():
+    """Test that the entry point imports within budget, the best of three runs to absorb noise."""
+    assert min(import_time("a10y.main") for _ in range(3)) < IMPORT_BUDGET
+
+
+def test_entry_point_defers_heavy_imports():
+    """Test that the entry point and argument parsing import none of the heavy modules."""
+    code = ("import sys, a10y.main; a10y.main.parse_arguments(['query', '--net', 'GE']); "
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout.strip() == "[]"
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import numpy as np
+from rich.text import Text
+
+from a10y.timeline import GAPS, Frame, GeoCSVStream, SegmentIndex, parse_geocsv, sort_traces, bin_traces, row_markup, cell_info
+
+GEOCSV = """#dataset: GeoCSV 2.0
+#delimiter: |
+#field_unit: unitless|unitless|unitless|unitless|unitless|hertz|ISO_8601|ISO_8601
+#field_type: string|string|string|string|string|float|datetime|datetime
+Network|Station|Location|Channel|Quality|SampleRate|Earliest|Latest
+YY|B|00|BHZ|M|20.0|2024-01-01T20:00:00.000000Z|2024-01-02T00:00:00.000000Z
+XX|A||HHZ|D|100.0|2024-01-01T04:00:00.000000Z|2024-01-01T13:00:00.000000Z
+XX|A||HHZ|D|100.0|2024-01-01T00:00:00.000000Z|2024-01-01T03:00:00.000000Z
+"""
+
+
+def test_parse_and_bin():
+    """Test binning of traces into 6 hour cells of a day."""
+    channels, channel, quality, starts, ends, _ = parse_geocsv(GEOCSV)
+    assert channels == ["YY_B_00_BHZ", "XX_A__HHZ"]
+    assert channel.tolist() == [0, 1, 1] and quality.tolist() == [4, 1, 1]
+
+    order = sort_traces(channel, starts)
+    frame_start = np.datetime64(datetime(2024, 1, 1), 'us').astype(np.int64)
+    frame_end = np.datetime64(datetime(2024, 1, 2), 'us').astype(np.int64)
+    states = bin_traces(channel[order], quality[order], starts[order], ends[order], 2, frame_start, frame_end, 4)
+
+    assert [Text.from_markup(row_markup(row)).plain for row in states] == ["   ┗", "╌━┛ "]
+    assert states[1][0] == GAPS | 1
+    assert row_markup(states[1]) == "╌[orange1]━[/orange1][orange1]┛[/orange1] "
+
+    # info of the cells is derived from the traces of the channel
+    frame = Frame(frame_start, frame_end, 4)
+    index = SegmentIndex(quality[order][1:], starts[order][1:], ends[order][1:])
+    assert cell_info(frame, index, states[1], 0)[:4] == ["1", "2024-01-01T03:00:00", "2024-01-01T03:00:00", "2024-01-01T04:00:00"]
+    assert cell_info(frame, index, states[1], 2)[:4] == ["D", "2024-01-01T15:00:00", "2024-01-01T04:00:00", "2024-01-01T13:00:00"]
+    # a long gap lasts from the end of the last trace to the end of the frame
+    assert cell_info(frame, index, states[1], 3)[:4] == ["", "2024-01-01T21:00:00", "2024-01-01T13:00:00", "2024-01-02T00:00:00"]
+    assert cell_info(frame, index, states[1], 4) == ["", "", "", "", "", ""]
+
+
+def test_parse_ragged_rows():
+    """Test that the columns are taken from the field names, and that a ragged row does not shift the rows after it."""
+    ragged = GEOCSV.replace("|20.0|", "|20.0|2024|", 1) + "XX|A||HHZ|D|100.0|2024-01-01T14:00:00.000000Z\n"
+    channels, channel, quality, starts, ends, _ = parse_geocsv(ragged)
+    assert channels == ["XX_A__HHZ"] and quality.tolist() == [1, 1]
+    # an extra column (the update time of the traces), with or without the field names
+    updated = GEOCSV.replace("Latest\n", "Latest|Updated\n").replace("Z\n", "Z|2024-02-01T00:00:00Z\n")
+    for text in (updated, updated.split("Updated\n")[1]):
+        channels, channel, quality, starts, ends, _ = parse_geocsv(text)
+        assert channel.tolist() == [0, 1, 1] and ends[0] == np.datetime64(datetime(2024, 1, 2), 'us').astype(np.int64)
+
+
+def test_stream_parsed_in_batches():
+    """Test that a response fed in chunks yields all of its rows once, in batches, whatever the length of its header."""
+    text = "#dataset: GeoCSV 2.0\n#title: availability\n" + GEOCSV.split("\n", 1)[1]
+    stream = GeoCSVStream(batch=100)
+    batches = [stream.feed(text[i:i + 7]) for i in range(0, len(text), 7)] + [stream.feed("", final=True)]
+    batches = [batch for batch in batches if batch]
+    assert len(batches) == 2
+    assert '\n'.join(batches) == GEOCSV.split("Latest\n")[1].strip()
+    assert stream.metadata["title"] == "availability" and stream.fields[-1] == "Latest"
+    # batches stop growing at the limit, so that a long response is never held for long
+    stream = GeoCSVStream(batch=10, limit=80)
+    rows = GEOCSV.split("Latest\n")[1] * 20
+    batches = [stream.feed(rows[i:i + 7]) for i in range(0, len(rows), 7)]
+    assert max(len(batch) for batch in batches) < 80 + 80
+    assert sum(len(batch) > 0 for batch in batches) > 10